@@ -0,0 +1,231 @@
+# Maze-check solver shared by new_afk.py and its pipeline workers.
+# Kept free of input and window side effects so worker processes can import it.
+import os
+import sys
+from collections import namedtuple
+from functools import lru_cache
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "florr_afk_solution"))
+from florr_afk_lazy import lazy_import
+from florr_afk_detectors import DetectorRegistry
+from florr_afk_timing import timings
+from florr_afk_calibration import calibrate
+
+# Loaded on the first frame, so importing this module (and new_afk) stays cheap
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+grey_colors = [[110, 135, 87], [107, 149, 157], [104, 142, 149], [93, 101, 113], [100, 112, 128], [111, 157, 165],
+               [116, 144, 153], [108, 130, 139], [114, 143, 150], [96, 96, 96],
+               [137, 149, 155], [141, 153, 159], [135, 146, 151], [161, 155, 143]]  # Desert
+
+def is_grey(px):
+    if (px == [79, 106, 111]).all() or (px == [84, 117, 123]).all() or (px == [82, 112, 117]).all():
+        return False
+    if 130 >= px[2] >= 100 >= px[0] >= 85 and 95 <= px[1] <= 115:
+        return True
+    for gc in grey_colors:
+        if abs(px[0] - gc[0]) + abs(px[1] - gc[1]) + abs(px[2] - gc[2]) <= 30:
+            return True
+    return False
+
+sys.setrecursionlimit(5000)
+rarities = [[109, 239, 126], [93, 230, 255], [227, 82, 77], [222, 31, 134], [31, 31, 222], [222, 219, 31],
+            [117, 43, 255], [163, 255, 43]]
+white = [255, 255, 254]
+count = 0
+dfs_cnt = 0
+
+# Geometry measured on a 1920x1080 screen, scaled to the captured frame by maze_geometry()
+CANVAS = (1400, 2200)
+BLACKOUT = [((0, 300), (0, 400)), ((910, 1070), (550, 1360))]  # (rows, cols) hidden from the search
+JUMP = 5
+TRACE_RADIUS = 25
+ERASE_RADIUS = 20
+START_STEP = 10
+jump = JUMP
+
+MazeGeometry = namedtuple("MazeGeometry", ["canvas", "keep", "jump", "trace", "erase", "window", "start_step"])
+
+
+def _disk(radius, step):
+    """Row and column offsets of the grid points inside a circle"""
+    i, j = np.mgrid[-radius:radius + 1:step, -radius:radius + 1:step]
+    inside = i * i + j * j <= radius * radius
+    return i[inside], j[inside]
+
+
+def _build_geometry(calibration):
+    canvas = (calibration.y(CANVAS[0]), calibration.x(CANVAS[1]))
+    keep = np.ones(canvas, dtype=bool)
+    for (top, bottom), (left, right) in BLACKOUT:
+        keep[calibration.y(top):calibration.y(bottom), calibration.x(left):calibration.x(right)] = False
+    # Radii stay whole multiples of the grid step so every offset lands on a sampled pixel
+    step = calibration.length(JUMP)
+    trace = step * (TRACE_RADIUS // JUMP)
+    window = np.mgrid[-trace:trace + 1:step, -trace:trace + 1:step].reshape(2, -1)
+    return MazeGeometry(canvas, keep[..., None], step, _disk(trace, step),
+                        _disk(step * (ERASE_RADIUS // JUMP), step), (window[0], window[1]),
+                        step * (START_STEP // JUMP))
+
+
+def maze_geometry(shape):
+    """Canvas size, blackout mask and trace offsets for frames of this (height, width), built once per resolution"""
+    return calibrate(shape[1], shape[0]).cached("maze", _build_geometry)
+
+def dfs(x, y):
+    global dfs_cnt
+    dfs_cnt += 1
+    if dfs_cnt > 4000:
+        return
+    global count
+    if x < 0 or y < 0 or x >= img.shape[0] or y >= img.shape[1]:
+        return
+    if not (img[x][y] == white).all():
+        return
+    if vis[x][y]:
+        return
+    vis[x][y] = True
+    count += 1
+    next_coords = [(x - jump, y), (x + jump, y), (x, y - jump), (x, y + jump),
+                   (x - 2 * jump, y), (x + 2 * jump, y), (x, y - 2 * jump), (x, y + 2 * jump),
+                   (x - jump, y - jump), (x + jump, y - jump), (x - jump, y + jump), (x + jump, y + jump)]
+    for coord in next_coords:
+        dfs(coord[0], coord[1])
+
+class TraceOverflow(Exception):
+    """Raised when the tracer takes more steps than a maze path can have"""
+
+
+def trace_path(start):
+    """Follows the cluster in vis from start, yielding every waypoint as soon as it is found"""
+    cur = start
+    yield cur
+    recur = 0
+    while True:
+        with timings.span("tracing"):
+            recur += 1
+            if recur > 100:
+                raise TraceOverflow("Maximum recursive exceeded!")
+            trace_i, trace_j = geometry.trace
+            hits = vis[cur[0] + trace_i, cur[1] + trace_j] != 0
+            num_cur = int(hits.sum())
+            if num_cur == 0:
+                return
+            sum_cur = (int(trace_i[hits].sum()), int(trace_j[hits].sum()))
+            next_cur = ((cur[0] + sum_cur[0] // num_cur) // jump * jump, (cur[1] + sum_cur[1] // num_cur) // jump * jump)
+            erase_i, erase_j = geometry.erase
+            img[cur[0] + erase_i, cur[1] + erase_j] = 0
+            vis[cur[0] + erase_i, cur[1] + erase_j] = False
+        cur = next_cur
+        yield next_cur
+
+
+def find_maze(frame):
+    """Looks for the maze check in the frame and returns the start of its path, or None.
+
+    Leaves the padded frame in img and the traced cluster in vis for trace_path.
+    """
+    global img, vis, count, dfs_cnt, geometry, jump
+    height, width = frame.bgr.shape[:2]
+    geometry = maze_geometry((height, width))
+    jump = geometry.jump
+    img = np.zeros(geometry.canvas + (3,))
+    img[:height, :width] = frame.bgr
+    vis = np.zeros(geometry.canvas)
+    img *= geometry.keep
+    with timings.span("is_grey"):
+        for i in range(0, len(img), jump):
+            for j in range(0, len(img[i]), jump):
+                pixel = img[i][j]
+                if is_grey(pixel):
+                    img[i][j] = white
+    with timings.span("clustering"):
+        max_cluster = 0
+        max_coord = (0, 0)
+        for i in range(0, len(img), jump):
+            for j in range(0, len(img[i]), jump):
+                if (img[i][j] == white).all():
+                    if not vis[i][j]:
+                        count = 0
+                        dfs_cnt = 0
+                        dfs(i, j)
+                        if count > max_cluster:
+                            max_cluster = count
+                            max_coord = (i, j)
+    if max_cluster <= 15:
+        return None
+    # Padded past the canvas so the start search window never runs off the edge
+    margin = geometry.window[0].max() + 1
+    vis = np.zeros((geometry.canvas[0] + margin, geometry.canvas[1] + margin))
+    dfs_cnt = 0
+    dfs(max_coord[0], max_coord[1])
+    with timings.span("start_search"):
+        step = geometry.start_step
+        samples = img[::step, ::step]
+        marked = np.zeros(samples.shape[:2], dtype=bool)
+        for rarity in rarities:
+            marked |= np.abs(samples - rarity).sum(axis=2) <= 40
+        window_i, window_j = geometry.window
+        sum_start, num_start = [0, 0], 0
+        for i, j in np.argwhere(marked) * step:
+            if vis[i + window_i, j + window_j].any():
+                sum_start[0] += int(i)
+                sum_start[1] += int(j)
+                num_start += 1
+    if num_start == 0:
+        return None
+    return ((sum_start[0] // num_start // jump) * jump, (sum_start[1] // num_start // jump) * jump)
+
+
+IMAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Images")
+
+
+@lru_cache(maxsize=None)
+def load_template(name):
+    """Reads a button template from the Images folder next to this file, whatever the working directory.
+
+    Each template is read once, on first use, and shared by every caller afterwards.
+    """
+    path = os.path.join(IMAGES, name)
+    template = cv2.imread(path)
+    if template is None:
+        raise FileNotFoundError(f"Cannot read button template {path}")
+    return template
+
+
+def create_detectors():
+    """All checks run on the same screenshot; when several fire, the highest priority wins.
+
+    The templates are matched together on worker threads first. The maze search, which is
+    plain Python and holds the GIL, only runs on the calling thread when neither button matched.
+    """
+    detectors = DetectorRegistry(short_circuit=True)
+    detectors.register_template("ready", load_template("Ready.PNG"), threshold=0.8, priority=3)
+    detectors.register_template("continue", load_template("continue.png"), threshold=0.8, priority=2)
+    detectors.register("maze", find_maze, priority=1, threaded=False)
+    return detectors
+
+
+_detectors = None
+
+
+def solve_frame(frame):
+    """Pipeline worker entry point: classifies the frame and traces the whole maze path.
+
+    Returns (name, result) where result is the button centre or the list of waypoints,
+    or None when nothing was found.
+    """
+    global _detectors
+    if _detectors is None:
+        _detectors = create_detectors()
+    decision = _detectors.run(frame)
+    if decision.name is None:
+        return None
+    if decision.name != "maze":
+        return decision.name, decision.result
+    try:
+        return "maze", list(trace_path(decision.result))
+    except TraceOverflow as e:
+        print(e)
+        return None
@@ -1,23 +1,90 @@
 # By 1234567890regis - luogu = RandomGuy1520 - github
 # Some by 5793__qwq - luogu = 5793qwq - github
-import cv2
-import keyboard
-import numpy as np
+import os
 import sys
-from PIL import Image
-import pyautogui
+import queue
+import threading
 import time
 from time import sleep
-from selenium.webdriver import Chrome, Edge, Firefox, Safari
 import random
 import math
-import pytweening
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "florr_afk_solution"))
+from florr_afk_lazy import lazy_import
+from florr_afk_input import create_backend
+from florr_afk_schedule import Timeline, TimelineRunner
+from florr_afk_detectors import DetectorRegistry
+from florr_afk_timing import timings
+from florr_afk_profile import ProfileTrigger
+from florr_afk_session import SessionWriter
+from florr_afk_history import ArrivalHistory, AdaptiveSchedule
+from florr_afk_governor import CpuGovernor
+from florr_afk_region import RegionTracker
+from florr_afk_idle import IdleProbe
+import maze_solver
+from maze_solver import TraceOverflow, trace_path, create_detectors, load_template
+
+# numpy, OpenCV, the input libraries and the tween functions load on first use
+np = lazy_import("numpy")
+cv2 = lazy_import("cv2")
+keyboard = lazy_import("keyboard")
+pyautogui = lazy_import("pyautogui")
+pytweening = lazy_import("pytweening")
+
+# "pyautogui", "xtest" (X11, batched) or "recording" (headless)
+INPUT_BACKEND = "pyautogui"
+# Move the cursor to the start while the rest of the path is traced. The drag itself waits for the
+# whole path, so a trace that runs away (TraceOverflow) is never dragged
+STREAM_DRAG = True
+# Fit a spline through the traced points and drag through fewer, curvature-picked waypoints.
+# The path is smoothed SMOOTH_WINDOW traced points at a time, and a window whose spline strays
+# more than SMOOTH_TOLERANCE px from the traced points is dragged through them as traced
+SMOOTH_PATH = True
+SMOOTH_WINDOW = 16
+SMOOTH_TOLERANCE = 6
+# Solve frames in worker processes while the next one is captured and the last drag plays back
+PIPELINE = False
+PIPELINE_WORKERS = 1
+# Solutions for frames older than this many seconds are dropped instead of played back
+PIPELINE_MAX_AGE = 10.0
+# Time the hot-path stages; prints a summary every TIMING_INTERVAL seconds and on exit
+TIMING = False
+TIMING_INTERVAL = 60.0
+# Profile the next PROFILE_ITERATIONS frames on ctrl+alt+p or SIGUSR1 ("cprofile" or "sample")
+PROFILE_HOTKEY = "ctrl+alt+p"
+PROFILE_ITERATIONS = 20
+PROFILE_MODE = "cprofile"
+# Record frames, detections and inputs of the sequential loop into one file for
+# `florr_afk_benchmark.py replay` (None to disable); frames are kept at most every SESSION_FRAME_INTERVAL seconds
+# and only until SESSION_BUDGET_MB of frame data has been written (None for no limit)
+RECORD_SESSION = None
+SESSION_FRAME_INTERVAL = 1.0
+SESSION_BUDGET_MB = 2048
+# Log when mazes show up to HISTORY_FILE (None to disable); with ADAPTIVE_SCHEDULE the sequential loop
+# grabs only every ADAPTIVE_SLOW_INTERVAL seconds until the next maze is expected, then at full speed again
+HISTORY_FILE = None
+ADAPTIVE_SCHEDULE = False
+ADAPTIVE_SLOW_INTERVAL = 1.0
+# Keep this process and its pipeline workers under CPU_BUDGET of one core (0.5 = half a core, 0 = no limit);
+# over budget the loop grabs less often and the pipeline solves fewer frames at once. Checked every CPU_BUDGET_WINDOW seconds
+CPU_BUDGET = 0.0
+CPU_BUDGET_WINDOW = 5.0
+# Grab only the game canvas: "auto" finds it from the screen content on start and re-checks it every
+# REGION_CHECK_INTERVAL seconds, a (left, top, width, height) tuple fixes it, None grabs the whole screen
+GAME_REGION = None
+REGION_CHECK_INTERVAL = 5.0
+# While the game view is hidden (minimized, blank) or has not changed for IDLE_STATIC_SECONDS, the sequential
+# loop lets go of the walking keys and grabs only every IDLE_INTERVAL seconds; it resumes on the first live frame
+IDLE_SUSPEND = False
+IDLE_INTERVAL = 5.0
+IDLE_STATIC_SECONDS = 10.0
 
 def generate_random_curve_parameters(driver, pre_origin, post_destination):
     """Generates random parameters for the curve, the tween, number of knots, distortion, target points and boundaries"""
-    web = False
-    if isinstance(driver, (Chrome, Firefox, Edge, Safari)):
-        web = True
+    # A selenium WebDriver has get_window_size(); checked by duck typing so selenium need not be installed
+    web = hasattr(driver, "get_window_size")
+    if web:
         viewport_width, viewport_height = driver.get_window_size().values()
     else:
         viewport_width, viewport_height = driver.size()
@@ -293,109 +360,233 @@ class BezierCalculator:
         return curvePoints
 
 
-class SystemCursor:
-    def __init__(self):
-        pyautogui.MINIMUM_DURATION = 0
-        pyautogui.MINIMUM_SLEEP = 0
-        pyautogui.PAUSE = 0
+class PathSmoother:
+    @staticmethod
+    def bspline_basis(t, knots, degree=3):
+        """Returns the B-spline basis matrix (len(t) x control points) by the Cox-de Boor recursion"""
+        t = np.asarray(t, dtype=float)
+        spans = len(knots) - 1
+        basis = np.zeros((len(t), spans))
+        for i in range(spans):
+            basis[:, i] = (knots[i] <= t) & (t < knots[i + 1])
+        # t == 1 belongs to the last non-empty span
+        last = np.nonzero(knots[:-1] < knots[1:])[0][-1]
+        basis[t >= knots[-1], last] = 1
+        for k in range(1, degree + 1):
+            nxt = np.zeros((len(t), spans - k))
+            for i in range(spans - k):
+                left = knots[i + k] - knots[i]
+                right = knots[i + k + 1] - knots[i + 1]
+                if left > 0:
+                    nxt[:, i] += (t - knots[i]) / left * basis[:, i]
+                if right > 0:
+                    nxt[:, i] += (knots[i + k + 1] - t) / right * basis[:, i + 1]
+            basis = nxt
+        return basis
+
+    @staticmethod
+    def fit(points, smoothing=1.0):
+        """
+        Fits a penalized cubic B-spline to points, parametrized by chord length.
+        Returns a function mapping [0,1] arrays to (n, 2) curve points; both ends are pinned.
+        """
+        pts = np.asarray(points, dtype=float)
+        chord = np.r_[0, np.cumsum(np.hypot(*np.diff(pts, axis=0).T))]
+        t = chord / chord[-1]
+        ctrl_count = max(4, len(pts) // 2)
+        knots = np.r_[[0.0] * 3, np.linspace(0, 1, ctrl_count - 2), [1.0] * 3]
+        basis = PathSmoother.bspline_basis(t, knots)
+        weights = np.ones(len(pts))
+        weights[[0, -1]] = 100
+        penalty = np.diff(np.eye(ctrl_count), 2, axis=0)
+        lhs = basis.T @ (basis * weights[:, None]) + smoothing * penalty.T @ penalty
+        ctrl = np.linalg.solve(lhs, basis.T @ (pts * weights[:, None]))
+        return lambda u: PathSmoother.bspline_basis(u, knots) @ ctrl
+
+    @staticmethod
+    def deviation(waypoints, points):
+        """Returns how far (px) the polyline through waypoints strays from the polyline through points"""
+        waypoints = np.asarray(waypoints, dtype=float)
+        points = np.asarray(points, dtype=float)
+        # Sample the waypoint segments about every pixel
+        samples = [waypoints[:1]]
+        for a, b in zip(waypoints[:-1], waypoints[1:]):
+            count = max(1, int(np.ceil(np.hypot(*(b - a)))))
+            samples.append(a + (b - a) * (np.arange(1, count + 1) / count)[:, None])
+        samples = np.concatenate(samples)
+        if len(points) == 1:
+            return float(np.hypot(*(samples - points[0]).T).max())
+        start, segment = points[:-1], np.diff(points, axis=0)
+        length2 = np.maximum((segment ** 2).sum(axis=1), 1e-9)
+        along = np.clip(((samples[:, None] - start) * segment).sum(axis=2) / length2, 0, 1)
+        nearest = start + along[..., None] * segment
+        return float(np.hypot(*(samples[:, None] - nearest).transpose(2, 0, 1)).min(axis=1).max())
+
+    @staticmethod
+    def smooth(points, max_turn=15, max_segment=60, overshoot=4, smoothing=1.0, tolerance=None):
+        """
+        Replaces a jagged traced path by waypoints on a fitted spline.
+        A waypoint is kept whenever the curve has turned max_turn degrees or run max_segment px
+        since the last one, and the end is extended along the fitted tangent by overshoot
+        times the last traced step.
+        The spline can cut corners of the maze; if the waypoints stray more than tolerance px
+        from the traced points, the traced points themselves are returned (with the same overshoot).
+        """
+        pts = np.asarray(points, dtype=float)
+        # The tracer can stall on a point; repeated points break the chord-length parametrization
+        pts = pts[np.r_[True, np.any(np.diff(pts, axis=0) != 0, axis=1)]]
+        if len(pts) < 2:
+            return [tuple(int(v) for v in p) for p in pts]
+        last_step = np.hypot(*(pts[-1] - pts[-2]))
+        if len(pts) < 4:
+            dense = pts
+        else:
+            length = np.hypot(*np.diff(pts, axis=0).T).sum()
+            dense = PathSmoother.fit(pts, smoothing)(np.linspace(0, 1, max(50, int(length / 2))))
+
+        segments = np.diff(dense, axis=0)
+        headings = np.arctan2(segments[:, 1], segments[:, 0])
+        lengths = np.hypot(segments[:, 0], segments[:, 1])
+        waypoints = [dense[0]]
+        turned, run = 0.0, 0.0
+        for i in range(1, len(segments)):
+            turn = (headings[i] - headings[i - 1] + np.pi) % (2 * np.pi) - np.pi
+            turned += abs(turn)
+            run += lengths[i - 1]
+            if math.degrees(turned) >= max_turn or run >= max_segment:
+                waypoints.append(dense[i])
+                turned, run = 0.0, 0.0
+        waypoints.append(dense[-1])
+        waypoints = np.round(waypoints)
+
+        if tolerance is not None and PathSmoother.deviation(waypoints, pts) > tolerance:
+            waypoints, segments, lengths = pts, np.diff(pts, axis=0), np.hypot(*np.diff(pts, axis=0).T)
+        if overshoot:
+            tangent = segments[-1] / max(lengths[-1], 1e-9)
+            waypoints = np.vstack([waypoints, waypoints[-1] + tangent * overshoot * last_step])
+        return [(int(round(p[0])), int(round(p[1]))) for p in waypoints]
 
     @staticmethod
-    def move_to(point: list or tuple, duration: int or float = None, human_curve=None, steady=False):
+    def smooth_stream(points, start, window=16, tolerance=None, **kwargs):
+        """
+        Smooths a path window by window as its points arrive, yielding waypoints after start.
+        Each window begins at the last traced point of the one before, where both are pinned, so the
+        pieces join; only the final window gets the overshoot.
+        """
+        chunk = [start]
+        for point in points:
+            chunk.append(point)
+            if len(chunk) > window + 1:
+                # Keep the newest point back so the path never ends on a window without the overshoot
+                yield from PathSmoother.smooth(chunk[:-1], overshoot=0, tolerance=tolerance, **kwargs)[1:]
+                chunk = chunk[-2:]
+        if len(chunk) > 1:
+            yield from PathSmoother.smooth(chunk, tolerance=tolerance, **kwargs)[1:]
+
+
+class SystemCursor:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def move_to(self, point: list or tuple, duration: int or float = None, human_curve=None, steady=False):
         """Moves to certain coordinates of screen"""
-        from_point = pyautogui.position()
-
-        if not human_curve:
-            (
-                offset_boundary_x,
-                offset_boundary_y,
-                knots_count,
-                distortion_mean,
-                distortion_st_dev,
-                distortion_frequency,
-                tween,
-                target_points,
-            ) = generate_random_curve_parameters(
-                pyautogui, from_point, point
-            )
-            if steady:
-                offset_boundary_x, offset_boundary_y = 10, 10
-                distortion_mean, distortion_st_dev, distortion_frequency = 1.2, 1.2, 1
-            human_curve = HumanizeMouseTrajectory(
-                from_point,
-                point,
-                offset_boundary_x=offset_boundary_x,
-                offset_boundary_y=offset_boundary_y,
-                knots_count=knots_count,
-                distortion_mean=distortion_mean,
-                distortion_st_dev=distortion_st_dev,
-                distortion_frequency=distortion_frequency,
-                tween=tween,
-                target_points=target_points,
-            )
+        from_point = self.backend.position()
+
+        with timings.span("trajectory"):
+            if not human_curve:
+                (
+                    offset_boundary_x,
+                    offset_boundary_y,
+                    knots_count,
+                    distortion_mean,
+                    distortion_st_dev,
+                    distortion_frequency,
+                    tween,
+                    target_points,
+                ) = generate_random_curve_parameters(
+                    self.backend, from_point, point
+                )
+                if steady:
+                    offset_boundary_x, offset_boundary_y = 10, 10
+                    distortion_mean, distortion_st_dev, distortion_frequency = 1.2, 1.2, 1
+                human_curve = HumanizeMouseTrajectory(
+                    from_point,
+                    point,
+                    offset_boundary_x=offset_boundary_x,
+                    offset_boundary_y=offset_boundary_y,
+                    knots_count=knots_count,
+                    distortion_mean=distortion_mean,
+                    distortion_st_dev=distortion_st_dev,
+                    distortion_frequency=distortion_frequency,
+                    tween=tween,
+                    target_points=target_points,
+                )
 
         if duration is None:
             duration = random.uniform(0.5, 2.0)
-        pyautogui.PAUSE = duration / len(human_curve.points)
-        for pnt in human_curve.points:
-            pyautogui.moveTo(pnt)
-            # print(pnt)
-        pyautogui.moveTo(point)
-
-    @staticmethod
-    def move_to_short(point: list or tuple, duration: int or float = None, human_curve=None, steady=False):
+        pause = duration / len(human_curve.points)
+        with timings.span("playback"), self.backend.batch():
+            for pnt in human_curve.points:
+                self.backend.move_to(pnt[0], pnt[1], delay=pause)
+                # print(pnt)
+            self.backend.move_to(point[0], point[1], delay=pause)
+
+    def move_to_short(self, point: list or tuple, duration: int or float = None, human_curve=None, steady=False):
         """Moves to certain coordinates of screen"""
-        from_point = pyautogui.position()
+        from_point = self.backend.position()
         from_point = (from_point[0] * 10, from_point[1] * 10)
         point[0] *= 10
         point[1] *= 10
-        if not human_curve:
-            (
-                offset_boundary_x,
-                offset_boundary_y,
-                knots_count,
-                distortion_mean,
-                distortion_st_dev,
-                distortion_frequency,
-                tween,
-                target_points,
-            ) = generate_random_curve_parameters(
-                pyautogui, from_point, point
-            )
-            if steady:
-                offset_boundary_x, offset_boundary_y = 5, 5
-                distortion_mean, distortion_st_dev, distortion_frequency = 1.1, 1.1, 1
-            human_curve = HumanizeMouseTrajectory(
-                from_point,
-                point,
-                offset_boundary_x=offset_boundary_x,
-                offset_boundary_y=offset_boundary_y,
-                knots_count=knots_count,
-                distortion_mean=distortion_mean,
-                distortion_st_dev=distortion_st_dev,
-                distortion_frequency=distortion_frequency,
-                tween=tween,
-                target_points=target_points,
-            )
+        with timings.span("trajectory"):
+            if not human_curve:
+                (
+                    offset_boundary_x,
+                    offset_boundary_y,
+                    knots_count,
+                    distortion_mean,
+                    distortion_st_dev,
+                    distortion_frequency,
+                    tween,
+                    target_points,
+                ) = generate_random_curve_parameters(
+                    self.backend, from_point, point
+                )
+                if steady:
+                    offset_boundary_x, offset_boundary_y = 5, 5
+                    distortion_mean, distortion_st_dev, distortion_frequency = 1.1, 1.1, 1
+                human_curve = HumanizeMouseTrajectory(
+                    from_point,
+                    point,
+                    offset_boundary_x=offset_boundary_x,
+                    offset_boundary_y=offset_boundary_y,
+                    knots_count=knots_count,
+                    distortion_mean=distortion_mean,
+                    distortion_st_dev=distortion_st_dev,
+                    distortion_frequency=distortion_frequency,
+                    tween=tween,
+                    target_points=target_points,
+                )
 
         if duration is None:
             duration = random.uniform(0.5, 2.0)
-        pyautogui.PAUSE = duration / len(human_curve.points)
+        pause = duration / len(human_curve.points)
         lst = [0, 0]
-        for pnt in human_curve.points:
-            if lst != [pnt[0] // 10, pnt[1] // 10]:
-                pyautogui.moveTo(pnt[0] // 10, pnt[1] // 10)
-                # print(pnt[0] // 10, pnt[1] // 10)
-            lst = [pnt[0] // 10, pnt[1] // 10]
-        pyautogui.moveTo(point[0] // 10, point[1] // 10)
-        # print(point[0] // 10, point[1] // 10)
+        with timings.span("playback"), self.backend.batch():
+            for pnt in human_curve.points:
+                if lst != [pnt[0] // 10, pnt[1] // 10]:
+                    self.backend.move_to(pnt[0] // 10, pnt[1] // 10, delay=pause)
+                    # print(pnt[0] // 10, pnt[1] // 10)
+                lst = [pnt[0] // 10, pnt[1] // 10]
+            self.backend.move_to(point[0] // 10, point[1] // 10, delay=pause)
+            # print(point[0] // 10, point[1] // 10)
 
     def click_on(self, point: list or tuple, clicks: int = 1, click_duration: int or float = 0, steady=False):
         """Clicks a specified number of times, on the specified coordinates"""
         self.move_to(point, steady=steady)
         for _ in range(clicks):
-            pyautogui.mouseDown()
-            sleep(click_duration)
-            pyautogui.mouseUp()
+            with self.backend.batch():
+                self.backend.mouse_down()
+                self.backend.mouse_up(delay=click_duration)
             sleep(random.uniform(0.170, 0.280))
 
     def drag_and_drop(self, from_point: list or tuple, to_point: list or tuple, duration: int or float or [float, float] or (float, float) = None, steady=False):
@@ -408,242 +599,343 @@ class SystemCursor:
             first_duration = second_duration = None
 
         self.move_to(from_point, duration=first_duration)
-        pyautogui.mouseDown()
+        self.backend.mouse_down()
         self.move_to(to_point, duration=second_duration, steady=steady)
-        pyautogui.mouseUp()
+        self.backend.mouse_up()
+
+# Built by init() at start-up rather than on import, since pipeline workers import this file too
+backend = None
+cursor = None
+walker = None
+detectors = None
+# Polled on its own while waiting for the ready button after a continue
+ready_check = None
+# Key-hold routines in seconds; walker plays them in the background so detection keeps running
+MOVE_ROUTINE = Timeline().then(219, 'w').then(30, 'a').then(90, 'a', 's').then(110, 'w')
+MOVE2_ROUTINE = (Timeline().then(0.05, 'l', '2').then(0.05)
+                 .then(30, 'a').then(90, 'a', 's').then(110, 'w')
+                 .then(0.05, 'l', '0').then(0.05))
+profiler = ProfileTrigger(PROFILE_ITERATIONS, PROFILE_MODE, prefix="new_afk_profile")
+
+
+def init(input_backend=None):
+    """Creates the input backend (INPUT_BACKEND unless one is given), the cursor, the walker and the detectors"""
+    global backend, cursor, walker, detectors, ready_check
+    backend = input_backend or create_backend(INPUT_BACKEND, keys="pyautogui")
+    cursor = SystemCursor(backend)
+    walker = TimelineRunner(backend)
+    detectors = create_detectors()
+    ready_check = DetectorRegistry()
+    ready_check.register_template("ready", load_template("Ready.PNG"), threshold=0.8)
 
-grey_colors = [[110, 135, 87], [107, 149, 157], [104, 142, 149], [93, 101, 113], [100, 112, 128], [111, 157, 165],
-               [116, 144, 153], [108, 130, 139], [114, 143, 150], [96, 96, 96],
-               [137, 149, 155], [141, 153, 159], [135, 146, 151], [161, 155, 143]]  # Desert
-
-def is_grey(px):
-    if (px == [79, 106, 111]).all() or (px == [84, 117, 123]).all() or (px == [82, 112, 117]).all():
-        return False
-    if 130 >= px[2] >= 100 >= px[0] >= 85 and 95 <= px[1] <= 115:
-        return True
-    for gc in grey_colors:
-        if abs(px[0] - gc[0]) + abs(px[1] - gc[1]) + abs(px[2] - gc[2]) <= 30:
-            return True
-    return False
-
-time.sleep(3)
-sys.setrecursionlimit(5000)
-rarities = [[109, 239, 126], [93, 230, 255], [227, 82, 77], [222, 31, 134], [31, 31, 222], [222, 219, 31],
-            [117, 43, 255], [163, 255, 43]]
-white = [255, 255, 254]
-jump = 5
-cursor = SystemCursor()
-count = 0
-dfs_cnt = 0
-
-def dfs(x, y):
-    global dfs_cnt
-    dfs_cnt += 1
-    if dfs_cnt > 4000:
-        return
-    global count
-    if x < 0 or y < 0 or x >= img.shape[0] or y >= img.shape[1]:
-        return
-    if not (img[x][y] == white).all():
-        return
-    if vis[x][y]:
-        return
-    vis[x][y] = True
-    count += 1
-    next_coords = [(x - jump, y), (x + jump, y), (x, y - jump), (x, y + jump),
-                   (x - 2 * jump, y), (x + 2 * jump, y), (x, y - 2 * jump), (x, y + 2 * jump),
-                   (x - jump, y - jump), (x + jump, y - jump), (x - jump, y + jump), (x + jump, y + jump)]
-    for coord in next_coords:
-        dfs(coord[0], coord[1])
 
 def move(number):
-    pyautogui.keyDown('w')
-    time.sleep(219)
-    pyautogui.keyUp('w')
-    pyautogui.keyDown('a')
-    time.sleep(30)
-    pyautogui.keyUp('a')
-    pyautogui.keyDown('a')
-    pyautogui.keyDown('s')
-    time.sleep(90)
-    pyautogui.keyUp('a')
-    pyautogui.keyUp('s')
-    pyautogui.keyDown('w')
-    time.sleep(110)
-    pyautogui.keyUp('w')
+    walker.start(MOVE_ROUTINE)
 def move2(number):
-    pyautogui.keyDown('l')
-    pyautogui.keyDown('2')
-    time.sleep(0.05)
-    pyautogui.keyUp('l')
-    pyautogui.keyUp('2')
-    time.sleep(0.05)
-    pyautogui.keyDown('a')
-    time.sleep(30)
-    pyautogui.keyUp('a')
-    pyautogui.keyDown('a')
-    pyautogui.keyDown('s')
-    time.sleep(90)
-    pyautogui.keyUp('a')
-    pyautogui.keyUp('s')
-    pyautogui.keyDown('w')
-    time.sleep(110)
-    pyautogui.keyUp('w')
-
-while True:
-    if keyboard.is_pressed('q'):
-        break
-    time.sleep(1)
-    round_count = 0
+    walker.start(MOVE2_ROUTINE)
+
+class WaypointStream:
+    """Runs a waypoint generator on a worker thread so tracing overlaps the cursor travel.
+
+    The consumer blocks whenever it catches up with the tracer, and the tracer
+    blocks once it is `lookahead` waypoints ahead of the consumer.
+    """
+    _END = object()
+
+    def __init__(self, waypoints, lookahead=32):
+        self._queue = queue.Queue(maxsize=lookahead)
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._produce, args=(waypoints,), daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._closed:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
 
-while True:
-    if keyboard.is_pressed('q'):
-        break
-    for people in range(2):
-        imgObj = pyautogui.screenshot()
-        imgArr = cv2.cvtColor(np.array(imgObj), cv2.COLOR_RGB2BGR)
-        ready = Image.open("Images/Ready.PNG")
-        continues = Image.open("Images/continue.PNG")
+    def _produce(self, waypoints):
         try:
-            box = pyautogui.locateOnScreen(ready, grayscale=False, confidence=0.8)
-            if box is not None:
-                x_center = box.left  + box.width  // 2  
-                y_center = box.top  + box.height  // 2 
-                pyautogui.click(x_center,  y_center)
-                pyautogui.click()
-                continue
-        except:
-            pass
+            for point in waypoints:
+                if not self._put(point):
+                    return
+        except Exception as e:
+            self._error = e
+        self._put(self._END)
+
+    def __iter__(self):
         try:
-            box = pyautogui.locateOnScreen(continues, grayscale=False, confidence=0.8)
-            if box is not None:
-                x_center = box.left  + box.width  // 2  
-                y_center = box.top  + box.height  // 2 
-                pyautogui.click(x_center,  y_center)
-                for i in range(25):
-                    try:
-                        box = pyautogui.locateOnScreen(ready, grayscale=False, confidence=0.8)
-                        if box is not None:
-                            x_center = box.left  + box.width  // 2  
-                            y_center = box.top  + box.height  // 2 
-                            pyautogui.click(x_center,  y_center)
-                        continue
-                    except:
-                        time.sleep(1)
-                        pass
-                move2(people)
-                pyautogui.keyDown('l')
-                pyautogui.keyDown('0')
-                time.sleep(0.05)
-                pyautogui.keyUp('l')
-                pyautogui.keyUp('0')
-                time.sleep(0.05)
-                continue
-        except:
-            pass
-        round_count = (round_count + 1) % 20
-        cv2.imwrite("Log/log" + str(round_count) + ".png", imgArr)
-        img = np.zeros((1400, 2200, 3))
-        img[:imgArr.shape[0], :imgArr.shape[1]] = imgArr
-        cv2.imwrite("new.PNG", img)
-        vis = np.zeros((1400, 2200))
-        for i in range(0, 300, jump):
-            for j in range(0, 400, jump):
-                img[i][j] = [0, 0, 0]
-        for i in range(910, 1070, jump):
-            for j in range(550, 1360, jump):
-                img[i][j] = [0, 0, 0]
-        for i in range(0, len(img), jump):
-            for j in range(0, len(img[i]), jump):
-                pixel = img[i][j]
-                if is_grey(pixel):
-                    img[i][j] = white
-        cv2.imwrite("new.PNG", img)
-        max_cluster = 0
-        max_coord = (0, 0)
-        for i in range(0, len(img), jump):
-            for j in range(0, len(img[i]), jump):
-                if (img[i][j] == white).all():
-                    if not vis[i][j]:
-                        count = 0
-                        dfs_cnt = 0
-                        dfs(i, j)
-                        if count > max_cluster:
-                            max_cluster = count
-                            max_coord = (i, j)
-        if max_cluster <= 15:
-            continue
-        vis = np.zeros((2000, 2000))
-        dfs_cnt = 0
-        dfs(max_coord[0], max_coord[1])
-        sum_start, num_start = [0, 0], 0
-        for i in range(0, len(img), 10):
-            for j in range(0, len(img[i]), 10):
-                pixel = img[i][j]
-                flag = False
-                for rarity in rarities:
-                    if abs(rarity[0] - pixel[0]) + abs(rarity[1] - pixel[1]) + abs(rarity[2] - pixel[2]) <= 40:
-                        for k in range(i - 25, i + 30, 5):
-                            for l in range(j - 25, j + 30, 5):
-                                if vis[k][l]:
-                                    flag = True
-                                    sum_start[0] += i
-                                    sum_start[1] += j
-                                    num_start += 1
-                                    break
-                            if flag:
-                                break
-                        if flag:
-                            break
-        if num_start == 0:
-            continue
-        start = ((sum_start[0] // num_start // jump) * jump, (sum_start[1] // num_start // jump) * jump)
-        print("Detected:", start)
-        cur = start
-        stack = [cur]
-        recur = 0
-        while True:
-            recur += 1
-            if recur > 100:
-                print("Maximum recursive exceeded!")
-                stack = []
-                break
-            sum_cur, num_cur = [0, 0], 0
-            for i in range(-25, 30, jump):
-                for j in range(-25, 30, jump):
-                    if i * i + j * j <= 625 and vis[cur[0] + i][cur[1] + j]:
-                        sum_cur[0] += i
-                        sum_cur[1] += j
-                        num_cur += 1
-            if num_cur == 0:
-                break
-            next_cur = ((cur[0] + sum_cur[0] // num_cur) // jump * jump, (cur[1] + sum_cur[1] // num_cur) // jump * jump)
-            for i in range(-20, 25, jump):
-                for j in range(-20, 25, jump):
-                    if i * i + j * j <= 400:
-                        img[cur[0] + i][cur[1] + j] = [0, 0, 0]
-                        vis[cur[0] + i][cur[1] + j] = False
-            cur = next_cur
-            stack.append(next_cur)
-        if not stack:
-            continue
-        cursor.move_to([stack[0][1], stack[0][0]])
-        pyautogui.click()
-        img[stack[0][0]][stack[0][1]] = [0, 255, 0]
-        if len(stack) >= 2:
+            while True:
+                point = self._queue.get()
+                if point is self._END:
+                    break
+                yield point
+        finally:
+            self.close()
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        """Stops the tracer if the consumer gives up early"""
+        self._closed = True
+        self._thread.join()
+
+
+def drag_path(waypoints, smooth=False):
+    """Moves to the first waypoint, clicks it, then holds the mouse and follows the rest.
+
+    The rest of the path is collected while the cursor travels, but nothing is clicked until
+    the tracer has finished, so a TraceOverflow reaches the caller before any button is pressed.
+    The drag overshoots the last waypoint by 4 steps along the final segment.
+    With smooth, the path is dragged through PathSmoother.smooth_stream waypoints instead, which
+    end with the same 4-step overshoot along the fitted tangent, so no extra steps are added here.
+    Returns every point the cursor was sent to.
+    """
+    waypoints = iter(waypoints)
+    first = next(waypoints, None)
+    if first is None:
+        return []
+    cursor.move_to([first[1], first[0]])
+    waypoints = list(waypoints)
+    backend.click()
+    dragged = [first]
+    duration = 0.25
+
+    def step(point):
+        nonlocal duration
+        duration += random.uniform(-0.1, 0.1)
+        if duration < 0.15:
+            duration = 0.15
+        if duration > 0.4:
+            duration = 0.4
+        cursor.move_to_short([point[1], point[0]], steady=True, duration=duration)
+        dragged.append(point)
+
+    if smooth:
+        waypoints = PathSmoother.smooth_stream(waypoints, first, SMOOTH_WINDOW, SMOOTH_TOLERANCE)
+
+    backend.mouse_down()
+    try:
+        for point in waypoints:
+            step(point)
+        if len(dragged) >= 2 and not smooth:
             for i in range(4):
-                lst = stack[-1]
-                lst_lst = stack[-2]
-                stack.append((2 * lst[0] - lst_lst[0], 2 * lst[1] - lst_lst[1]))
-        pyautogui.mouseDown()
-        duration = 0.25
-        for i in range(1, len(stack)):
-            duration += random.uniform(-0.1, 0.1)
-            if duration < 0.15:
-                duration = 0.15
-            if duration > 0.4:
-                duration = 0.4
-            cursor.move_to_short([stack[i][1], stack[i][0]], steady=True, duration=duration)
-            img[stack[i][0]][stack[i][1]] = [0, 255, 0]
-        pyautogui.mouseUp()
-        cv2.imwrite("new.PNG", img)
\ No newline at end of file
+                lst = dragged[-1]
+                lst_lst = dragged[-2]
+                step((2 * lst[0] - lst_lst[0], 2 * lst[1] - lst_lst[1]))
+    finally:
+        backend.mouse_up()
+    return dragged
+
+
+screen_region = None
+region_tracker = None
+
+
+def screenshot(region=None):
+    """Screenshot of region, or of the whole screen, as a BGR array"""
+    with timings.span("screenshot"):
+        image = pyautogui.screenshot(region=region) if region else pyautogui.screenshot()
+    with timings.span("color_convert"):
+        return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+
+
+def grab():
+    """Screenshot of the game region as a BGR array"""
+    return screenshot(screen_region)
+
+
+def use_region(region):
+    """Grabs only region from now on; clicks and drags are then given relative to its corner"""
+    global screen_region
+    screen_region = tuple(region) if region else None
+    backend.set_origin(*(screen_region[:2] if screen_region else (0, 0)))
+    print("Game region:", screen_region or "whole screen")
+
+
+def track_region(force=False):
+    """Re-checks the auto-detected region when it is due (or now, when forced) and follows it if it moved"""
+    if region_tracker is not None and region_tracker.check(force):
+        use_region(region_tracker.region)
+
+
+def wait_while_idle(frame):
+    """Returns frame if the game view is live, else waits at IDLE_INTERVAL until it is and returns that frame"""
+    status = idle_probe.check(frame)
+    if status == "normal":
+        return frame
+    print("Game view is", status + ", suspended")
+    started = time.time()
+    walker.pause()
+    try:
+        while status != "normal" and not keyboard.is_pressed('q'):
+            time.sleep(IDLE_INTERVAL)
+            frame = grab()
+            status = idle_probe.check(frame)
+    finally:
+        walker.resume()
+    print(f"Game view is back after {time.time() - started:.0f}s")
+    return frame
+
+
+def press_continue(position, people):
+    """Clicks continue, keeps clicking ready while it shows up, then walks the next route"""
+    backend.click(*position)
+    for i in range(25):
+        ready = ready_check.run(grab()).result
+        if ready is not None:
+            backend.click(*ready)
+            continue
+        time.sleep(1)
+    move2(people)
+
+
+def act(solution):
+    """Pipeline action stage: plays back whatever a worker found in a frame"""
+    name, result = solution
+    if name == "ready":
+        backend.click(*result)
+        backend.click()
+    elif name == "continue":
+        press_continue(result, 0)
+    else:
+        print("Detected:", result[0])
+        walker.pause()
+        try:
+            drag_path(result, smooth=SMOOTH_PATH)
+        finally:
+            walker.resume()
+
+
+def run_pipelined():
+    """Solves frame N in a worker process while frame N+1 is captured and the drag for N-1 plays"""
+    # multiprocessing is only needed here, so the sequential loop starts without it
+    from florr_afk_pipeline import FramePipeline
+    pipeline = FramePipeline(grab, maze_solver.solve_frame, act,
+                             workers=PIPELINE_WORKERS, max_age=PIPELINE_MAX_AGE, governor=governor)
+    try:
+        def should_stop():
+            profiler.tick()
+            track_region()
+            return keyboard.is_pressed('q')
+
+        pipeline.run(should_stop=should_stop)
+    finally:
+        walker.stop()
+        print(pipeline.format_report())
+
+
+session = None
+schedule = None
+governor = CpuGovernor(CPU_BUDGET, CPU_BUDGET_WINDOW)
+idle_probe = IdleProbe(static_seconds=IDLE_STATIC_SECONDS)
+
+
+def record_decision(frame, decision):
+    """Keeps the frame and what the detectors made of it; frames with a hit are always kept"""
+    index = session.add_frame(frame, force=decision.name is not None)
+    if index is not None:
+        session.add_event("detection", {"frame": index, "name": decision.name, "result": decision.result})
+
+
+def run_sequential():
+    round_count = 0
+    while True:
+        if keyboard.is_pressed('q'):
+            walker.stop()
+            break
+        for people in range(2):
+            profiler.tick()
+            track_region()
+            imgArr = grab()
+            if IDLE_SUSPEND:
+                imgArr = wait_while_idle(imgArr)
+            decision = detectors.run(imgArr)
+            if session is not None:
+                record_decision(imgArr, decision)
+            governor.update()
+            if decision.name == "maze" and schedule is not None:
+                schedule.observe(time.time(), decision.name)
+            if decision.name == "ready":
+                backend.click(*decision.result)
+                backend.click()
+                continue
+            if decision.name == "continue":
+                press_continue(decision.result, people)
+                continue
+            round_count = (round_count + 1) % 20
+            cv2.imwrite("Log/log" + str(round_count) + ".png", imgArr)
+            if decision.name != "maze":
+                if decision.name is None:
+                    wait = schedule.interval(time.time()) if ADAPTIVE_SCHEDULE and schedule is not None else 0.0
+                    time.sleep(governor.interval(wait))
+                continue
+            start = decision.result
+            print("Detected:", start)
+            # Let go of the walking keys while the check is solved
+            walker.pause()
+            if STREAM_DRAG:
+                # The cursor heads for start while the rest of the path is traced
+                # and drag_path holds the click until tracing has finished
+                waypoints = WaypointStream(trace_path(start))
+            else:
+                try:
+                    waypoints = list(trace_path(start))
+                except TraceOverflow as e:
+                    print(e)
+                    walker.resume()
+                    # A path that runs away may mean the canvas moved
+                    track_region(force=True)
+                    continue
+            try:
+                stack = drag_path(waypoints, smooth=SMOOTH_PATH)
+            except TraceOverflow as e:
+                # Raised before drag_path pressed anything, so only the cursor has moved
+                print(e)
+                track_region(force=True)
+                continue
+            finally:
+                walker.resume()
+            for point in stack:
+                maze_solver.img[point[0]][point[1]] = [0, 255, 0]
+            cv2.imwrite("new.PNG", maze_solver.img)
+
+
+if __name__ == "__main__":
+    # Pipeline workers import this file too, so nothing below may run on import
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    init()
+    if TIMING:
+        timings.enable(TIMING_INTERVAL, "timing.json", report=print)
+    profiler.install_signal()
+    if PROFILE_HOTKEY:
+        profiler.install_hotkey(PROFILE_HOTKEY)
+    # Starts as soon as q is released, so the loop below does not see it still held and stop at once
+    keyboard.wait('q', trigger_on_release=True)
+    if GAME_REGION == "auto":
+        region_tracker = RegionTracker(screenshot, REGION_CHECK_INTERVAL)
+        use_region(region_tracker.locate())
+    elif GAME_REGION:
+        use_region(GAME_REGION)
+    if RECORD_SESSION:
+        session = SessionWriter(RECORD_SESSION, SESSION_FRAME_INTERVAL,
+                                {"target": "new_afk", "screen_region": screen_region},
+                                max_bytes=SESSION_BUDGET_MB and SESSION_BUDGET_MB * 2**20)
+        backend.add_observer(session.input_observer)
+    if HISTORY_FILE:
+        schedule = AdaptiveSchedule(ArrivalHistory(HISTORY_FILE), "maze", base=0.0, fast=0.0,
+                                    slow=ADAPTIVE_SLOW_INTERVAL)
+    try:
+        if PIPELINE:
+            run_pipelined()
+        else:
+            run_sequential()
+    finally:
+        if session is not None:
+            session.close()
+        if schedule is not None:
+            schedule.history.close()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Florr.io 自动AFK脚本 - asyncio运行时
+截图、弹窗检测、状态检测和策略执行作为并发任务运行，检测到弹窗时可以立即打断正在执行的移动模式
+"""
+
+import random
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from florr_afk_frames import FrameProducer
+from florr_afk_logging import log_event
+from florr_afk_region import to_screen
+from florr_afk_idle import IDLE_STATUSES
+from florr_afk_schedule import TimelineRunner, compile_pattern
+
+logger = logging.getLogger("FlorAFK")
+
+
+class AsyncRuntime:
+    """FlorAFKBot的asyncio运行时
+
+    OpenCV截图和检测等阻塞操作放到线程池执行，事件循环本身只负责调度。
+    弹窗响应时间的上限约为一个截图间隔加一次检测的耗时，而不再是整个移动模式加移动间隔。
+    """
+
+    def __init__(self, bot, frame_producer=None):
+        self.bot = bot
+        self.config = bot.config
+        # 没有传入共享截图时自己创建，并负责启动和停止
+        self._owns_frames = frame_producer is None
+        if frame_producer is None:
+            frame_producer = FrameProducer(
+                bot.image_recognition.capture_screen,
+                self.config.get("capture_interval", 0.5)
+            )
+        self.frames = frame_producer
+        self._config_version = None
+        self._refresh_config()
+        self._executor = None
+        self._action_lock = None
+        self._strategy_allowed = None
+        self._strategy_task = None
+
+    def _refresh_config(self):
+        """配置重新加载后更新缓存的配置项，没有变化时只比较版本号"""
+        version = getattr(self.config, "version", None)
+        if self._config_version is not None and version == self._config_version:
+            return
+        self._config_version = version
+        self.run_time_limit = self.config.get("run_time", 0)
+        self.check_interval = self.config.get("check_interval", 5.0)
+        self.movement_interval = self.config.get("movement_interval", [2.0, 5.0])
+        self.capture_interval = self.config.get("capture_interval", 0.5)
+        if self._owns_frames:
+            self.frames.interval = self._frame_interval
+
+    def _frame_interval(self):
+        """截图间隔，按CPU预算节流；挂起期间为 idle_interval"""
+        if self.bot.suspended:
+            return self.bot.idle_interval
+        return self.bot.governor.interval(self.capture_interval)
+
+    async def _blocking(self, func, *args):
+        """在线程池中执行阻塞函数"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def run(self):
+        """运行所有任务，直到机器人停止或某个任务出错"""
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="FlorAFK")
+        self.frames.start()
+        self._action_lock = asyncio.Lock()
+        self._strategy_allowed = asyncio.Event()
+        self._strategy_allowed.set()
+
+        tasks = [
+            asyncio.create_task(self._popup_loop()),
+            asyncio.create_task(self._status_loop()),
+            asyncio.create_task(self._strategy_loop()),
+            asyncio.create_task(self._supervisor_loop()),
+        ]
+        try:
+            # 任何一个任务结束都意味着机器人停止或出错
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            self.bot.running = False
+            # 正在执行的移动模式也要取消，让它释放按住的键
+            if self._strategy_task is not None:
+                tasks.append(self._strategy_task)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self._owns_frames:
+                self.frames.stop()
+            self._executor.shutdown(wait=False)
+
+    async def _supervisor_loop(self):
+        """检查运行时间限制和配置文件是否被修改，并按CPU预算调整节流级别"""
+        while self.bot.running:
+            self.bot.refresh_config()
+            self._refresh_config()
+            self.bot._govern()
+            run_time_limit = self.run_time_limit
+            if run_time_limit > 0 and self.bot.start_time:
+                elapsed_time = (self.bot.clock.time() - self.bot.start_time) / 60
+                if elapsed_time >= run_time_limit:
+                    log_event("run_time_limit", f"达到运行时间限制 ({run_time_limit}分钟)，停止AFK机器人",
+                              minutes=run_time_limit)
+                    self.bot.running = False
+                    break
+            await asyncio.sleep(1.0)
+
+    async def _popup_loop(self):
+        """对共享截图的每一张新帧检测AFK弹窗"""
+        subscription = self.frames.subscribe()
+        metrics = self.bot.metrics
+        metrics.counter_func("frames_skipped", lambda: subscription.skipped)
+        while self.bot.running:
+            frame = await self._blocking(subscription.next, 0.5)
+            if frame is None or not self.bot.running:
+                continue
+            if self.bot.suspended:
+                # 挂起期间只检查画面是否恢复
+                status = await self._blocking(self.bot.image_recognition.detect_game_status, frame.image)
+                await self._apply_idle(status)
+                continue
+
+            self.bot.profiler.tick()
+            metrics.inc("loop_iterations")
+            decision = await self._blocking(self.bot.detectors.run, frame.image)
+            metrics.observe("detection_latency", decision.elapsed)
+            self.bot._record_decision(frame.image, decision)
+            if decision.result:
+                self.bot._record_arrival(decision)
+                metrics.inc("popups_detected")
+                await self._handle_popup(decision.result)
+
+    async def _status_loop(self):
+        """按检查间隔检测游戏状态"""
+        while self.bot.running:
+            check_interval = self.check_interval
+            frame = self.frames.latest()
+            if frame is not None:
+                try:
+                    status = await self._blocking(self.bot.image_recognition.detect_game_status, frame.image)
+                    # 状态异常时先确认游戏区域没有移动，画面不可见或静止时按正常的间隔检查
+                    await self._blocking(self.bot._track_region, status not in ("normal",) + IDLE_STATUSES)
+                    if not await self._apply_idle(status) and status != "normal":
+                        log_event("game_status", f"检测到游戏状态异常: {status}", logging.WARNING, status=status)
+                        async with self._action_lock:
+                            await self._preempt()
+                            try:
+                                await self._blocking(self.bot._recover_from_error, status)
+                            finally:
+                                self._strategy_allowed.set()
+                except Exception as e:
+                    logger.error(f"状态检测出错: {e}")
+                    await asyncio.sleep(check_interval)
+            await asyncio.sleep(check_interval)
+
+    async def _apply_idle(self, status):
+        """按游戏状态进入或退出挂起状态，挂起时暂停策略执行，返回状态是否为空闲状态"""
+        was_suspended = self.bot.suspended
+        idle = self.bot._update_suspension(status)
+        if self.bot.suspended and not was_suspended:
+            async with self._action_lock:
+                await self._preempt()
+        elif was_suspended and not self.bot.suspended:
+            if self._owns_frames:
+                self.frames.wake()
+            self._strategy_allowed.set()
+        return idle
+
+    async def _handle_popup(self, popup_position):
+        """打断移动模式并点击弹窗"""
+        async with self._action_lock:
+            await self._preempt()
+            try:
+                log_event("popup_detected", f"检测到AFK弹窗，点击位置: {popup_position}",
+                          x=popup_position[0], y=popup_position[1])
+                x, y = to_screen(popup_position, self.bot.screen_region)
+                await self._blocking(self.bot.input_controller.click, x, y)
+                self.bot.metrics.inc("popups_clicked")
+                await asyncio.sleep(random.uniform(1.0, 2.0))
+            finally:
+                self._strategy_allowed.set()
+
+    async def _preempt(self):
+        """暂停策略执行，并取消正在执行的移动模式"""
+        self._strategy_allowed.clear()
+        task = self._strategy_task
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.wait({task})
+
+    async def _strategy_loop(self):
+        """循环执行区域策略"""
+        while self.bot.running:
+            await self._strategy_allowed.wait()
+            pattern = self.bot.strategy.generate_random_movement()
+            self._strategy_task = asyncio.create_task(self._execute_pattern(pattern))
+            await asyncio.wait({self._strategy_task})
+            if self._strategy_task.cancelled():
+                # 被弹窗或恢复打断，等待处理完毕后重新生成移动模式
+                continue
+            if self._strategy_task.exception() is not None:
+                raise self._strategy_task.exception()
+
+            movement_interval = self.movement_interval
+            await asyncio.sleep(random.uniform(movement_interval[0], movement_interval[1]))
+
+    async def _execute_pattern(self, pattern):
+        """在线程池中执行编译后的移动模式，被取消时在下一个事件边界停止，等按住的键释放后再返回"""
+        input_controller = self.bot.input_controller
+        timeline = compile_pattern(pattern)
+        player = TimelineRunner(input_controller.backend, input_controller.clock)
+        future = asyncio.get_running_loop().run_in_executor(self._executor, player.play, timeline)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            player.interrupt()
+            await asyncio.wait({future})
+            raise
@@ -0,0 +1,950 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Florr.io 自动AFK脚本基准测试
+用于测量脚本各个环节的性能
+"""
+
+import time
+import sys
+import os
+import types
+import random
+import argparse
+import tempfile
+import subprocess
+import threading
+import statistics
+import importlib
+import importlib.util
+from contextlib import contextmanager
+
+import numpy as np
+import cv2
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from florr_afk_input import create_backend, RecordingBackend
+from florr_afk_schedule import TimelineRunner, TimelineReport, compile_pattern, MOVE, KEY_DOWN, KEY_UP, MOUSE_DOWN
+from florr_afk_session import SessionReader, replay
+
+
+def _percentile(values, percent):
+    """返回已排序列表的百分位数"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def _summarize(samples):
+    """汇总一组耗时样本(秒)，返回毫秒单位的统计结果"""
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "mean_ms": statistics.mean(samples) * 1000 if samples else 0.0,
+        "p50_ms": _percentile(samples, 50) * 1000,
+        "p95_ms": _percentile(samples, 95) * 1000,
+        "max_ms": samples[-1] * 1000 if samples else 0.0,
+    }
+
+
+def benchmark_input(backend, events=1000, batch=50, radius=20):
+    """测量输入后端的事件吞吐量和注入延迟
+
+    在当前鼠标位置附近小范围移动，每 batch 个事件提交一次。
+    返回每秒事件数，以及单个事件和整批提交的延迟统计。
+    """
+    origin_x, origin_y = backend.position()
+    offsets = [(radius, 0), (0, radius), (-radius, 0), (0, -radius)]
+
+    single = []
+    for i in range(min(events, 200)):
+        dx, dy = offsets[i % len(offsets)]
+        start = time.perf_counter()
+        backend.move_to(origin_x + dx, origin_y + dy)
+        single.append(time.perf_counter() - start)
+
+    flushes = []
+    sent = 0
+    start_all = time.perf_counter()
+    while sent < events:
+        count = min(batch, events - sent)
+        start = time.perf_counter()
+        with backend.batch():
+            for i in range(count):
+                dx, dy = offsets[(sent + i) % len(offsets)]
+                backend.move_to(origin_x + dx, origin_y + dy)
+        flushes.append(time.perf_counter() - start)
+        sent += count
+    elapsed = time.perf_counter() - start_all
+
+    backend.move_to(origin_x, origin_y)
+
+    return {
+        "backend": backend.name,
+        "events": events,
+        "batch": batch,
+        "events_per_sec": events / elapsed if elapsed > 0 else float("inf"),
+        "single_event": _summarize(single),
+        "batch_flush": _summarize(flushes),
+    }
+
+
+class StaticConfig:
+    """基准使用的固定配置，不读写配置文件"""
+    
+    def __init__(self, **values):
+        self.values = values
+    
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+
+def legacy_detect_afk_popup(screenshot):
+    """优化前的弹窗检测: 全图HSV、两个inRange掩码相加、全图findContours"""
+    hsv = cv2.cvtColor(screenshot, cv2.COLOR_BGR2HSV)
+    mask1 = cv2.inRange(hsv, np.array([0, 100, 100]), np.array([10, 255, 255]))
+    mask2 = cv2.inRange(hsv, np.array([160, 100, 100]), np.array([180, 255, 255]))
+    red_mask = mask1 + mask2
+    contours, _ = cv2.findContours(red_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if 50 < w < 200 and 20 < h < 80:
+            return (x + w // 2, y + h // 2)
+    return None
+
+
+def synthetic_frames(width=1920, height=1080, count=10, seed=0):
+    """生成带游戏风格背景的测试帧，偶数帧带一个红色弹窗按钮"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(count):
+        frame = np.full((height, width, 3), (60, 150, 30), dtype=np.uint8)
+        # 随机的彩色小块模拟怪物和花瓣，其中包括不符合按钮尺寸的红色小块
+        for _ in range(60):
+            x, y = int(rng.integers(0, width - 40)), int(rng.integers(0, height - 40))
+            color = tuple(int(c) for c in rng.integers(0, 256, 3))
+            cv2.circle(frame, (x, y), int(rng.integers(5, 20)), color, -1)
+        if i % 2 == 0:
+            x, y = width // 2 - 60, height // 2 + 100
+            cv2.rectangle(frame, (x, y), (x + 120, y + 45), (0, 0, 230), -1)
+        frames.append(frame)
+    return frames
+
+
+def _time_calls(func, frames, repeat):
+    samples = []
+    results = []
+    for _ in range(repeat):
+        for frame in frames:
+            start = time.perf_counter()
+            results.append(func(frame))
+            samples.append(time.perf_counter() - start)
+    return samples, results
+
+
+def benchmark_popup(width=1920, height=1080, repeat=5, scale=0.5):
+    """比较优化前后的弹窗检测耗时，并检查两者结果是否一致"""
+    import florr_afk_bot
+    
+    frames = synthetic_frames(width, height)
+    recognition = florr_afk_bot.ImageRecognition(StaticConfig(popup_scale=scale))
+    
+    legacy_samples, legacy_results = _time_calls(legacy_detect_afk_popup, frames, repeat)
+    samples, results = _time_calls(recognition.detect_afk_popup, frames, repeat)
+    
+    legacy = _summarize(legacy_samples)
+    optimized = _summarize(samples)
+    return {
+        "resolution": f"{width}x{height}",
+        "legacy": legacy,
+        "optimized": optimized,
+        "speedup": legacy["mean_ms"] / optimized["mean_ms"] if optimized["mean_ms"] else float("inf"),
+        "agree": legacy_results == results,
+    }
+
+
+def legacy_play(timeline, backend):
+    """优化前的执行方式: 每个事件前按与上一个事件的间隔单独sleep，每次的误差和事件本身的耗时逐步累积"""
+    actual = np.full(len(timeline), np.nan)
+    start = time.monotonic()
+    previous = 0.0
+    for i in range(len(timeline)):
+        time.sleep(max(0.0, timeline.times[i] - previous))
+        previous = timeline.times[i]
+        actual[i] = time.monotonic() - start
+        kind = timeline.kinds[i]
+        if kind == MOVE:
+            backend.move_to(int(timeline.xy[i, 0]), int(timeline.xy[i, 1]), float(timeline.durations[i]))
+            continue
+        name = timeline.names[timeline.symbols[i]]
+        if kind == KEY_DOWN:
+            backend.key_down(name)
+        elif kind == KEY_UP:
+            backend.key_up(name)
+        elif kind == MOUSE_DOWN:
+            backend.mouse_down(name)
+        else:
+            backend.mouse_up(name)
+    return TimelineReport(timeline.times, actual, False)
+
+
+def benchmark_timeline(area="spider", patterns=3, seed=0):
+    """比较逐个sleep和按绝对时间执行移动模式的定时误差
+
+    同一组编译好的移动模式分别用两种方式在按实际时间等待的录制后端上执行，统计每个事件比计划晚多少。
+    """
+    import florr_afk_bot
+    
+    rng = random.Random(seed)
+    config = StaticConfig(area=area)
+    backend = RecordingBackend(realtime=True)
+    controller = florr_afk_bot.InputController(config, backend)
+    strategy = {
+        "sewers": florr_afk_bot.SewerStrategy,
+        "desert": florr_afk_bot.DesertStrategy,
+        "spider": florr_afk_bot.SpiderStrategy,
+        "anthill": florr_afk_bot.AnthillStrategy,
+    }[area](config, controller)
+    
+    random.seed(seed)
+    timelines = [compile_pattern(strategy.generate_random_movement(), rng) for _ in range(patterns)]
+    result = {"area": area, "patterns": patterns, "events": sum(len(t) for t in timelines)}
+    for name, play in (("legacy", lambda t: legacy_play(t, backend)),
+                       ("timeline", lambda t: TimelineRunner(backend).play(t))):
+        late, drift = [], []
+        for timeline in timelines:
+            report = play(timeline)
+            late.extend(report.lateness)
+            drift.append(report.summary()["drift_ms"] / 1000)
+        result[name] = _summarize(late)
+        result[name + "_drift"] = _summarize(drift)
+    return result
+
+
+class ScriptedScreen:
+    """脚本化的假屏幕
+
+    平时返回背景帧；show() 之后返回AFK检查画面，直到 hide()。
+    """
+    
+    def __init__(self, background, clock=time.perf_counter):
+        self.background = background
+        self.clock = clock
+        self._check = None
+        self._lock = threading.Lock()
+    
+    def show(self, frame):
+        """显示检查画面，返回显示的时刻"""
+        with self._lock:
+            self._check = frame
+            return self.clock()
+    
+    def hide(self):
+        """恢复背景"""
+        with self._lock:
+            self._check = None
+    
+    def capture(self):
+        """替代截图函数"""
+        with self._lock:
+            frame = self._check if self._check is not None else self.background
+        return frame.copy()
+
+
+def popup_check(background, rng):
+    """在背景上随机位置画一个红色弹窗按钮，返回 (帧, 按钮矩形)"""
+    height, width = background.shape[:2]
+    x = rng.randint(100, width - 220)
+    y = rng.randint(100, height - 145)
+    frame = background.copy()
+    cv2.rectangle(frame, (x, y), (x + 120, y + 45), (0, 0, 230), -1)
+    return frame, (x, y, 120, 45)
+
+
+def maze_check(background, rng):
+    """画一条灰色的迷宫通道，起点处有稀有度颜色标记，返回 (帧, 通道包围框)
+
+    避开 new_afk.py 遮盖的左上角和底部区域。
+    """
+    height, width = background.shape[:2]
+    x0 = rng.randint(width // 2 - 400, width // 2 - 250)
+    y0 = rng.randint(height // 2 - 180, height // 2 - 100)
+    points = np.array([(x0, y0), (x0 + 250, y0), (x0 + 250, y0 + 200), (x0 + 500, y0 + 200)], dtype=np.int32)
+    frame = background.copy()
+    cv2.polylines(frame, [points], False, (96, 96, 96), 30)
+    cv2.circle(frame, (x0, y0), 10, (109, 239, 126), -1)
+    return frame, (x0 - 15, y0 - 15, 530, 230)
+
+
+def click_times(events, shown_at, rect):
+    """返回 (首次输入, 完成) 的时刻: 首次输入为鼠标移入按钮，完成为在按钮内松开鼠标"""
+    x, y, w, h = rect
+    margin = 10
+    
+    def inside(point):
+        return x - margin <= point[0] <= x + w + margin and y - margin <= point[1] <= y + h + margin
+    
+    first = None
+    position = None
+    for event in events:
+        if event.kind == "move":
+            position = event.args[:2]
+        if event.timestamp < shown_at:
+            continue
+        if event.kind == "move" and first is None and inside(position):
+            first = event.timestamp
+        elif event.kind == "mouse_up" and first is not None and inside(position):
+            return first, event.timestamp
+    return first, None
+
+
+def drag_times(events, shown_at, rect):
+    """返回 (首次输入, 完成) 的时刻: 首次输入为检查出现后的第一个鼠标事件，完成为一次拖动结束"""
+    first = None
+    pressed = False
+    moved = 0
+    for event in events:
+        if event.timestamp < shown_at or event.kind.startswith("key"):
+            continue
+        if first is None:
+            first = event.timestamp
+        if event.kind == "mouse_down":
+            pressed, moved = True, 0
+        elif event.kind == "move" and pressed:
+            moved += 1
+        elif event.kind == "mouse_up":
+            if pressed and moved >= 2:
+                return first, event.timestamp
+            pressed = False
+    return first, None
+
+
+def run_trials(screen, backend, make_check, measure, trials=10, timeout=30.0, lead=(0.5, 2.0), rng=None,
+               alive=lambda: True):
+    """在随机时刻显示检查画面，等待被解决，统计首次输入和完成的耗时(秒)
+
+    alive() 为False(被测线程已退出)时，剩余的检查都计为超时。
+    """
+    rng = rng or random.Random(0)
+    first_inputs, completions = [], []
+    timeouts = 0
+    for index in range(trials):
+        if not alive():
+            timeouts += trials - index
+            break
+        time.sleep(rng.uniform(*lead))
+        frame, rect = make_check()
+        shown_at = screen.show(frame)
+        done = None
+        while screen.clock() < shown_at + timeout and alive():
+            first, done = measure(list(backend.events), shown_at, rect)
+            if done is not None and screen.clock() >= done:
+                break
+            time.sleep(0.01)
+        screen.hide()
+        if done is None:
+            timeouts += 1
+            continue
+        first_inputs.append(first - shown_at)
+        completions.append(done - shown_at)
+    return {
+        "trials": trials,
+        "timeouts": timeouts,
+        "first_input": _summarize(first_inputs),
+        "completion": _summarize(completions),
+    }
+
+
+def e2e_bot(trials=10, runtime="thread", width=1920, height=1080, timeout=30.0,
+            movement_interval=None, lead=(0.5, 2.0), seed=0):
+    """对 FlorAFKBot 运行端到端基准: 假屏幕显示弹窗，录制后端(按实际时间)记录点击"""
+    import florr_afk_bot
+    
+    rng = random.Random(seed)
+    background = synthetic_frames(width, height, count=2, seed=seed)[1]
+    screen = ScriptedScreen(background)
+    backend = RecordingBackend(size=(width, height), clock=time.perf_counter, realtime=True)
+    
+    with tempfile.TemporaryDirectory() as directory:
+        bot = florr_afk_bot.FlorAFKBot(os.path.join(directory, "florr_config.json"))
+        settings = {"runtime": runtime, "profile_hotkey": None, "metrics_port": 0, "timing": False}
+        if movement_interval:
+            settings["movement_interval"] = list(movement_interval)
+        bot.config.update(settings)
+        bot.image_recognition.capture_screen = screen.capture
+        bot.input_controller = florr_afk_bot.InputController(bot.config, backend)
+        bot.strategy = bot._create_strategy()
+        
+        thread = threading.Thread(target=bot.start, daemon=True)
+        thread.start()
+        try:
+            return run_trials(screen, backend, lambda: popup_check(background, rng), click_times,
+                              trials, timeout, lead, rng, thread.is_alive)
+        finally:
+            bot.running = False
+            thread.join(timeout=10)
+
+
+class SimulatedScreen:
+    """按虚拟时间显示弹窗的假屏幕
+
+    弹窗按指数分布的间隔出现，给定 jitter 时改为按均值 popup_interval、标准差 jitter 的正态分布出现；
+    在按钮内松开鼠标后消失，超过 timeout 秒没有被点掉计为超时。平时返回同一张只读的背景帧，不复制；
+    copy 时每次截图复制一份，使截图像真实截图一样有内存拷贝的开销。
+    """
+    
+    def __init__(self, background, clock, backend, popup_interval=600.0, timeout=60.0, rng=None, jitter=None,
+                 copy=False):
+        self.background = background
+        self.background.flags.writeable = False
+        self.clock = clock
+        self.backend = backend
+        self.popup_interval = popup_interval
+        self.timeout = timeout
+        self.rng = rng or random.Random(0)
+        self.jitter = jitter
+        self.copy = copy
+        self.shown = 0
+        self.timeouts = 0
+        self.resolve_times = []
+        self.detect_times = []
+        self._popup = None
+        self._detected = False
+        self._next_popup = self._after(clock.monotonic())
+        self._lock = threading.Lock()
+    
+    def _after(self, now):
+        if not self.popup_interval:
+            return float("inf")
+        if self.jitter is not None:
+            return now + max(1.0, self.rng.gauss(self.popup_interval, self.jitter))
+        return now + self.rng.expovariate(1.0 / self.popup_interval)
+    
+    def detected(self):
+        """检测器找到弹窗时调用，记录弹窗出现到第一次被检测到的耗时"""
+        with self._lock:
+            if self._popup is not None and not self._detected:
+                self.detect_times.append(self.clock.monotonic() - self._popup[2])
+                self._detected = True
+    
+    def capture(self):
+        """替代截图函数"""
+        now = self.clock.monotonic()
+        with self._lock:
+            if self._popup is not None:
+                frame, rect, shown_at, mark = self._popup
+                _, done = click_times(self.backend.events[mark:], shown_at, rect)
+                if done is not None:
+                    self.resolve_times.append(done - shown_at)
+                    self._popup = None
+                    self._next_popup = self._after(done)
+                elif now - shown_at >= self.timeout:
+                    self.timeouts += 1
+                    self._popup = None
+                    self._next_popup = self._after(now)
+            if self._popup is None and now >= self._next_popup:
+                frame, rect = popup_check(self.background, self.rng)
+                self._popup = (frame, rect, self._next_popup, len(self.backend.events))
+                self._detected = False
+                self.shown += 1
+            frame = self._popup[0] if self._popup is not None else self.background
+        return frame.copy() if self.copy else frame
+
+
+def _record_calls(func, clock, times):
+    """包装 func，每次调用时记下虚拟时间"""
+    def wrapper(*args, **kwargs):
+        times.append(clock.monotonic())
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def _gaps(times, start, end):
+    """相邻两次调用的间隔(秒)，包括开始到第一次、最后一次到结束"""
+    points = [start] + list(times) + [end]
+    return [b - a for a, b in zip(points, points[1:])]
+
+
+def simulate_bot(hours=24.0, width=640, height=360, popup_interval=600.0, fault_interval=0.0,
+                 timeout=60.0, settings=None, seed=0, popup_jitter=None, copy_frames=False):
+    """用虚拟时钟运行 FlorAFKBot: 主循环、监控线程和截图线程照常运行，所有等待立即推进虚拟时间
+
+    假屏幕按虚拟时间显示弹窗，录制后端按虚拟时间记录输入；fault_interval 不为0时，
+    监控线程按指数分布的间隔看到异常的游戏状态，触发恢复流程。
+    弹窗出现历史写入临时目录，每次模拟从空的历史开始。只支持线程运行方式。
+    """
+    import florr_afk_bot
+    from florr_afk_clock import VirtualClock
+    
+    rng = random.Random(seed)
+    random.seed(seed)
+    clock = VirtualClock()
+    clock.register()
+    background = synthetic_frames(width, height, count=2, seed=seed)[1]
+    backend = RecordingBackend(size=(width, height), clock=clock.monotonic, realtime=True, sleep=clock.sleep)
+    screen = SimulatedScreen(background, clock, backend, popup_interval, timeout, rng, popup_jitter, copy_frames)
+    loop_times, monitor_times, detect_times = [], [], []
+    faults = []
+    next_fault = [clock.monotonic() + rng.expovariate(1.0 / fault_interval) if fault_interval else float("inf")]
+    
+    with tempfile.TemporaryDirectory() as directory:
+        bot = florr_afk_bot.FlorAFKBot(os.path.join(directory, "florr_config.json"), clock=clock)
+        bot.config.update(dict({"runtime": "thread", "profile_hotkey": None, "metrics_port": 0, "timing": False,
+                                "recovery": True, "history_file": os.path.join(directory, "history.db")},
+                               **(settings or {}), run_time=hours * 60))
+        bot.image_recognition.capture_screen = screen.capture
+        bot.input_controller = florr_afk_bot.InputController(bot.config, backend, clock)
+        bot.strategy = bot._create_strategy()
+        bot.profiler.tick = _record_calls(bot.profiler.tick, clock, loop_times)
+        run_detectors = bot.detectors.run
+        
+        def detect(frame):
+            detect_times.append(clock.monotonic())
+            decision = run_detectors(frame)
+            if decision.result:
+                screen.detected()
+            return decision
+        
+        bot.detectors.run = detect
+        detect_status = bot.image_recognition.detect_game_status
+        
+        def game_status(screenshot=None):
+            monitor_times.append(clock.monotonic())
+            if clock.monotonic() >= next_fault[0]:
+                faults.append(clock.monotonic())
+                next_fault[0] = clock.monotonic() + rng.expovariate(1.0 / fault_interval)
+                return "unknown"
+            return detect_status(screenshot)
+        
+        bot.image_recognition.detect_game_status = game_status
+        
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            bot.start()
+        finally:
+            clock.close()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        snapshot = bot.metrics.snapshot()
+        counters = snapshot["counters"]
+    
+    duration = clock.monotonic()
+    return {
+        "virtual_seconds": duration,
+        "wall_seconds": wall,
+        "cpu_seconds": cpu,
+        "clock_advances": clock.advances,
+        "uptime_seconds": snapshot["gauges"]["uptime_seconds"],
+        "loop_iterations": len(loop_times),
+        "loop_cpu_ms": cpu / max(1, len(loop_times)) * 1000,
+        "loop_gap": _summarize(_gaps(loop_times, 0.0, duration)),
+        "captures": counters.get("frames_captured", 0),
+        "detections": len(detect_times),
+        "monitor_checks": len(monitor_times),
+        "monitor_gap": _summarize(_gaps(monitor_times, 0.0, duration)),
+        "popups_shown": screen.shown,
+        "popups_resolved": len(screen.resolve_times),
+        "popup_timeouts": screen.timeouts,
+        "resolve": _summarize(screen.resolve_times),
+        "detect": _summarize(screen.detect_times),
+        "faults": len(faults),
+        "recoveries": counters.get("recoveries", 0),
+        "input_events": len(backend.events),
+    }
+
+
+def benchmark_adaptive(hours=24.0, popup_interval=1200.0, jitter=60.0, width=1280, height=720, settings=None, seed=0):
+    """用同一个随机种子分别以固定间隔和自适应调度模拟运行，弹窗按近似固定的间隔出现
+
+    每次截图复制一帧，CPU占用包含截图的内存拷贝。
+    返回 {"fixed": 模拟结果, "adaptive": 模拟结果}，自适应调度从空的历史开始学习。
+    """
+    results = {}
+    for name, adaptive in (("fixed", False), ("adaptive", True)):
+        results[name] = simulate_bot(hours, width, height, popup_interval,
+                                     settings=dict(settings or {}, adaptive_schedule=adaptive),
+                                     seed=seed, popup_jitter=jitter, copy_frames=True)
+    return results
+
+
+CHECKV2_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "CheckV2.0")
+
+
+@contextmanager
+def _script_dir(directory):
+    """导入 CheckV2.0 下的脚本: 加入 sys.path，并临时切换目录(按钮模板按相对路径加载)"""
+    directory = os.path.abspath(directory)
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+
+
+def load_new_afk(path=None):
+    """把 new_afk.py 作为模块导入，主循环在 __main__ 保护下，导入时不会运行"""
+    if path is None:
+        path = os.path.join(CHECKV2_DIR, "new_afk.py")
+    with _script_dir(os.path.dirname(os.path.abspath(path))):
+        spec = importlib.util.spec_from_file_location("new_afk", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module
+
+
+def load_maze_solver():
+    """导入 CheckV2.0/maze_solver.py"""
+    with _script_dir(CHECKV2_DIR):
+        return importlib.import_module("maze_solver")
+
+
+def e2e_new_afk(trials=5, width=1920, height=1080, timeout=60.0, lead=(0.5, 2.0), seed=0):
+    """对 new_afk.py 的主循环运行端到端基准: 假屏幕显示迷宫，录制后端记录拖动"""
+    module = load_new_afk()
+    
+    rng = random.Random(seed)
+    background = np.full((height, width, 3), (30, 150, 60), dtype=np.uint8)
+    screen = ScriptedScreen(background)
+    backend = RecordingBackend(size=(width, height), clock=time.perf_counter, realtime=True)
+    
+    module.init(backend)
+    module.grab = screen.capture
+    stop = threading.Event()
+    module.keyboard = types.SimpleNamespace(is_pressed=lambda key: stop.is_set())
+    
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        # 主循环会写入 Log/ 和 new.PNG
+        os.makedirs(os.path.join(directory, "Log"))
+        os.chdir(directory)
+        thread = threading.Thread(target=module.run_sequential, daemon=True)
+        thread.start()
+        try:
+            return run_trials(screen, backend, lambda: maze_check(background, rng), drag_times,
+                              trials, timeout, lead, rng, thread.is_alive)
+        finally:
+            stop.set()
+            thread.join(timeout=60)
+            os.chdir(cwd)
+
+
+def check_slo(result, completion_p95=None, first_input_p95=None):
+    """检查结果是否满足SLO(秒)，返回不满足的项目列表"""
+    failures = []
+    if result["timeouts"]:
+        failures.append(f"{result['timeouts']} 次检查在超时前未被解决")
+    if completion_p95 is not None and result["completion"]["p95_ms"] > completion_p95 * 1000:
+        failures.append(f"完成耗时p95 {result['completion']['p95_ms'] / 1000:.2f}秒 超过 {completion_p95}秒")
+    if first_input_p95 is not None and result["first_input"]["p95_ms"] > first_input_p95 * 1000:
+        failures.append(f"首次输入耗时p95 {result['first_input']['p95_ms'] / 1000:.2f}秒 超过 {first_input_p95}秒")
+    return failures
+
+
+# 启动基准测量的命令: (名称, 工作目录, python 之后的参数)，第一条是解释器本身的启动耗时，作为参照
+STARTUP_COMMANDS = [
+    ("python -c pass", None, ["-c", "pass"]),
+    ("florr_afk_bot.py --help", os.path.dirname(os.path.abspath(__file__)), ["florr_afk_bot.py", "--help"]),
+    ("import florr_afk_bot", os.path.dirname(os.path.abspath(__file__)), ["-c", "import florr_afk_bot"]),
+    ("import new_afk", CHECKV2_DIR, ["-c", "import new_afk"]),
+]
+
+
+def parse_import_times(text):
+    """解析 python -X importtime 的输出，按顶层包汇总各模块自身的导入耗时，返回 {包名: 秒数}"""
+    totals = {}
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        # 跳过表头 "self [us] | cumulative | imported package"
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        package = fields[2].strip().split(".")[0]
+        totals[package] = totals.get(package, 0.0) + int(fields[0]) / 1e6
+    return totals
+
+
+def benchmark_startup(commands=None, repeat=5):
+    """在新的子进程中测量入口脚本的启动耗时，并用 -X importtime 统计各个包的导入耗时
+
+    每条命令先运行 repeat 次计时，再运行一次收集导入耗时。
+    返回 {名称: {"wall": 耗时统计, "imports": {包名: 秒数}, "returncode": 退出码}}。
+    """
+    results = {}
+    for name, cwd, args in commands or STARTUP_COMMANDS:
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            completed = subprocess.run([sys.executable, *args], cwd=cwd, capture_output=True)
+            samples.append(time.perf_counter() - started)
+        profiled = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=cwd,
+                                  capture_output=True, text=True, errors="replace")
+        results[name] = {
+            "wall": _summarize(samples),
+            "imports": parse_import_times(profiled.stderr),
+            "returncode": completed.returncode,
+        }
+    return results
+
+
+def _print_stats(title, stats):
+    print(f"{title}: n={stats['count']} mean={stats['mean_ms']:.3f}ms "
+          f"p50={stats['p50_ms']:.3f}ms p95={stats['p95_ms']:.3f}ms max={stats['max_ms']:.3f}ms")
+
+
+def run_input(args):
+    """运行输入后端基准"""
+    backend = create_backend(args.backend)
+    result = benchmark_input(backend, args.events, args.batch)
+    print(f"输入后端: {result['backend']}")
+    print(f"事件数: {result['events']}，每批: {result['batch']}")
+    print(f"吞吐量: {result['events_per_sec']:.0f} 事件/秒")
+    _print_stats("单个事件延迟", result["single_event"])
+    _print_stats("整批提交延迟", result["batch_flush"])
+    return 0
+
+
+def run_popup(args):
+    """运行弹窗检测基准"""
+    import logging
+    logging.getLogger("FlorAFK").setLevel(logging.WARNING)
+    
+    result = benchmark_popup(args.width, args.height, args.repeat, args.scale)
+    print(f"分辨率: {result['resolution']}，缩放: {args.scale}")
+    _print_stats("原检测", result["legacy"])
+    _print_stats("优化检测", result["optimized"])
+    print(f"加速: {result['speedup']:.1f}x，结果一致: {'是' if result['agree'] else '否'}")
+    return 0 if result["agree"] else 1
+
+
+def run_timeline(args):
+    """运行移动模式定时基准"""
+    result = benchmark_timeline(args.area, args.patterns, args.seed)
+    print(f"区域: {result['area']}，移动模式: {result['patterns']}，事件: {result['events']}")
+    _print_stats("逐个sleep 事件延迟", result["legacy"])
+    _print_stats("逐个sleep 末尾漂移", result["legacy_drift"])
+    _print_stats("绝对时间线 事件延迟", result["timeline"])
+    _print_stats("绝对时间线 末尾漂移", result["timeline_drift"])
+    return 0
+
+
+def run_e2e(args):
+    """运行端到端基准"""
+    import logging
+    logging.getLogger("FlorAFK").setLevel(logging.WARNING)
+    
+    if args.target == "bot":
+        result = e2e_bot(args.trials, args.runtime, args.width, args.height, args.timeout,
+                         args.movement_interval, seed=args.seed)
+    else:
+        result = e2e_new_afk(args.trials, args.width, args.height, args.timeout, seed=args.seed)
+    
+    print(f"目标: {args.target}，检查次数: {result['trials']}，超时: {result['timeouts']}")
+    _print_stats("首次输入", result["first_input"])
+    _print_stats("完成", result["completion"])
+    
+    failures = check_slo(result, args.slo_p95, args.slo_first_input_p95)
+    for failure in failures:
+        print(f"SLO未满足: {failure}")
+    return 1 if failures else 0
+
+
+def run_simulate(args):
+    """运行虚拟时钟模拟"""
+    import logging
+    logging.getLogger("FlorAFK").setLevel(logging.WARNING)
+    
+    settings = {"area": args.area, "mode": args.mode}
+    if args.movement_interval:
+        settings["movement_interval"] = list(args.movement_interval)
+    result = simulate_bot(args.hours, args.width, args.height, args.popup_interval, args.fault_interval,
+                          args.timeout, settings, args.seed)
+    
+    print(f"模拟时长: {result['virtual_seconds'] / 3600:.2f}小时，实际耗时: {result['wall_seconds']:.1f}秒 "
+          f"(加速 {result['virtual_seconds'] / max(result['wall_seconds'], 1e-9):.0f} 倍)，"
+          f"CPU: {result['cpu_seconds']:.1f}秒，时钟推进: {result['clock_advances']} 次")
+    print(f"主循环: {result['loop_iterations']} 次，每次CPU开销 {result['loop_cpu_ms']:.3f}ms")
+    _print_stats("主循环间隔(虚拟)", result["loop_gap"])
+    print(f"截图: {result['captures']} 次，检测: {result['detections']} 次，监控检查: {result['monitor_checks']} 次")
+    _print_stats("监控间隔(虚拟)", result["monitor_gap"])
+    print(f"弹窗: 出现 {result['popups_shown']}，点掉 {result['popups_resolved']}，超时 {result['popup_timeouts']}")
+    _print_stats("弹窗检测延迟(虚拟)", result["detect"])
+    _print_stats("弹窗解决耗时(虚拟)", result["resolve"])
+    print(f"注入故障: {result['faults']}，恢复: {result['recoveries']}，输入事件: {result['input_events']}")
+    return 1 if result["popup_timeouts"] else 0
+
+
+def run_adaptive(args):
+    """比较固定间隔和自适应调度的CPU占用与检测延迟"""
+    import logging
+    logging.getLogger("FlorAFK").setLevel(logging.WARNING)
+    
+    settings = {"capture_interval": args.capture_interval, "adaptive_fast_interval": args.fast,
+                "adaptive_slow_interval": args.slow}
+    results = benchmark_adaptive(args.hours, args.popup_interval, args.jitter, args.width, args.height,
+                                 settings, args.seed)
+    for name, title in (("fixed", "固定间隔"), ("adaptive", "自适应调度")):
+        result = results[name]
+        hours = result["virtual_seconds"] / 3600
+        print(f"{title}: CPU {result['cpu_seconds'] / hours:.2f}秒/小时，截图 {result['captures'] / hours:.0f} 次/小时，"
+              f"检测 {result['detections'] / hours:.0f} 次/小时，"
+              f"弹窗 出现 {result['popups_shown']} 点掉 {result['popups_resolved']} 超时 {result['popup_timeouts']}")
+        _print_stats(f"  {title} 检测延迟(虚拟)", result["detect"])
+        _print_stats(f"  {title} 解决耗时(虚拟)", result["resolve"])
+    return 0
+
+
+def run_startup(args):
+    """测量入口脚本的启动耗时并输出导入耗时最多的包"""
+    results = benchmark_startup(repeat=args.repeat)
+    for name, result in results.items():
+        _print_stats(name, result["wall"])
+        if result["returncode"]:
+            print(f"  退出码: {result['returncode']}")
+        imports = sorted(result["imports"].items(), key=lambda item: item[1], reverse=True)
+        print(f"  导入共 {sum(result['imports'].values()) * 1000:.1f}ms: "
+              + ", ".join(f"{package} {seconds * 1000:.1f}ms" for package, seconds in imports[:args.top]))
+    return 0
+
+
+def replay_detector(target, metadata):
+    """返回回放用的检测函数: 与录制时相同的检测器，输入一帧，返回 (检测器名称, 结果)"""
+    if target == "new_afk":
+        registry = load_maze_solver().create_detectors()
+    else:
+        import florr_afk_bot
+        settings = {"popup_roi": metadata.get("popup_roi"), "popup_templates": metadata.get("popup_templates") or []}
+        config = types.SimpleNamespace(get=lambda key, default=None: settings.get(key, default))
+        recognition = florr_afk_bot.ImageRecognition(config)
+        owner = types.SimpleNamespace(config=config, image_recognition=recognition)
+        registry = florr_afk_bot.FlorAFKBot._create_detectors(owner)
+    
+    def detect(frame):
+        decision = registry.run(frame)
+        return decision.name, decision.result
+    
+    return detect
+
+
+def run_replay(args):
+    """不显示画面，以最快速度回放录制的会话，与录制时的检测结果比较"""
+    import logging
+    logging.getLogger("FlorAFK").setLevel(logging.WARNING)
+    
+    reader = SessionReader(args.session)
+    target = args.target or reader.metadata.get("target", "bot")
+    start = reader.seek(args.start) if args.start else 0
+    stop = reader.seek(args.end) if args.end is not None else None
+    results = replay(reader, replay_detector(target, reader.metadata), start, stop)
+    
+    print(f"会话: {args.session}，目标: {target}，录制时长: {reader.duration:.1f}秒，回放: {len(results)} 帧")
+    _print_stats("每帧检测", _summarize([elapsed for _, _, _, elapsed in results]))
+    hits = sum(1 for _, _, actual, _ in results if actual[0] is not None)
+    print(f"命中: {hits} 帧，输入事件: {sum(1 for _ in reader.events('input'))} 个")
+    
+    mismatches = [(index, expected, actual) for index, expected, actual, _ in results
+                  if expected is not None and expected != actual]
+    for index, expected, actual in mismatches[:args.show]:
+        print(f"  帧 {index} ({reader.timestamps[index]:.2f}秒): 录制 {expected}，回放 {actual}")
+    if mismatches:
+        print(f"与录制结果不一致: {len(mismatches)} 帧")
+        return 1
+    return 0
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='Florr.io 自动AFK脚本基准测试')
+    subparsers = parser.add_subparsers(dest='command')
+
+    input_parser = subparsers.add_parser('input', help='输入后端吞吐量和延迟')
+    input_parser.add_argument('--backend', type=str, default='pyautogui',
+                              choices=['pyautogui', 'xtest', 'recording'], help='输入后端')
+    input_parser.add_argument('--events', type=int, default=1000, help='事件总数')
+    input_parser.add_argument('--batch', type=int, default=50, help='每批事件数')
+    input_parser.set_defaults(func=run_input)
+
+    popup_parser = subparsers.add_parser('popup', help='弹窗检测耗时(优化前后对比)')
+    popup_parser.add_argument('--width', type=int, default=1920, help='帧宽度')
+    popup_parser.add_argument('--height', type=int, default=1080, help='帧高度')
+    popup_parser.add_argument('--repeat', type=int, default=5, help='重复次数')
+    popup_parser.add_argument('--scale', type=float, default=0.5, help='粗检缩放比例')
+    popup_parser.set_defaults(func=run_popup)
+
+    timeline_parser = subparsers.add_parser('timeline', help='移动模式的定时误差(逐个sleep与绝对时间线对比)')
+    timeline_parser.add_argument('--area', type=str, default='spider', choices=['sewers', 'desert', 'spider', 'anthill'],
+                                 help='生成移动模式的区域策略')
+    timeline_parser.add_argument('--patterns', type=int, default=3, help='移动模式个数')
+    timeline_parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    timeline_parser.set_defaults(func=run_timeline)
+
+    e2e_parser = subparsers.add_parser('e2e', help='端到端: 检查出现到点击/拖动完成的耗时')
+    e2e_parser.add_argument('--target', type=str, default='bot', choices=['bot', 'new_afk'], help='被测脚本')
+    e2e_parser.add_argument('--runtime', type=str, default='thread', choices=['thread', 'asyncio'],
+                            help='FlorAFKBot的运行方式')
+    e2e_parser.add_argument('--trials', type=int, default=10, help='检查次数')
+    e2e_parser.add_argument('--timeout', type=float, default=60.0, help='单次检查的超时(秒)')
+    e2e_parser.add_argument('--movement-interval', type=float, nargs=2, metavar=('MIN', 'MAX'),
+                            help='覆盖FlorAFKBot的移动间隔(秒)')
+    e2e_parser.add_argument('--width', type=int, default=1920, help='屏幕宽度')
+    e2e_parser.add_argument('--height', type=int, default=1080, help='屏幕高度')
+    e2e_parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    e2e_parser.add_argument('--slo-p95', type=float, help='完成耗时p95的上限(秒)，超出时返回非零')
+    e2e_parser.add_argument('--slo-first-input-p95', type=float, help='首次输入耗时p95的上限(秒)')
+    e2e_parser.set_defaults(func=run_e2e)
+
+    simulate_parser = subparsers.add_parser('simulate', help='虚拟时钟模拟: 几秒内运行完数小时的主循环、监控和恢复')
+    simulate_parser.add_argument('--hours', type=float, default=24.0, help='模拟的运行时长(小时)')
+    simulate_parser.add_argument('--area', type=str, default='sewers', choices=['sewers', 'desert', 'spider', 'anthill'],
+                                 help='游戏区域')
+    simulate_parser.add_argument('--mode', type=str, default='normal', choices=['aggressive', 'normal', 'conservative'],
+                                 help='行为模式')
+    simulate_parser.add_argument('--movement-interval', type=float, nargs=2, metavar=('MIN', 'MAX'),
+                                 help='移动间隔(秒)')
+    simulate_parser.add_argument('--popup-interval', type=float, default=600.0, help='弹窗出现的平均间隔(秒)，0为不出现')
+    simulate_parser.add_argument('--fault-interval', type=float, default=0.0,
+                                 help='游戏状态异常的平均间隔(秒)，0为不注入')
+    simulate_parser.add_argument('--timeout', type=float, default=60.0, help='弹窗多久没有点掉计为超时(秒)')
+    simulate_parser.add_argument('--width', type=int, default=640, help='屏幕宽度')
+    simulate_parser.add_argument('--height', type=int, default=360, help='屏幕高度')
+    simulate_parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    simulate_parser.set_defaults(func=run_simulate)
+    
+    adaptive_parser = subparsers.add_parser('adaptive', help='比较固定间隔和自适应调度的CPU占用与检测延迟(虚拟时钟模拟)')
+    adaptive_parser.add_argument('--hours', type=float, default=24.0, help='模拟的运行时长(小时)')
+    adaptive_parser.add_argument('--popup-interval', type=float, default=1200.0, help='弹窗出现的平均间隔(秒)')
+    adaptive_parser.add_argument('--jitter', type=float, default=60.0, help='弹窗间隔的标准差(秒)')
+    adaptive_parser.add_argument('--capture-interval', type=float, default=0.5, help='固定的截图间隔(秒)')
+    adaptive_parser.add_argument('--fast', type=float, default=0.2, help='预期窗口内的截图间隔(秒)')
+    adaptive_parser.add_argument('--slow', type=float, default=2.0, help='预期窗口之前的截图间隔(秒)')
+    adaptive_parser.add_argument('--width', type=int, default=1280, help='屏幕宽度')
+    adaptive_parser.add_argument('--height', type=int, default=720, help='屏幕高度')
+    adaptive_parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    adaptive_parser.set_defaults(func=run_adaptive)
+
+    startup_parser = subparsers.add_parser('startup', help='入口脚本的启动耗时和导入耗时(python -X importtime)')
+    startup_parser.add_argument('--repeat', type=int, default=5, help='每条命令运行的次数')
+    startup_parser.add_argument('--top', type=int, default=8, help='显示导入耗时最多的几个包')
+    startup_parser.set_defaults(func=run_startup)
+
+    replay_parser = subparsers.add_parser('replay', help='回放录制的会话，检查检测结果是否与录制时一致')
+    replay_parser.add_argument('session', type=str, help='会话文件 (session_file 或 new_afk.py 的 RECORD_SESSION)')
+    replay_parser.add_argument('--target', type=str, choices=['bot', 'new_afk'], help='回放使用的检测器，默认与录制时相同')
+    replay_parser.add_argument('--start', type=float, help='从录制的第几秒开始')
+    replay_parser.add_argument('--end', type=float, help='到录制的第几秒结束')
+    replay_parser.add_argument('--show', type=int, default=20, help='最多显示多少个不一致的帧')
+    replay_parser.set_defaults(func=run_replay)
+
+    args = parser.parse_args()
+    if not hasattr(args, 'func'):
+        parser.print_help()
+        return 1
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
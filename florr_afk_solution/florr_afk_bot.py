@@ -12,27 +12,37 @@ import logging
 import threading
 import json
 import os
-import sys
-from datetime import datetime
-import numpy as np
-import cv2
-import pyautogui
-import keyboard
-from PIL import Image, ImageGrab
+import shutil
+import tempfile
+from contextlib import contextmanager
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("florr_afk.log"),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger("FlorAFK")
+from florr_afk_input import create_backend
+from florr_afk_frames import FrameProducer
+from florr_afk_detectors import DetectorRegistry
+from florr_afk_timing import timings
+from florr_afk_metrics import Metrics, MetricsServer
+from florr_afk_profile import ProfileTrigger
+from florr_afk_calibration import screen_geometry
+from florr_afk_logging import setup_logging, log_event
+from florr_afk_recorder import DebugRecorder
+from florr_afk_session import SessionWriter
+from florr_afk_history import ArrivalHistory, AdaptiveSchedule
+from florr_afk_governor import CpuGovernor
+from florr_afk_region import RegionTracker, to_screen
+from florr_afk_idle import IdleProbe, IDLE_STATUSES
+from florr_afk_clock import SYSTEM_CLOCK
+from florr_afk_schedule import TimelineRunner, compile_pattern
+from florr_afk_lazy import lazy_import
 
-# 禁用PyAutoGUI的安全特性，避免意外中断
-pyautogui.FAILSAFE = False
+# 第一次使用时才导入，--help 和配置检查不需要它们
+np = lazy_import("numpy")
+cv2 = lazy_import("cv2")
+pyautogui = lazy_import("pyautogui")
+keyboard = lazy_import("keyboard")
+
+# 配置日志，写文件和终端在后台线程中进行，不会阻塞输入操作
+setup_logging("florr_afk.log")
+logger = logging.getLogger("FlorAFK")
 
 class Config:
     """配置管理类"""
@@ -45,14 +55,67 @@ class Config:
         "check_interval": 5.0,  # AFK检测弹窗检查间隔(秒)
         "movement_interval": [2.0, 5.0],  # 移动操作间隔范围(秒)
         "screen_region": None,  # 游戏窗口区域，None表示全屏
+        "auto_region": False,  # 没有配置screen_region时，启动时从截图内容找出游戏画布作为截图区域
+        "region_check_interval": 5.0,  # 检查游戏区域是否移动的间隔(秒)
+        "input_backend": "pyautogui",  # 输入后端: pyautogui, xtest, recording
+        "runtime": "thread",  # 运行方式: thread(主循环+监控线程), asyncio(并发任务)
+        "capture_interval": 0.5,  # 共享截图的间隔(秒)
+        "popup_scale": 0.5,  # 弹窗粗检时的缩放比例
+        "popup_roi": None,  # 弹窗搜索区域 [x, y, 宽, 高]，None表示全图并自动学习
+        "popup_templates": [],  # 弹窗按钮模板图片路径，命中时作为备用检测结果
+        "detector_workers": 4,  # 检测器线程池大小
+        "timing": False,  # 是否记录热路径各环节的耗时
+        "timing_report_interval": 60.0,  # 耗时汇总的输出间隔(秒)，0表示只在退出时输出
+        "timing_dump": "florr_afk_timing.json",  # 退出时写入耗时直方图的文件，null表示不写入
+        "metrics_port": 0,  # 本地指标接口端口，0表示不启动
+        "metrics_host": "127.0.0.1",  # 指标接口监听地址
+        "profile_iterations": 50,  # 触发性能分析后分析的循环次数
+        "profile_mode": "cprofile",  # 性能分析方式: cprofile, sample(采样)
+        "profile_hotkey": "ctrl+alt+p",  # 触发性能分析的热键，null表示不注册
+        "profile_dir": ".",  # 性能分析结果的保存目录
+        "config_reload_interval": 2.0,  # 检查配置文件是否被修改的间隔(秒)，0表示不自动重新加载
+        "log_json": None,  # 以JSON行格式记录事件(弹窗、恢复等)的文件，None表示不记录
+        "log_debug_rate": 5.0,  # 同一位置的调试日志每秒最多输出的条数，0表示不限制
+        "debug_frames_dir": "debug_frames",  # 调试截图的保存目录
+        "debug_sample_rate": 0.05,  # 调试模式下保存截图的比例，检测到弹窗的截图总是保存
+        "debug_budget_mb": 200,  # 调试截图目录的大小上限(MB)，超出时删除最旧的截图
+        "debug_format": "png",  # 调试截图格式: png(低压缩), npy(原始数组)
+        "session_file": None,  # 录制会话(截图、检测结果和输入)的文件，None表示不录制
+        "session_frame_interval": 1.0,  # 录制会话时保存截图的最小间隔(秒)，检测到弹窗的帧总是保存
+        "session_budget_mb": 2048,  # 会话文件中截图数据的大小上限(MB)，超出后只记录检测结果和输入，0表示不限制
+        "history_file": None,  # 记录弹窗出现时刻的SQLite文件，None表示不记录
+        "adaptive_schedule": False,  # 是否按弹窗出现的历史调整截图和检测频率(需要history_file)
+        "adaptive_fast_interval": 0.2,  # 预期弹窗出现的时间窗口内的截图间隔(秒)
+        "adaptive_slow_interval": 2.0,  # 预期窗口之前的截图间隔(秒)
+        "cpu_budget": 0.0,  # CPU占用上限(1.0为一个核满载)，超出时降低截图频率和检测分辨率，0表示不限制
+        "cpu_budget_window": 5.0,  # 计算CPU占用的周期(秒)
+        "idle_suspend": False,  # 游戏画面不可见或长时间静止时挂起，只低频截图，画面恢复后立即回到正常频率
+        "idle_interval": 5.0,  # 挂起期间的截图间隔(秒)
+        "idle_static_seconds": 10.0,  # 画面连续这么多秒没有变化视为静止
         "debug": False     # 是否启用调试模式
     }
     
-    def __init__(self, config_file="florr_config.json"):
+    def __init__(self, config_file="florr_config.json", clock=time.monotonic):
         self.config_file = config_file
+        self.clock = clock
         self.config = self.DEFAULT_CONFIG.copy()
+        # 每次配置变化加一，使用方缓存配置项时只需比较版本号
+        self.version = 0
+        self._stamp = None
+        self._next_check = 0.0
+        self._batch_depth = 0
+        self._dirty = False
+        self._lock = threading.RLock()
         self.load_config()
     
+    def _file_stamp(self):
+        """配置文件的修改时间和大小，文件不存在时返回None"""
+        try:
+            stat = os.stat(self.config_file)
+        except (OSError, TypeError):
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
     def load_config(self):
         """从文件加载配置"""
         try:
@@ -60,6 +123,8 @@ class Config:
                 with open(self.config_file, 'r') as f:
                     user_config = json.load(f)
                     self.config.update(user_config)
+                self._stamp = self._file_stamp()
+                self.version += 1
                 logger.info(f"配置已从 {self.config_file} 加载")
             else:
                 self.save_config()
@@ -68,21 +133,93 @@ class Config:
             logger.error(f"加载配置失败: {e}")
     
     def save_config(self):
-        """保存配置到文件"""
+        """保存配置到文件
+
+        先写入同目录下的临时文件再替换，其他进程或重新加载时不会读到写了一半的文件。
+        """
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(self.config, f, indent=4)
+            directory = os.path.dirname(os.path.abspath(self.config_file))
+            fd, temp_path = tempfile.mkstemp(prefix=".florr_config.", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(self.config, f, indent=4)
+                if os.path.exists(self.config_file):
+                    shutil.copymode(self.config_file, temp_path)
+                os.replace(temp_path, self.config_file)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+            self._stamp = self._file_stamp()
             logger.info(f"配置已保存到 {self.config_file}")
         except Exception as e:
             logger.error(f"保存配置失败: {e}")
     
+    def reload_if_changed(self):
+        """配置文件被外部修改时重新加载，返回配置是否有变化
+
+        每 config_reload_interval 秒最多检查一次文件，其余调用直接返回；批量修改未写入时不重新加载。
+        """
+        interval = self.config.get("config_reload_interval", 2.0)
+        now = self.clock()
+        if not interval or now < self._next_check:
+            return False
+        self._next_check = now + interval
+        
+        stamp = self._file_stamp()
+        if stamp is None or stamp == self._stamp:
+            return False
+        with self._lock:
+            if self._batch_depth:
+                return False
+            self._stamp = stamp
+            try:
+                with open(self.config_file, 'r') as f:
+                    user_config = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"重新加载配置失败，继续使用当前配置: {e}")
+                return False
+            config = self.DEFAULT_CONFIG.copy()
+            config.update(user_config)
+            changed = sorted(key for key in config if config.get(key) != self.config.get(key))
+            if not changed:
+                return False
+            self.config = config
+            self.version += 1
+        log_event("config_reloaded", f"配置文件已修改，重新加载: {', '.join(changed)}", changed=changed)
+        return True
+    
     def get(self, key, default=None):
         """获取配置项"""
         return self.config.get(key, default)
     
     def set(self, key, value):
         """设置配置项"""
-        self.config[key] = value
+        self.update({key: value})
+    
+    def update(self, values):
+        """设置多个配置项，只写入一次文件；在 batch() 中时推迟到批量结束再写入"""
+        with self._lock:
+            self.config.update(values)
+            self.version += 1
+            self._dirty = True
+            if not self._batch_depth:
+                self._flush()
+    
+    @contextmanager
+    def batch(self):
+        """批量修改配置，结束时只写入一次文件"""
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if not self._batch_depth and self._dirty:
+                    self._flush()
+    
+    def _flush(self):
+        self._dirty = False
         self.save_config()
 
 
@@ -96,110 +233,204 @@ class ImageRecognition:
         "templates": []  # 将在初始化时加载模板
     }
     
-    def __init__(self, config):
+    # 红色按钮的HSV范围: H在0-10或160-180(色相在180处回绕)，S和V不低于100
+    RED_HUE_RANGES = [(0, 10), (160, 180)]
+    RED_MIN_SATURATION = 100
+    RED_MIN_VALUE = 100
+    
+    # 弹窗命中后，下次优先在其周围这么大的范围内搜索(像素)
+    POPUP_ROI_MARGIN = 100
+    
+    def __init__(self, config, clock=time.monotonic):
         self.config = config
         self.screen_region = config.get("screen_region")
         self.debug = config.get("debug", False)
+        self.popup_scale = config.get("popup_scale") or 0.5
+        self.popup_roi = config.get("popup_roi")
+        self.learned_popup_roi = None
+        self.red_lut = self._build_red_lut()
+        
+        # 画面是否可见、是否还在变化，用于判断游戏状态
+        self.idle_probe = IdleProbe(static_seconds=config.get("idle_static_seconds", 10.0), clock=clock)
+        
+        # 调试截图在后台线程编码和写入，按采样率保存并限制总大小
+        self.recorder = None
+        if self.debug:
+            self.recorder = DebugRecorder(
+                config.get("debug_frames_dir", "debug_frames"),
+                config.get("debug_sample_rate", 0.05),
+                config.get("debug_budget_mb", 200),
+                config.get("debug_format", "png")
+            )
         
         # 加载模板图像
         self.load_templates()
     
+    @classmethod
+    def _build_red_lut(cls):
+        """构建红色查找表，三个通道分别对应H、S、V，满足条件为255"""
+        lut = np.zeros((1, 256, 3), dtype=np.uint8)
+        for low, high in cls.RED_HUE_RANGES:
+            lut[0, low:high + 1, 0] = 255
+        lut[0, cls.RED_MIN_SATURATION:, 1] = 255
+        lut[0, cls.RED_MIN_VALUE:, 2] = 255
+        return lut
+    
     def load_templates(self):
         """加载模板图像用于匹配"""
-        # 实际使用时，应该有一些预先准备好的AFK弹窗模板
-        # 这里为简化，暂不实现模板加载
-        pass
+        self.templates = []
+        for path in self.config.get("popup_templates") or []:
+            template = cv2.imread(path)
+            if template is None:
+                logger.warning(f"无法加载弹窗模板: {path}")
+                continue
+            self.templates.append((os.path.splitext(os.path.basename(path))[0], template))
     
     def capture_screen(self):
-        """捕获屏幕截图"""
+        """捕获屏幕截图，设置了截图区域时只截取该区域"""
+        return self._capture(self.screen_region)
+    
+    def capture_full_screen(self):
+        """捕获整个屏幕，用于查找游戏区域"""
+        return self._capture(None)
+    
+    def _capture(self, region):
         try:
-            if self.screen_region:
-                screenshot = pyautogui.screenshot(region=self.screen_region)
-            else:
-                screenshot = pyautogui.screenshot()
+            with timings.span("capture_screen"):
+                if region:
+                    screenshot = pyautogui.screenshot(region=tuple(region))
+                else:
+                    screenshot = pyautogui.screenshot()
             
             # 转换为OpenCV格式
-            screenshot = np.array(screenshot)
-            screenshot = cv2.cvtColor(screenshot, cv2.COLOR_RGB2BGR)
+            with timings.span("color_convert"):
+                screenshot = np.array(screenshot)
+                screenshot = cv2.cvtColor(screenshot, cv2.COLOR_RGB2BGR)
             
-            if self.debug:
-                cv2.imwrite(f"debug_screenshot_{int(time.time())}.png", screenshot)
+            if self.recorder:
+                self.recorder.record("screenshot", screenshot)
                 
             return screenshot
         except Exception as e:
             logger.error(f"截图失败: {e}")
             return None
     
-    def detect_afk_popup(self):
-        """检测AFK弹窗"""
-        screenshot = self.capture_screen()
-        if screenshot is None:
-            return None
-        
-        # 方法1: 颜色检测 - 查找特定颜色组合
-        # 这里使用简化的颜色检测，实际应用中可能需要更复杂的算法
-        
-        # 转换为HSV颜色空间，更容易进行颜色检测
-        hsv = cv2.cvtColor(screenshot, cv2.COLOR_BGR2HSV)
-        
-        # 定义红色范围 (AFK弹窗通常有红色按钮或文字)
-        lower_red1 = np.array([0, 100, 100])
-        upper_red1 = np.array([10, 255, 255])
-        lower_red2 = np.array([160, 100, 100])
-        upper_red2 = np.array([180, 255, 255])
+    def red_mask(self, image):
+        """计算红色掩码，一次查表代替两个inRange掩码相加"""
+        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        h, s, v = cv2.split(cv2.LUT(hsv, self.red_lut))
+        return cv2.bitwise_and(cv2.bitwise_and(h, s), v)
+    
+    @staticmethod
+    def _is_button_size(w, h, scale=1.0, tolerance=0):
+        """检查区域大小是否符合按钮特征"""
+        return (50 * scale - tolerance < w < 200 * scale + tolerance
+                and 20 * scale - tolerance < h < 80 * scale + tolerance)
+    
+    def _find_red_button(self, screenshot, roi=None):
+        """在缩小的图像上粗检红色按钮，再在全分辨率下确认，返回按钮矩形 (x, y, w, h)"""
+        offset_x, offset_y = 0, 0
+        region = screenshot
+        if roi:
+            x, y, w, h = roi
+            offset_x, offset_y = max(0, int(x)), max(0, int(y))
+            region = screenshot[offset_y:int(y + h), offset_x:int(x + w)]
+            if region.size == 0:
+                return None
         
-        # 创建红色掩码
-        mask1 = cv2.inRange(hsv, lower_red1, upper_red1)
-        mask2 = cv2.inRange(hsv, lower_red2, upper_red2)
-        red_mask = mask1 + mask2
+        scale = self.popup_scale
+        if scale < 1:
+            small = cv2.resize(region, None, fx=scale, fy=scale, interpolation=cv2.INTER_NEAREST)
+        else:
+            small, scale = region, 1.0
         
-        # 查找红色区域的轮廓
-        contours, _ = cv2.findContours(red_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        contours, _ = cv2.findContours(self.red_mask(small), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
-        # 筛选可能的按钮区域
+        # 缩小后的位置和尺寸有取整误差，粗筛放宽，确认时扩展边缘
+        pad = int(2 / scale) + 1
         for contour in contours:
             x, y, w, h = cv2.boundingRect(contour)
+            if not self._is_button_size(w, h, scale, tolerance=2):
+                continue
             
-            # 检查区域大小是否符合按钮特征
-            if 50 < w < 200 and 20 < h < 80:
-                # 这可能是一个AFK确认按钮
-                button_center = (x + w // 2, y + h // 2)
-                
-                if self.debug:
-                    debug_img = screenshot.copy()
-                    cv2.rectangle(debug_img, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                    cv2.imwrite(f"debug_afk_detected_{int(time.time())}.png", debug_img)
-                
-                logger.info(f"检测到可能的AFK弹窗按钮，位置: {button_center}")
-                return button_center
-        
-        # 方法2: 模板匹配 (简化版)
-        # 实际应用中应该有多个模板并进行更复杂的匹配
+            x0 = max(0, int(x / scale) - pad)
+            y0 = max(0, int(y / scale) - pad)
+            x1 = min(region.shape[1], int((x + w) / scale) + pad)
+            y1 = min(region.shape[0], int((y + h) / scale) + pad)
+            
+            # 只在命中区域内做全分辨率确认
+            full_contours, _ = cv2.findContours(
+                self.red_mask(region[y0:y1, x0:x1]), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            for full_contour in full_contours:
+                bx, by, bw, bh = cv2.boundingRect(full_contour)
+                if self._is_button_size(bw, bh):
+                    return (bx + x0 + offset_x, by + y0 + offset_y, bw, bh)
         
         return None
     
-    def detect_game_status(self):
-        """检测游戏状态"""
-        screenshot = self.capture_screen()
+    @timings.timed("detect_afk_popup")
+    def detect_afk_popup(self, screenshot=None):
+        """检测AFK弹窗，未传入截图时自动截图"""
         if screenshot is None:
-            return "unknown"
+            screenshot = self.capture_screen()
+        if screenshot is None:
+            return None
+        
+        # 颜色检测 - 查找红色的按钮区域
+        # 配置了搜索区域时只在该区域内查找；否则先查上次命中的位置附近，未命中再查全图
+        if self.popup_roi:
+            box = self._find_red_button(screenshot, self.popup_roi)
+        else:
+            box = None
+            if self.learned_popup_roi:
+                box = self._find_red_button(screenshot, self.learned_popup_roi)
+            if box is None:
+                box = self._find_red_button(screenshot)
+        
+        if box is None:
+            return None
         
-        # 检测游戏是否正常运行的逻辑
-        # 这里可以检查游戏界面的特定元素
+        x, y, w, h = box
+        margin = self.POPUP_ROI_MARGIN
+        self.learned_popup_roi = (x - margin, y - margin, w + 2 * margin, h + 2 * margin)
         
-        # 简化版：检查屏幕上是否有游戏特定的颜色
-        # 例如，检查是否有游戏背景的特定颜色
+        # 这可能是一个AFK确认按钮
+        button_center = (x + w // 2, y + h // 2)
         
-        # 这里仅作为示例，实际应用需要更精确的检测
-        return "normal"
+        if self.recorder:
+            self.recorder.record("afk_detected", screenshot, boxes=[box], force=True)
+        
+        logger.info(f"检测到可能的AFK弹窗按钮，位置: {button_center}")
+        return button_center
+    
+    def detect_game_status(self, screenshot=None):
+        """检测游戏状态，未传入截图时自动截图
+        
+        返回 "normal"，画面不可见(最小化、黑屏)时返回 "hidden"，
+        画面长时间没有变化(被遮挡、标签页在后台)时返回 "static"，截图失败时返回 "unknown"。
+        """
+        if screenshot is None:
+            screenshot = self.capture_screen()
+        if screenshot is None:
+            return "unknown"
+        
+        # 缩略图比较，每次只需几毫秒，挂起期间也可以对每一帧检查
+        return self.idle_probe.check(screenshot)
 
 
 class InputController:
-    """输入控制模块"""
+    """输入控制模块，移动模式中的等待通过 clock 进行"""
     
-    def __init__(self, config):
+    def __init__(self, config, backend=None, clock=SYSTEM_CLOCK):
         self.config = config
         self.debug = config.get("debug", False)
+        self.backend = backend or create_backend(config.get("input_backend") or "pyautogui")
+        if self.backend.name == "pyautogui":
+            # 禁用PyAutoGUI的安全特性，避免意外中断
+            pyautogui.FAILSAFE = False
+        self.clock = clock
+        # 正在执行的移动模式，interrupt() 时停止
+        self._player = None
     
     def move_mouse(self, x, y, duration=None):
         """移动鼠标到指定位置"""
@@ -211,7 +442,7 @@ class InputController:
             offset_x = random.randint(-5, 5)
             offset_y = random.randint(-5, 5)
             
-            pyautogui.moveTo(x + offset_x, y + offset_y, duration=duration)
+            self.backend.move_to(x + offset_x, y + offset_y, duration=duration)
             
             if self.debug:
                 logger.debug(f"鼠标移动到 ({x + offset_x}, {y + offset_y})")
@@ -231,9 +462,9 @@ class InputController:
             # 随机的按下和释放间隔
             down_time = random.uniform(0.01, 0.1)
             
-            pyautogui.mouseDown(button=button)
-            time.sleep(down_time)
-            pyautogui.mouseUp(button=button)
+            with self.backend.batch():
+                self.backend.mouse_down(button)
+                self.backend.mouse_up(button, delay=down_time)
             
             if self.debug:
                 logger.debug(f"点击 {button} 按钮")
@@ -249,9 +480,9 @@ class InputController:
             if duration is None:
                 duration = random.uniform(0.1, 0.5)
             
-            keyboard.press(key)
-            time.sleep(duration)
-            keyboard.release(key)
+            with self.backend.batch():
+                self.backend.key_down(key)
+                self.backend.key_up(key, delay=duration)
             
             if self.debug:
                 logger.debug(f"按键 {key} 持续 {duration:.2f}秒")
@@ -262,32 +493,54 @@ class InputController:
             return False
     
     def execute_movement_pattern(self, pattern):
-        """执行移动模式"""
-        for action in pattern:
-            action_type = action[0]
-            
-            if action_type == "key":
-                key, duration, interval = action[1:]
-                self.press_key(key, duration)
-                time.sleep(interval)
-            
-            elif action_type == "mouse":
-                x, y, button = action[1:]
-                self.click(x, y, button)
-                time.sleep(random.uniform(0.1, 0.3))
-            
-            elif action_type == "wait":
-                duration = action[1]
-                time.sleep(duration)
+        """把移动模式编译为动作时间线后执行，返回计划与实际执行时刻的对比"""
+        timeline = compile_pattern(pattern)
+        player = TimelineRunner(self.backend, self.clock)
+        self._player = player
+        try:
+            report = player.play(timeline)
+        finally:
+            self._player = None
+        
+        if self.debug:
+            summary = report.summary()
+            logger.debug(f"移动模式: {summary['executed']}/{summary['events']} 个事件，"
+                         f"平均延迟 {summary['mean_ms']:.2f}ms，最大 {summary['max_ms']:.2f}ms")
+        return report
+    
+    def interrupt(self):
+        """在下一个事件边界停止正在执行的移动模式，并释放按住的键"""
+        player = self._player
+        if player is not None:
+            player.interrupt()
 
 
 class MovementStrategy:
     """移动策略基类"""
     
-    def __init__(self, config, input_controller):
+    # 参考分辨率(1920x1080)下随机点击的范围 (x范围, y范围)
+    CLICK_AREA = ((300, 1000), (200, 700))
+    
+    def __init__(self, config, input_controller, region=None):
         self.config = config
         self.input = input_controller
         self.mode = config.get("mode", "normal")
+        
+        # 按游戏窗口(自动找到的区域优先)或屏幕大小换算坐标，只在创建策略时计算一次
+        backend = getattr(input_controller, "backend", None)
+        self.calibration, self.origin = screen_geometry(region or config.get("screen_region"), backend)
+        (x_min, y_min), (x_max, y_max) = [self.screen_point(x, y) for x, y in zip(*self.CLICK_AREA)]
+        self.click_x = (x_min, x_max)
+        self.click_y = (y_min, y_max)
+    
+    def screen_point(self, x, y):
+        """把参考分辨率下的坐标换算为屏幕坐标"""
+        x, y = self.calibration.point(x, y)
+        return self.origin[0] + x, self.origin[1] + y
+    
+    def random_click_position(self):
+        """点击范围内的随机位置"""
+        return random.randint(*self.click_x), random.randint(*self.click_y)
     
     def generate_random_movement(self):
         """生成随机移动模式"""
@@ -313,8 +566,7 @@ class MovementStrategy:
         
         # 有时添加鼠标移动和点击
         if random.random() < 0.3:
-            x = random.randint(300, 1000)
-            y = random.randint(200, 700)
+            x, y = self.random_click_position()
             pattern.append(("mouse", x, y, 'left'))
         
         # 添加等待
@@ -325,21 +577,24 @@ class MovementStrategy:
     def execute(self):
         """执行移动策略"""
         pattern = self.generate_random_movement()
-        self.input.execute_movement_pattern(pattern)
+        return self.input.execute_movement_pattern(pattern)
 
 
 class SewerStrategy(MovementStrategy):
     """下水道区域策略"""
     
-    def __init__(self, config, input_controller):
-        super().__init__(config, input_controller)
+    # 参考分辨率下的安全位置
+    SAFE_POSITIONS = [
+        (400, 300),
+        (500, 400),
+        (350, 450)
+    ]
+    
+    def __init__(self, config, input_controller, region=None):
+        super().__init__(config, input_controller, region)
         
         # 下水道区域的安全位置
-        self.safe_positions = [
-            (400, 300),
-            (500, 400),
-            (350, 450)
-        ]
+        self.safe_positions = [self.screen_point(x, y) for x, y in self.SAFE_POSITIONS]
     
     def generate_random_movement(self):
         """生成下水道区域的随机移动"""
@@ -380,8 +635,7 @@ class DesertStrategy(MovementStrategy):
         
         # 更频繁的攻击
         if random.random() < 0.5:
-            x = random.randint(300, 1000)
-            y = random.randint(200, 700)
+            x, y = self.random_click_position()
             pattern.append(("mouse", x, y, 'left'))
         
         # 添加等待
@@ -408,8 +662,7 @@ class SpiderStrategy(MovementStrategy):
         
         # 频繁的攻击
         for _ in range(random.randint(1, 3)):
-            x = random.randint(300, 1000)
-            y = random.randint(200, 700)
+            x, y = self.random_click_position()
             pattern.append(("mouse", x, y, 'left'))
             pattern.append(("wait", random.uniform(0.1, 0.3)))
         
@@ -434,8 +687,7 @@ class AnthillStrategy(MovementStrategy):
         
         # 更多的攻击
         for _ in range(random.randint(2, 4)):
-            x = random.randint(300, 1000)
-            y = random.randint(200, 700)
+            x, y = self.random_click_position()
             pattern.append(("mouse", x, y, 'left'))
             pattern.append(("wait", random.uniform(0.2, 0.5)))
         
@@ -443,15 +695,24 @@ class AnthillStrategy(MovementStrategy):
 
 
 class FlorAFKBot:
-    """Florr.io AFK机器人主类"""
+    """Florr.io AFK机器人主类
+
+    所有计时和等待都通过 clock 进行，模拟运行时传入虚拟时钟(florr_afk_clock.VirtualClock)。
+    """
     
-    def __init__(self, config_file=None):
+    def __init__(self, config_file=None, clock=SYSTEM_CLOCK):
         # 初始化配置
-        self.config = Config(config_file)
+        self.config = Config(config_file, clock.monotonic)
+        self.clock = clock
+        self._configure_logging()
+        
+        # 截图区域，配置的 screen_region 或自动找到的游戏画布，检测结果按它换算为屏幕坐标
+        self.screen_region = self.config.get("screen_region")
+        self.region_tracker = None
         
         # 初始化组件
-        self.image_recognition = ImageRecognition(self.config)
-        self.input_controller = InputController(self.config)
+        self.image_recognition = ImageRecognition(self.config, clock.monotonic)
+        self.input_controller = InputController(self.config, clock=clock)
         
         # 根据配置选择策略
         self.strategy = self._create_strategy()
@@ -460,22 +721,120 @@ class FlorAFKBot:
         self.running = False
         self.start_time = None
         self.monitor_thread = None
+        
+        # 共享截图，主循环和监控线程使用同一帧
+        self.frame_producer = None
+        self.frame_subscription = None
+        
+        # 弹窗出现的历史，开启自适应调度时据此调整截图和检测频率
+        self.history = None
+        self.schedule = None
+        
+        # CPU预算，超出时逐级降低截图频率和检测分辨率
+        self.governor = CpuGovernor(clock=clock.monotonic)
+        
+        # 挂起状态: 画面不可见或静止时为导致挂起的游戏状态，否则为None
+        self.suspended = None
+        self.suspensions = 0
+        self._suspended_seconds = 0.0
+        self._suspended_since = None
+        self._suspend_lock = threading.Lock()
+        
+        # 循环中用到的配置项，配置文件修改后由 refresh_config() 更新
+        self._config_version = None
+        self._strategy_key = None
+        self.refresh_config()
+        
+        # 在每一帧上并发运行的检测器
+        self.detectors = self._create_detectors()
+        
+        # 录制中的会话
+        self.session = None
+        
+        # 运行指标，配置了端口时通过本地HTTP接口提供
+        self.metrics = Metrics(clock=clock.monotonic)
+        self.metrics_server = None
+        
+        # 按热键或信号触发的性能分析
+        self.profiler = ProfileTrigger(
+            self.config.get("profile_iterations", 50),
+            self.config.get("profile_mode", "cprofile"),
+            self.config.get("profile_dir", ".")
+        )
+        
+        if self.config.get("timing", False):
+            timings.enable(self.config.get("timing_report_interval", 60.0), self.config.get("timing_dump"))
+    
+    def _create_detectors(self):
+        """注册弹窗检测器，红色按钮检测优先于模板匹配"""
+        registry = DetectorRegistry(self.config.get("detector_workers", 4))
+        # 通过self查找image_recognition，替换组件后依然生效
+        registry.register("afk_popup", lambda frame: self.image_recognition.detect_afk_popup(frame.bgr),
+                          priority=10)
+        for name, template in self.image_recognition.templates:
+            registry.register_template(f"template_{name}", template, priority=5)
+        return registry
+    
+    def _configure_logging(self):
+        """按配置调整日志输出，调试模式下输出限速后的调试日志"""
+        setup_logging("florr_afk.log", self.config.get("log_json"),
+                      debug_rate=self.config.get("log_debug_rate", 5.0))
+        if self.config.get("debug", False):
+            logger.setLevel(logging.DEBUG)
+    
+    def refresh_config(self):
+        """检查配置文件是否被修改，并更新缓存的配置项
+
+        每次循环迭代调用，配置没有变化时只比较一次版本号。
+        区域和模式变化时重新创建策略，截图间隔变化时调整共享截图。
+        """
+        self.config.reload_if_changed()
+        version = self.config.version
+        if version == self._config_version:
+            return
+        first = self._config_version is None
+        self._config_version = version
+        
+        self.run_time_limit = self.config.get("run_time", 0)
+        self.movement_interval = tuple(self.config.get("movement_interval", [2.0, 5.0]))
+        self.check_interval = self.config.get("check_interval", 5.0)
+        self.capture_interval = self.config.get("capture_interval", 0.5)
+        self.adaptive = self.config.get("adaptive_schedule", False)
+        if self.schedule is not None:
+            self.schedule.base = self.capture_interval
+            self.schedule.fast = self.config.get("adaptive_fast_interval", 0.2)
+            self.schedule.slow = self.config.get("adaptive_slow_interval", 2.0)
+        self.governor.budget = self.config.get("cpu_budget", 0.0)
+        self.governor.window = self.config.get("cpu_budget_window", 5.0)
+        self.idle_suspend = self.config.get("idle_suspend", False)
+        self.idle_interval = self.config.get("idle_interval", 5.0)
+        self.image_recognition.idle_probe.static_seconds = self.config.get("idle_static_seconds", 10.0)
+        with self._suspend_lock:
+            if self.suspended and not self.idle_suspend:
+                self._resume()
+        
+        strategy_key = (self.config.get("area", "sewers"), self.config.get("mode", "normal"))
+        if not first and strategy_key != self._strategy_key:
+            log_event("strategy_changed", f"区域或模式已修改，切换策略: 区域 {strategy_key[0]}, 模式 {strategy_key[1]}",
+                      area=strategy_key[0], mode=strategy_key[1])
+            self.strategy = self._create_strategy()
+        self._strategy_key = strategy_key
     
     def _create_strategy(self):
         """创建对应区域的策略"""
         area = self.config.get("area", "sewers")
         
         if area == "sewers":
-            return SewerStrategy(self.config, self.input_controller)
+            return SewerStrategy(self.config, self.input_controller, self.screen_region)
         elif area == "desert":
-            return DesertStrategy(self.config, self.input_controller)
+            return DesertStrategy(self.config, self.input_controller, self.screen_region)
         elif area == "spider":
-            return SpiderStrategy(self.config, self.input_controller)
+            return SpiderStrategy(self.config, self.input_controller, self.screen_region)
         elif area == "anthill":
-            return AnthillStrategy(self.config, self.input_controller)
+            return AnthillStrategy(self.config, self.input_controller, self.screen_region)
         else:
             logger.warning(f"未知区域 '{area}'，使用默认策略")
-            return MovementStrategy(self.config, self.input_controller)
+            return MovementStrategy(self.config, self.input_controller, self.screen_region)
     
     def start(self):
         """启动AFK机器人"""
@@ -484,18 +843,44 @@ class FlorAFKBot:
             return
         
         self.running = True
-        self.start_time = time.time()
+        self.start_time = self.clock.time()
+        # 创建机器人之后修改的配置(如命令行参数)在这里生效
+        self.refresh_config()
+        
+        log_event("bot_started", f"AFK机器人启动，区域: {self.config.get('area')}, 模式: {self.config.get('mode')}",
+                  area=self.config.get("area"), mode=self.config.get("mode"), runtime=self.config.get("runtime"))
         
-        logger.info(f"AFK机器人启动，区域: {self.config.get('area')}, 模式: {self.config.get('mode')}")
+        self._start_history()
+        self._locate_region()
         
-        # 启动监控线程
-        self.monitor_thread = threading.Thread(target=self._monitor_function)
-        self.monitor_thread.daemon = True
-        self.monitor_thread.start()
+        # 启动共享截图，每次截图后按当前的调度取间隔
+        self.frame_producer = FrameProducer(
+            self.image_recognition.capture_screen,
+            self._capture_interval,
+            self.clock.monotonic,
+            self.clock
+        )
+        self.frame_producer.start()
+        self.frame_subscription = self.frame_producer.subscribe()
+        self._start_session()
+        self._start_metrics()
+        self._install_profile_triggers()
         
-        # 主循环
         try:
-            self._main_loop()
+            if self.config.get("runtime", "thread") == "asyncio":
+                # 截图、检测和策略执行作为并发任务运行，只有这种运行方式需要导入asyncio
+                import asyncio
+                from florr_afk_async import AsyncRuntime
+                asyncio.run(AsyncRuntime(self, self.frame_producer).run())
+            else:
+                # 启动监控线程
+                self.monitor_thread = threading.Thread(target=self._monitor_function)
+                self.monitor_thread.daemon = True
+                self.clock.register(self.monitor_thread)
+                self.monitor_thread.start()
+                
+                # 主循环
+                self._main_loop()
         except KeyboardInterrupt:
             logger.info("用户手动停止AFK机器人")
         except Exception as e:
@@ -509,29 +894,258 @@ class FlorAFKBot:
     def stop(self):
         """停止AFK机器人"""
         self.running = False
+        self.input_controller.interrupt()
+        
+        if self.frame_producer:
+            self.frame_producer.stop()
+        self.detectors.shutdown()
+        if getattr(self.image_recognition, "recorder", None):
+            self.image_recognition.recorder.close()
+        if self.session:
+            self.session.close()
+            self.session = None
+        if self.history:
+            self.history.close()
+            self.history = None
+            self.schedule = None
+        if self.metrics_server:
+            self.metrics_server.stop()
+            self.metrics_server = None
         
         if self.start_time:
-            run_time = time.time() - self.start_time
-            logger.info(f"AFK机器人停止，运行时间: {run_time:.2f}秒")
+            run_time = self.clock.time() - self.start_time
+            log_event("bot_stopped", f"AFK机器人停止，运行时间: {run_time:.2f}秒", run_time=round(run_time, 2))
             self.start_time = None
     
+    def _start_session(self):
+        """配置了会话文件时开始录制截图、检测结果和输入事件"""
+        path = self.config.get("session_file")
+        if not path or self.session is not None:
+            return
+        try:
+            self.session = SessionWriter(path, self.config.get("session_frame_interval", 1.0), {
+                "target": "bot",
+                "area": self.config.get("area"),
+                "screen_region": self.screen_region,
+                "popup_roi": self.config.get("popup_roi"),
+                "popup_templates": self.config.get("popup_templates"),
+            }, self.clock.monotonic, int(self.config.get("session_budget_mb", 2048) * 2**20) or None)
+        except OSError as e:
+            logger.error(f"无法创建会话文件: {e}")
+            return
+        self.input_controller.backend.add_observer(self.session.input_observer)
+        logger.info(f"开始录制会话: {path}")
+    
+    def _record_decision(self, frame, decision):
+        """录制会话时保存这一帧和检测结果，检测到弹窗的帧总是保存"""
+        if self.session is None or frame is None:
+            return
+        index = self.session.add_frame(frame, force=decision.name is not None)
+        if index is not None:
+            self.session.add_event("detection", {"frame": index, "name": decision.name, "result": decision.result})
+    
+    def _start_history(self):
+        """配置了历史文件时记录弹窗出现的时刻，开启自适应调度时据此调整截图和检测频率"""
+        path = self.config.get("history_file")
+        if not path or self.history is not None:
+            return
+        try:
+            self.history = ArrivalHistory(path)
+        except Exception as e:
+            logger.error(f"无法打开历史文件: {e}")
+            return
+        self.schedule = AdaptiveSchedule(
+            self.history, "popup", self.start_time,
+            base=self.capture_interval,
+            fast=self.config.get("adaptive_fast_interval", 0.2),
+            slow=self.config.get("adaptive_slow_interval", 2.0),
+        )
+    
+    def _capture_interval(self):
+        """当前的截图间隔，没有开启自适应调度时为固定的 capture_interval，再按CPU预算节流；挂起期间为 idle_interval"""
+        if self.suspended:
+            return self.idle_interval
+        if self.adaptive and self.schedule is not None:
+            return self.governor.interval(self.schedule.interval(self.clock.time()))
+        return self.governor.interval(self.capture_interval)
+    
+    def _govern(self):
+        """按CPU预算调整节流级别，级别变化时同步检测分辨率"""
+        if self.governor.update():
+            base = self.config.get("popup_scale") or 0.5
+            self.image_recognition.popup_scale = min(1.0, base) * self.governor.scale
+    
+    def _update_suspension(self, status):
+        """按游戏状态进入或退出挂起状态，返回状态是否为空闲状态(不需要恢复)
+        
+        开启 idle_suspend 时，画面不可见或静止就挂起: 截图间隔放慢到 idle_interval，
+        不再检测弹窗和执行策略；画面恢复为 "normal" 时立即退出挂起。没有开启时只记录调试日志。
+        """
+        with self._suspend_lock:
+            if status in IDLE_STATUSES:
+                if not self.idle_suspend:
+                    logger.debug(f"游戏画面{'不可见' if status == 'hidden' else '静止'}")
+                elif not self.suspended:
+                    self._suspend(status)
+                else:
+                    self.suspended = status
+                return True
+            if status == "normal" and self.suspended:
+                self._resume()
+            return False
+    
+    def _suspend(self, status):
+        """进入挂起状态"""
+        self.suspended = status
+        self.suspensions += 1
+        self._suspended_since = self.clock.monotonic()
+        log_event("suspended", f"游戏画面{'不可见' if status == 'hidden' else '静止'}，挂起并每 {self.idle_interval} 秒截图一次",
+                  status=status, interval=self.idle_interval)
+    
+    def _resume(self):
+        """退出挂起状态，并提前截下一帧，不必等挂起期间的截图间隔结束"""
+        duration = self.clock.monotonic() - self._suspended_since
+        self._suspended_seconds += duration
+        self.suspended = None
+        self._suspended_since = None
+        if self.frame_producer is not None:
+            self.frame_producer.wake()
+        log_event("resumed", f"游戏画面已恢复，挂起 {duration:.1f} 秒后回到正常频率", seconds=round(duration, 1))
+    
+    def suspended_seconds(self):
+        """累计挂起的秒数，包括正在进行的挂起"""
+        if self._suspended_since is None:
+            return self._suspended_seconds
+        return self._suspended_seconds + self.clock.monotonic() - self._suspended_since
+    
+    def _record_arrival(self, decision):
+        """记录弹窗出现的时刻，同一个弹窗被连续检测到时只记一次"""
+        if self.schedule is not None and self.schedule.observe(self.clock.time(), decision.name):
+            log_event("popup_arrival", f"记录弹窗出现，预期窗口: {self.schedule.window}",
+                      logging.DEBUG, window=self.schedule.window)
+    
+    def _idle(self, seconds):
+        """移动间隔的等待
+
+        自适应调度认为弹窗可能出现时，等待期间对每张新截图检测弹窗，检测到时提前结束等待；
+        其余时候直接等待。
+        """
+        if not self.adaptive or self.schedule is None or self.frame_subscription is None:
+            self.clock.sleep(seconds)
+            return
+        deadline = self.clock.monotonic() + seconds
+        while self.running:
+            remaining = deadline - self.clock.monotonic()
+            if remaining <= 0:
+                return
+            if not self.schedule.hot(self.clock.time()):
+                # 每秒重新检查一次是否进入预期窗口
+                self.clock.sleep(min(remaining, 1.0))
+                continue
+            frame = self.frame_subscription.next(timeout=remaining)
+            if frame is not None and self.detectors.run(frame.image).result:
+                return
+    
+    def _locate_region(self):
+        """开启 auto_region 且没有配置 screen_region 时，从全屏截图中找出游戏画布作为截图区域"""
+        if not self.config.get("auto_region", False) or self.config.get("screen_region"):
+            return
+        self.region_tracker = RegionTracker(self.image_recognition.capture_full_screen,
+                                            self.config.get("region_check_interval", 5.0), clock=self.clock)
+        self._apply_region(self.region_tracker.locate())
+    
+    def _track_region(self, force=False):
+        """定期或检测失败时检查游戏区域，区域变化时更新截图区域和策略"""
+        if self.region_tracker is not None and self.region_tracker.check(force):
+            self._apply_region(self.region_tracker.region)
+    
+    def _apply_region(self, region):
+        """切换截图区域，之后的截图、弹窗坐标和策略的坐标换算都按新区域进行"""
+        self.screen_region = region
+        self.image_recognition.screen_region = region
+        self.image_recognition.learned_popup_roi = None
+        self.strategy = self._create_strategy()
+        if region:
+            log_event("game_region", f"游戏区域: {tuple(region)}", region=list(region))
+        else:
+            log_event("game_region", "没有找到游戏区域，截取整个屏幕", logging.WARNING, region=None)
+    
+    def _start_metrics(self):
+        """注册截图相关指标，配置了端口时启动指标接口"""
+        producer = self.frame_producer
+        self.metrics.counter_func("frames_captured", lambda: producer.capture_count)
+        self.metrics.counter_func("frames_skipped", lambda: self.frame_subscription.skipped)
+        self.metrics.gauge_func("capture_seconds", lambda: producer.last_capture_time)
+        self.metrics.gauge_func("capture_interval", self._capture_interval)
+        self.metrics.gauge_func("cpu_share", lambda: self.governor.share)
+        self.metrics.gauge_func("cpu_budget", lambda: self.governor.budget)
+        self.metrics.gauge_func("cpu_budget_level", lambda: self.governor.level)
+        self.metrics.counter_func("cpu_budget_changes", lambda: self.governor.changes)
+        self.metrics.gauge_func("suspended", lambda: 1 if self.suspended else 0)
+        self.metrics.counter_func("suspensions", lambda: self.suspensions)
+        self.metrics.gauge_func("suspended_seconds", self.suspended_seconds)
+        
+        port = self.config.get("metrics_port", 0)
+        if port and self.metrics_server is None:
+            try:
+                self.metrics_server = MetricsServer(self.metrics, self.config.get("metrics_host", "127.0.0.1"), port)
+                self.metrics_server.start()
+            except OSError as e:
+                logger.error(f"指标接口启动失败: {e}")
+                self.metrics_server = None
+    
+    def _install_profile_triggers(self):
+        """注册触发性能分析的信号和热键"""
+        if threading.current_thread() is threading.main_thread():
+            self.profiler.install_signal()
+        hotkey = self.config.get("profile_hotkey", "ctrl+alt+p")
+        if hotkey:
+            self.profiler.install_hotkey(hotkey)
+    
     def _main_loop(self):
         """主循环"""
         while self.running:
+            self.profiler.tick()
+            self.metrics.inc("loop_iterations")
+            self.refresh_config()
+            self._govern()
+            
             # 检查运行时间限制
-            run_time_limit = self.config.get("run_time", 0)
+            run_time_limit = self.run_time_limit
             if run_time_limit > 0 and self.start_time:
-                elapsed_time = (time.time() - self.start_time) / 60  # 转换为分钟
+                elapsed_time = (self.clock.time() - self.start_time) / 60  # 转换为分钟
                 if elapsed_time >= run_time_limit:
-                    logger.info(f"达到运行时间限制 ({run_time_limit}分钟)，停止AFK机器人")
+                    log_event("run_time_limit", f"达到运行时间限制 ({run_time_limit}分钟)，停止AFK机器人",
+                              minutes=run_time_limit)
                     break
             
+            # 挂起期间只检查画面是否恢复
+            if self.suspended:
+                frame = self._next_frame()
+                if frame is not None:
+                    self._update_suspension(self.image_recognition.detect_game_status(frame))
+                continue
+            
             # 检查AFK弹窗
-            popup_position = self.image_recognition.detect_afk_popup()
+            frame = self._next_frame()
+            if frame is None:
+                frame = self.image_recognition.capture_screen()
+            decision = self.detectors.run(frame)
+            if frame is not None:
+                self.metrics.observe("detection_latency", decision.elapsed)
+            self._record_decision(frame, decision)
+            popup_position = decision.result
             if popup_position:
-                logger.info(f"检测到AFK弹窗，点击位置: {popup_position}")
-                self.input_controller.click(popup_position[0], popup_position[1])
-                time.sleep(random.uniform(1.0, 2.0))
+                self._record_arrival(decision)
+                self.metrics.inc("popups_detected")
+                log_event("popup_detected", f"检测到AFK弹窗({decision.name})，点击位置: {popup_position}",
+                          detector=decision.name, x=popup_position[0], y=popup_position[1])
+                # 先停止移动模式并释放按住的键，再点击弹窗
+                self.input_controller.interrupt()
+                x, y = to_screen(popup_position, self.screen_region)
+                self.input_controller.click(x, y)
+                self.metrics.inc("popups_clicked")
+                self.clock.sleep(random.uniform(1.0, 2.0))
                 continue
             
             # 执行区域特定策略
@@ -539,27 +1153,46 @@ class FlorAFKBot:
             
             # 随机等待，避免过于规律的操作
             wait_time = random.uniform(
-                self.config.get("movement_interval", [2.0, 5.0])[0],
-                self.config.get("movement_interval", [2.0, 5.0])[1]
+                self.movement_interval[0],
+                self.movement_interval[1]
             )
-            time.sleep(wait_time)
+            self._idle(wait_time)
     
     def _monitor_function(self):
         """监控线程函数"""
-        check_interval = self.config.get("check_interval", 5.0)
-        
         while self.running:
+            # 检查间隔由主循环在配置修改后更新
+            check_interval = self.check_interval
             try:
                 # 检查游戏状态
-                status = self.image_recognition.detect_game_status()
-                if status != "normal":
-                    logger.warning(f"检测到游戏状态异常: {status}")
+                status = self.image_recognition.detect_game_status(self._latest_frame())
+                # 状态异常时先确认游戏区域没有移动，画面不可见或静止时按正常的间隔检查
+                self._track_region(force=status not in ("normal",) + IDLE_STATUSES)
+                # 画面不可见或静止时挂起而不是恢复，恢复会点击屏幕和按键
+                if not self._update_suspension(status) and status != "normal":
+                    log_event("game_status", f"检测到游戏状态异常: {status}", logging.WARNING, status=status)
+                    # 主循环可能正在执行移动模式，先打断它并释放按住的键，再点击和按键恢复
+                    self.input_controller.interrupt()
                     self._recover_from_error(status)
                 
-                time.sleep(check_interval)
+                self.clock.sleep(check_interval)
             except Exception as e:
                 logger.error(f"监控线程出错: {e}")
-                time.sleep(check_interval * 2)  # 出错后等待更长时间
+                self.clock.sleep(check_interval * 2)  # 出错后等待更长时间
+    
+    def _next_frame(self):
+        """等待共享截图的下一帧，没有共享截图或超时返回None(由检测函数自行截图)"""
+        if self.frame_subscription is None:
+            return None
+        frame = self.frame_subscription.next(timeout=self.capture_interval * 2)
+        return frame.image if frame else None
+    
+    def _latest_frame(self):
+        """共享截图的最新一帧"""
+        if self.frame_producer is None:
+            return None
+        frame = self.frame_producer.latest()
+        return frame.image if frame else None
     
     def _recover_from_error(self, error_type):
         """从错误中恢复"""
@@ -567,7 +1200,8 @@ class FlorAFKBot:
             logger.info("自动恢复已禁用，不进行恢复")
             return
         
-        logger.info(f"尝试从错误中恢复: {error_type}")
+        log_event("recovery", f"尝试从错误中恢复: {error_type}", error_type=error_type)
+        self.metrics.inc("recoveries")
         
         if error_type == "disconnected":
             # 模拟刷新页面
@@ -582,15 +1216,19 @@ class FlorAFKBot:
         else:
             # 通用恢复策略
             logger.info("执行通用恢复策略...")
-            # 可以尝试点击屏幕中央，按ESC键等
-            screen_width, screen_height = pyautogui.size()
-            self.input_controller.click(screen_width // 2, screen_height // 2)
-            time.sleep(1)
+            # 可以尝试点击游戏区域(没有时为屏幕)中央，按ESC键等
+            if self.screen_region:
+                left, top, width, height = self.screen_region
+                self.input_controller.click(left + width // 2, top + height // 2)
+            else:
+                screen_width, screen_height = self.input_controller.backend.size()
+                self.input_controller.click(screen_width // 2, screen_height // 2)
+            self.clock.sleep(1)
             self.input_controller.press_key('esc')
-            time.sleep(1)
+            self.clock.sleep(1)
         
         # 等待一段时间后继续
-        time.sleep(5)
+        self.clock.sleep(5)
 
 
 def main():
@@ -605,21 +1243,25 @@ def main():
                         help='行为模式')
     parser.add_argument('--time', type=int, help='运行时间(分钟)，0表示无限制')
     parser.add_argument('--debug', action='store_true', help='启用调试模式')
+    parser.add_argument('--runtime', type=str, choices=['thread', 'asyncio'], help='运行方式')
     
     args = parser.parse_args()
     
     # 创建AFK机器人
     bot = FlorAFKBot(args.config)
     
-    # 应用命令行参数
-    if args.area:
-        bot.config.set("area", args.area)
-    if args.mode:
-        bot.config.set("mode", args.mode)
-    if args.time is not None:
-        bot.config.set("run_time", args.time)
-    if args.debug:
-        bot.config.set("debug", True)
+    # 应用命令行参数，所有修改只写入一次配置文件
+    with bot.config.batch():
+        if args.area:
+            bot.config.set("area", args.area)
+        if args.mode:
+            bot.config.set("mode", args.mode)
+        if args.time is not None:
+            bot.config.set("run_time", args.time)
+        if args.debug:
+            bot.config.set("debug", True)
+        if args.runtime:
+            bot.config.set("runtime", args.runtime)
     
     # 启动机器人
     print("按Ctrl+C停止")
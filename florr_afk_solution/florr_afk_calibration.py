@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Florr.io 自动AFK脚本 - 分辨率标定
+屏幕几何常量都在1920x1080下测得，按实际屏幕或screen_region大小换算，每种分辨率只计算一次
+"""
+
+import threading
+
+# 常量测量时的屏幕分辨率 (宽, 高)
+REFERENCE_SIZE = (1920, 1080)
+
+
+class Calibration:
+    """一种分辨率下的屏幕几何
+
+    x()/y() 按宽高各自的比例换算坐标，length() 按较小的比例换算半径、步长等长度，
+    宽屏下圆不会被拉伸。由常量派生的掩码、偏移表等通过 cached() 生成一次后复用。
+    """
+
+    def __init__(self, width, height, reference=REFERENCE_SIZE):
+        self.width = width
+        self.height = height
+        self.reference = tuple(reference)
+        self.scale_x = width / self.reference[0]
+        self.scale_y = height / self.reference[1]
+        self.scale = min(self.scale_x, self.scale_y)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    def x(self, value):
+        """换算横坐标"""
+        return int(round(value * self.scale_x))
+
+    def y(self, value):
+        """换算纵坐标"""
+        return int(round(value * self.scale_y))
+
+    def point(self, x, y):
+        """换算一个 (x, y) 坐标"""
+        return self.x(x), self.y(y)
+
+    def length(self, value):
+        """换算长度，至少为1"""
+        return max(1, int(round(value * self.scale)))
+
+    def cached(self, name, build):
+        """返回 build(self) 的结果，同一名称只生成一次"""
+        with self._lock:
+            if name not in self._cache:
+                self._cache[name] = build(self)
+            return self._cache[name]
+
+
+_calibrations = {}
+_calibrations_lock = threading.Lock()
+
+
+def calibrate(width, height, reference=REFERENCE_SIZE):
+    """返回该分辨率的标定结果，同一分辨率共用一个实例"""
+    key = (int(width), int(height), tuple(reference))
+    with _calibrations_lock:
+        calibration = _calibrations.get(key)
+        if calibration is None:
+            calibration = _calibrations[key] = Calibration(key[0], key[1], reference)
+        return calibration
+
+
+def screen_geometry(region=None, backend=None):
+    """返回 (标定结果, 原点)
+
+    region 为 screen_region (左, 上, 宽, 高) 时按游戏窗口换算，原点为窗口左上角；
+    否则按输入后端报告的屏幕大小换算，无法获取时使用参考分辨率。
+    """
+    if region:
+        left, top, width, height = region
+        return calibrate(width, height), (left, top)
+    try:
+        width, height = backend.size()
+        width, height = int(width), int(height)
+    except Exception:
+        width, height = REFERENCE_SIZE
+    return calibrate(width, height), (0, 0)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Florr.io 自动AFK脚本 - 时钟
+机器人、策略和输入控制通过时钟对象读取时间和等待，模拟运行时换成虚拟时钟，等待立即推进虚拟时间
+"""
+
+import math
+import time
+import itertools
+import threading
+
+
+class SystemClock:
+    """真实时钟，直接使用 time 模块和条件变量"""
+
+    # 需要精确定时的等待提前这么多秒醒来，余下的时间忙等
+    SPIN = 0.001
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def wait_for(self, cond, predicate, timeout=None):
+        """在已持有的条件变量上等待 predicate 成立，返回 predicate 的最终结果"""
+        return cond.wait_for(predicate, timeout)
+
+    def notify_all(self, cond):
+        """唤醒在条件变量上等待的线程，调用方需持有 cond"""
+        cond.notify_all()
+
+    def register(self, thread=None):
+        """登记参与调度的线程，真实时钟不需要"""
+
+
+SYSTEM_CLOCK = SystemClock()
+
+
+class VirtualClock:
+    """虚拟时钟
+
+    登记过的线程都在时钟上等待时，虚拟时间直接跳到最早的唤醒时刻，不真正等待；
+    计算本身照常消耗真实时间，所以一天的运行只需要计算所花的时间。
+    线程第一次等待时自动登记，新建的线程应在 start() 之前 register()，
+    否则它开始等待之前时间就可能被推进。登记后没有启动的线程会一直阻止时间推进。
+    在时钟之外等待(锁、队列、线程池)的线程视为正在运行，这期间时间不推进。
+    close() 之后所有等待立即返回，用于结束模拟时放行仍在等待的线程。
+    """
+
+    # 虚拟时间只在等待时推进，不能忙等
+    SPIN = 0.0
+
+    def __init__(self, start=0.0, epoch=None):
+        self.epoch = time.time() if epoch is None else epoch
+        self.advances = 0
+        self._now = start
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._threads = []
+        # 线程 -> (唤醒时刻, 等待顺序, 等待的条件变量)
+        self._blocked = {}
+        self._order = itertools.count()
+        self._sleep_cond = threading.Condition()
+        self._closed = False
+        self._driver = None
+
+    def time(self):
+        """虚拟的时间戳，epoch 加上已经过的虚拟秒数"""
+        return self.epoch + self._now
+
+    def monotonic(self):
+        return self._now
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def register(self, thread=None):
+        """登记参与调度的线程，默认为当前线程"""
+        thread = thread or threading.current_thread()
+        with self._lock:
+            if thread not in self._threads:
+                self._threads.append(thread)
+            if self._driver is None and not self._closed:
+                self._driver = threading.Thread(target=self._drive, daemon=True, name="FlorAFKVirtualClock")
+                self._driver.start()
+
+    def unregister(self, thread=None):
+        """取消登记，线程不再阻止时间推进"""
+        thread = thread or threading.current_thread()
+        with self._lock:
+            if thread in self._threads:
+                self._threads.remove(thread)
+            self._blocked.pop(thread, None)
+            self._changed.notify()
+
+    def sleep(self, seconds):
+        with self._sleep_cond:
+            self.wait_for(self._sleep_cond, lambda: False, max(0.0, seconds))
+
+    def wait_for(self, cond, predicate, timeout=None):
+        """在已持有的条件变量上等待 predicate 成立或虚拟时间超时，返回 predicate 的最终结果
+
+        唤醒等待者必须通过 notify_all()，时钟才知道它已不再等待。
+        """
+        me = threading.current_thread()
+        self.register(me)
+        deadline = math.inf if timeout is None else self._now + timeout
+        while True:
+            result = predicate()
+            if result or self._closed:
+                return result
+            with self._lock:
+                expired = self._now >= deadline
+                if not expired:
+                    self._blocked[me] = (deadline, next(self._order), cond)
+                    self._changed.notify()
+            if expired:
+                return predicate()
+            # 从登记到进入 wait() 一直持有 cond，推进时间后的唤醒不会丢失
+            cond.wait()
+
+    def notify_all(self, cond):
+        """唤醒在 cond 上等待的线程，调用方需持有 cond"""
+        with self._lock:
+            for thread in [t for t, (_, _, c) in self._blocked.items() if c is cond]:
+                del self._blocked[thread]
+        cond.notify_all()
+
+    def close(self):
+        """停止推进时间并放行所有等待的线程"""
+        with self._lock:
+            self._closed = True
+            conds = {id(c): c for _, _, c in self._blocked.values()}
+            self._blocked.clear()
+            self._changed.notify()
+        for cond in conds.values():
+            with cond:
+                cond.notify_all()
+
+    def _drive(self):
+        """推进时间的后台线程，唤醒条件变量时不持有其他锁，不会与等待者互相等锁"""
+        while True:
+            with self._lock:
+                wake = []
+                while not self._closed and not wake:
+                    wake = self._advance()
+                    if not wake:
+                        # 定期检查已退出的线程
+                        self._changed.wait(0.05)
+                if self._closed:
+                    self._driver = None
+                    return
+            for cond in wake:
+                with cond:
+                    cond.notify_all()
+
+    def _advance(self):
+        """所有登记的线程都在等待时推进到最早的唤醒时刻，返回需要唤醒的条件变量"""
+        self._threads = [t for t in self._threads if t.ident is None or t.is_alive()]
+        for thread in [t for t in self._blocked if t not in self._threads]:
+            del self._blocked[thread]
+        if not self._threads or len(self._blocked) < len(self._threads):
+            return []
+        deadline, _, _ = min(self._blocked.values(), key=lambda item: item[:2])
+        if deadline == math.inf:
+            return []
+        self._now = max(self._now, deadline)
+        self.advances += 1
+        conds = {}
+        for thread in [t for t, (d, _, _) in self._blocked.items() if d <= self._now]:
+            cond = self._blocked.pop(thread)[2]
+            conds[id(cond)] = cond
+        return list(conds.values())
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Florr.io 自动AFK脚本 - 检测器注册表
+多个检测器在同一帧上并发运行，共享的预处理只计算一次，结果合并为一个决策
+"""
+
+import time
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from florr_afk_lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+
+logger = logging.getLogger("FlorAFK")
+
+# name为胜出的检测器(没有命中时为None)，result为其结果，
+# results为所有运行过的检测器的结果(按优先级短路时被跳过的检测器不在其中)，timings为各检测器和预处理的耗时(秒)，elapsed为总耗时
+Decision = namedtuple("Decision", ["name", "result", "results", "timings", "elapsed"])
+
+# 内置的预处理，输入为BGR图像
+PREPROCESSORS = {
+    "bgr": lambda image: image,
+    "rgb": lambda image: cv2.cvtColor(image, cv2.COLOR_BGR2RGB),
+    "hsv": lambda image: cv2.cvtColor(image, cv2.COLOR_BGR2HSV),
+    "gray": lambda image: cv2.cvtColor(image, cv2.COLOR_BGR2GRAY),
+}
+
+
+class Detector:
+    """检测器声明
+
+    func 接收一个 DetectorInput，返回检测结果，未命中返回None。
+    inputs 为需要的预处理名称，roi 为 (x, y, 宽, 高) 搜索区域，priority 越大越优先。
+    threaded 为False的检测器(如纯Python循环，受GIL限制)在调用线程中运行。
+    """
+
+    def __init__(self, name, func, inputs=("bgr",), priority=0, roi=None, threaded=True):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.priority = priority
+        self.roi = roi
+        self.threaded = threaded
+
+
+class FrameContext:
+    """一帧的共享预处理结果，每种预处理只计算一次"""
+
+    def __init__(self, image, preprocessors):
+        self.image = image
+        self.preprocessors = preprocessors
+        self.timings = {}
+        self._cache = {}
+        self._locks = {name: threading.Lock() for name in preprocessors}
+
+    def get(self, name, roi=None):
+        """返回预处理结果，指定roi时返回对应区域"""
+        if name not in self._cache:
+            with self._locks[name]:
+                if name not in self._cache:
+                    start = time.perf_counter()
+                    self._cache[name] = self.preprocessors[name](self.image)
+                    self.timings[name] = time.perf_counter() - start
+        data = self._cache[name]
+        if roi:
+            x, y, w, h = roi
+            return data[max(0, y):y + h, max(0, x):x + w]
+        return data
+
+
+class DetectorInput:
+    """传给检测器的输入，声明的每种预处理作为同名属性，offset为roi左上角坐标"""
+
+    def __init__(self, context, inputs, roi=None):
+        self.offset = (max(0, roi[0]), max(0, roi[1])) if roi else (0, 0)
+        for name in inputs:
+            setattr(self, name, context.get(name, roi))
+
+
+class DetectorRegistry:
+    """检测器注册表
+
+    run() 先并发计算所有检测器声明的预处理，再在线程池中运行检测器(OpenCV会释放GIL)，
+    一帧的耗时接近最慢的检测器，而不是所有检测器之和。
+    short_circuit 为True时按优先级从高到低分批运行，一批中有检测器命中后不再运行优先级更低的检测器，
+    适合低优先级检测器很慢(如在调用线程中运行的纯Python搜索)的情况。
+    """
+
+    def __init__(self, max_workers=4, short_circuit=False):
+        self.detectors = []
+        self.preprocessors = dict(PREPROCESSORS)
+        self.max_workers = max_workers
+        self.short_circuit = short_circuit
+        self._pool = None
+
+    def register(self, name, func, inputs=("bgr",), priority=0, roi=None, threaded=True):
+        """注册检测器"""
+        for input_name in inputs:
+            if input_name not in self.preprocessors:
+                raise ValueError(f"未知的检测器输入: {input_name}")
+        detector = Detector(name, func, inputs, priority, roi, threaded)
+        self.detectors.append(detector)
+        return detector
+
+    def register_template(self, name, template, threshold=0.8, priority=0, roi=None, grayscale=False):
+        """注册模板匹配检测器，命中时返回模板中心坐标"""
+        if grayscale and template.ndim == 3:
+            template = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
+        input_name = "gray" if grayscale else "bgr"
+        return self.register(name, template_detector(template, threshold, input_name),
+                             inputs=(input_name,), priority=priority, roi=roi)
+
+    def add_preprocessor(self, name, func):
+        """添加自定义预处理，func 接收BGR图像"""
+        self.preprocessors[name] = func
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="FlorAFKDetect")
+        return self._pool
+
+    @staticmethod
+    def _run_detector(detector, context):
+        start = time.perf_counter()
+        result = detector.func(DetectorInput(context, detector.inputs, detector.roi))
+        return result, time.perf_counter() - start
+
+    def _run_by_priority(self, context, outcomes):
+        """按优先级从高到低分批运行，相邻的可并发检测器同批在线程池中运行，不可并发的单独成批"""
+        batches = []
+        for detector in sorted(self.detectors, key=lambda d: -d.priority):
+            if detector.threaded and batches and batches[-1][-1].threaded:
+                batches[-1].append(detector)
+            else:
+                batches.append([detector])
+        for batch in batches:
+            if len(batch) == 1:
+                outcomes[batch[0].name] = self._run_detector(batch[0], context)
+            else:
+                pool = self._get_pool()
+                futures = {d.name: pool.submit(self._run_detector, d, context) for d in batch}
+                for name, future in futures.items():
+                    outcomes[name] = future.result()
+            if any(outcomes[d.name][0] is not None for d in batch):
+                break
+
+    def run(self, image):
+        """在一帧上运行所有检测器，返回合并后的决策，没有图像时返回空决策"""
+        start = time.perf_counter()
+        if image is None:
+            return Decision(None, None, {}, {}, 0.0)
+        context = FrameContext(image, self.preprocessors)
+        outcomes = {}
+
+        threaded = [d for d in self.detectors if d.threaded]
+        if self.short_circuit:
+            self._run_by_priority(context, outcomes)
+        elif len(self.detectors) <= 1 or not threaded:
+            # 只有一个检测器时没有并发的必要，省去线程切换
+            for detector in self.detectors:
+                outcomes[detector.name] = self._run_detector(detector, context)
+        else:
+            pool = self._get_pool()
+            needed = {name for d in self.detectors for name in d.inputs}
+            for future in [pool.submit(context.get, name) for name in needed]:
+                future.result()
+
+            futures = {d.name: pool.submit(self._run_detector, d, context) for d in threaded}
+            for detector in self.detectors:
+                if not detector.threaded:
+                    outcomes[detector.name] = self._run_detector(detector, context)
+            for name, future in futures.items():
+                outcomes[name] = future.result()
+
+        results = {name: outcome[0] for name, outcome in outcomes.items()}
+        timings = dict(context.timings)
+        timings.update({name: outcome[1] for name, outcome in outcomes.items()})
+
+        winner = None
+        for detector in self.detectors:
+            if results.get(detector.name) is None:
+                continue
+            if winner is None or detector.priority > winner.priority:
+                winner = detector
+
+        elapsed = time.perf_counter() - start
+        if winner is None:
+            return Decision(None, None, results, timings, elapsed)
+        return Decision(winner.name, results[winner.name], results, timings, elapsed)
+
+    def shutdown(self):
+        """关闭线程池"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+def template_detector(template, threshold=0.8, input_name="bgr"):
+    """返回在帧中查找模板的检测函数，找到时返回模板中心坐标"""
+    height, width = template.shape[:2]
+
+    def detect(frame):
+        haystack = getattr(frame, input_name)
+        if haystack.shape[0] < height or haystack.shape[1] < width:
+            return None
+        scores = cv2.matchTemplate(haystack, template, cv2.TM_CCOEFF_NORMED)
+        _, max_score, _, max_loc = cv2.minMaxLoc(scores)
+        if max_score < threshold:
+            return None
+        return (frame.offset[0] + max_loc[0] + width // 2, frame.offset[1] + max_loc[1] + height // 2)
+
+    return detect
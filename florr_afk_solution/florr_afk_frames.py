@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Florr.io 自动AFK脚本 - 共享截图
+由一个生产者按固定频率截图并发布最新一帧，所有检测器共用同一张图像
+"""
+
+import time
+import logging
+import threading
+from collections import namedtuple
+
+from florr_afk_clock import SYSTEM_CLOCK
+
+logger = logging.getLogger("FlorAFK")
+
+# seq为递增序号，timestamp为截图完成时的时钟读数，image为BGR图像
+Frame = namedtuple("Frame", ["seq", "timestamp", "image"])
+
+
+class FrameProducer:
+    """共享截图生产者
+
+    在后台线程中按 interval 秒的间隔调用 capture，只保留最新一帧。
+    无论有多少检测器订阅，每个间隔都只截图一次。interval 也可以是返回间隔的函数(自适应调度)，每次截图后调用。
+    timer 为负责等待和唤醒的时钟对象，模拟运行时传入虚拟时钟(同时把 clock 设为它的 monotonic)。
+    """
+
+    def __init__(self, capture, interval=0.5, clock=time.monotonic, timer=SYSTEM_CLOCK):
+        self.capture = capture
+        self.interval = interval
+        self.clock = clock
+        self.timer = timer
+        self.capture_count = 0
+        self.last_capture_time = 0.0
+        self._frame = None
+        self._woken = False
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动截图线程，已启动时不做任何事"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.timer.register(self._thread)
+        self._thread.start()
+
+    def stop(self):
+        """停止截图线程，并唤醒所有等待新帧的订阅者"""
+        self._stop_event.set()
+        with self._cond:
+            self.timer.notify_all(self._cond)
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    @property
+    def running(self):
+        """截图线程是否在运行"""
+        return self._thread is not None and not self._stop_event.is_set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            started = self.clock()
+            try:
+                image = self.capture()
+            except Exception as e:
+                logger.error(f"截图线程出错: {e}")
+                image = None
+            finished = self.clock()
+            self.last_capture_time = finished - started
+
+            if image is not None:
+                with self._cond:
+                    seq = self._frame.seq + 1 if self._frame else 1
+                    self._frame = Frame(seq, finished, image)
+                    self.capture_count += 1
+                    self.timer.notify_all(self._cond)
+
+            interval = self.interval() if callable(self.interval) else self.interval
+            with self._cond:
+                self.timer.wait_for(self._cond, lambda: self._woken or self._stop_event.is_set(),
+                                    max(0.0, interval - (self.clock() - started)))
+                self._woken = False
+
+    def wake(self):
+        """提前结束当前的截图间隔，立即截下一帧(例如退出挂起状态时)"""
+        with self._cond:
+            self._woken = True
+            self.timer.notify_all(self._cond)
+
+    def latest(self):
+        """返回最新一帧，还没有截图时返回None"""
+        with self._cond:
+            return self._frame
+
+    def wait_for(self, after_seq=0, timeout=None):
+        """等待序号大于 after_seq 的帧，超时或停止时返回None"""
+        with self._cond:
+            self.timer.wait_for(
+                self._cond,
+                lambda: (self._frame is not None and self._frame.seq > after_seq)
+                or self._stop_event.is_set(),
+                timeout,
+            )
+            if self._frame is not None and self._frame.seq > after_seq:
+                return self._frame
+            return None
+
+    def subscribe(self):
+        """创建一个订阅，每个订阅者各自记录已经处理过的帧"""
+        return FrameSubscription(self)
+
+
+class FrameSubscription:
+    """截图订阅，next() 只返回该订阅者尚未见过的帧"""
+
+    def __init__(self, producer):
+        self.producer = producer
+        self.seq = 0
+        # 处理不过来而被跳过的帧数
+        self.skipped = 0
+
+    def next(self, timeout=None):
+        """等待下一张新帧，超时返回None"""
+        frame = self.producer.wait_for(self.seq, timeout)
+        if frame is not None:
+            if self.seq:
+                self.skipped += frame.seq - self.seq - 1
+            self.seq = frame.seq
+        return frame
+
+    def latest(self):
+        """返回最新一帧，不等待"""
+        frame = self.producer.latest()
+        if frame is not None:
+            self.seq = frame.seq
+        return frame
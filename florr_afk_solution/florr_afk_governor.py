@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Florr.io 自动AFK脚本 - CPU预算
+测量本进程(和流水线工作进程)占用的CPU时间，超出配置的份额时逐级降低截图频率、检测分辨率和流水线深度
+"""
+
+import time
+import logging
+import threading
+
+from florr_afk_logging import log_event
+
+logger = logging.getLogger("FlorAFK")
+
+
+class CpuGovernor:
+    """CPU预算调节器
+
+    每 window 秒计算一次这段时间内的CPU份额(CPU秒数 / 经过的秒数，1.0为一个核满载)，
+    超出 budget 时节流升一级，低于 budget * low 时降一级，中间不变，避免在两级之间来回切换。
+    budget 为0时不节流，仍然测量和报告份额。
+    cpu 返回累计的CPU秒数，默认只算本进程；工作进程的CPU时间通过 add_cpu() 计入。
+    """
+
+    # 每一级: (截图间隔倍数, 最小截图间隔秒数, 检测缩放倍数, 流水线深度上限(None为不限))
+    LEVELS = (
+        (1.0, 0.0, 1.0, None),
+        (1.5, 0.1, 1.0, None),
+        (2.0, 0.25, 0.75, None),
+        (3.0, 0.5, 0.5, 1),
+        (5.0, 1.0, 0.5, 1),
+        (8.0, 2.0, 0.5, 1),
+    )
+
+    def __init__(self, budget=0.0, window=5.0, low=0.7, clock=time.monotonic, cpu=time.process_time):
+        self.budget = budget
+        self.window = window
+        self.low = low
+        self.clock = clock
+        self.cpu = cpu
+        self.level = 0
+        self.share = 0.0
+        self.changes = 0
+        self._extra = 0.0
+        self._lock = threading.Lock()
+        self._since = clock()
+        self._cpu_since = self._cpu_total()
+
+    def _cpu_total(self):
+        return self.cpu() + self._extra
+
+    def add_cpu(self, seconds):
+        """计入其他进程(例如流水线工作进程)用掉的CPU秒数"""
+        with self._lock:
+            self._extra += seconds
+
+    def update(self):
+        """到了计算周期时重新计算份额并调整级别，返回级别是否变化"""
+        now = self.clock()
+        with self._lock:
+            elapsed = now - self._since
+            if elapsed < self.window:
+                return False
+            total = self._cpu_total()
+            self.share = (total - self._cpu_since) / elapsed
+            self._since, self._cpu_since = now, total
+            level = self.level
+            if self.budget and self.share > self.budget:
+                level = min(level + 1, len(self.LEVELS) - 1)
+            elif not self.budget or self.share < self.budget * self.low:
+                level = max(level - 1, 0)
+            if level == self.level:
+                return False
+            previous, self.level = self.level, level
+            self.changes += 1
+        log_event("cpu_budget", f"CPU占用 {self.share:.0%} (预算 {self.budget:.0%})，节流级别 {previous} -> {level}",
+                  logging.INFO if level > previous else logging.DEBUG,
+                  share=round(self.share, 4), budget=self.budget, throttle=level, previous=previous)
+        return True
+
+    @property
+    def interval_factor(self):
+        return self.LEVELS[self.level][0]
+
+    @property
+    def scale(self):
+        """检测分辨率的缩放倍数"""
+        return self.LEVELS[self.level][2]
+
+    @property
+    def depth(self):
+        """流水线同时求解的帧数上限，None为不限"""
+        return self.LEVELS[self.level][3]
+
+    def interval(self, base):
+        """按当前级别调整后的截图间隔"""
+        factor, minimum, _, _ = self.LEVELS[self.level]
+        return max(base * factor, minimum)
+
+    def state(self):
+        """当前状态，用于日志和指标"""
+        return {
+            "budget": self.budget,
+            "share": self.share,
+            "level": self.level,
+            "interval_factor": self.interval_factor,
+            "scale": self.scale,
+            "depth": self.depth,
+        }
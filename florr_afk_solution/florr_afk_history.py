@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Florr.io 自动AFK脚本 - 到达历史与自适应调度
+把弹窗和迷宫出现的时刻记入本地SQLite，按历史到达间隔预测下一次出现的时间窗口，
+窗口内提高截图和检测频率，窗口外降低频率
+"""
+
+import time
+import sqlite3
+import logging
+import threading
+
+from florr_afk_lazy import lazy_import
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger("FlorAFK")
+
+
+class ArrivalHistory:
+    """弹窗和迷宫的出现记录
+
+    每条记录为 (时间戳, 类型, 运行编号, 检测器)，运行编号为本次运行的开始时间戳，
+    到达间隔只在同一次运行内计算，两次运行之间的空档不会被当成一次很长的间隔。
+    """
+
+    def __init__(self, path="florr_history.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS arrivals (ts REAL NOT NULL, kind TEXT NOT NULL, "
+            "session REAL NOT NULL, detector TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS arrivals_kind_ts ON arrivals (kind, ts)")
+        self._db.commit()
+
+    def record(self, kind, timestamp, session, detector=None):
+        """记录一次出现"""
+        with self._lock:
+            self._db.execute("INSERT INTO arrivals VALUES (?, ?, ?, ?)", (timestamp, kind, session, detector))
+            self._db.commit()
+
+    def intervals(self, kind, limit=50):
+        """最近 limit 个同一次运行内的到达间隔(秒)，按时间从早到晚"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT gap FROM (SELECT ts, ts - LAG(ts) OVER (PARTITION BY session ORDER BY ts) AS gap "
+                "FROM arrivals WHERE kind = ?) WHERE gap IS NOT NULL ORDER BY ts DESC LIMIT ?",
+                (kind, limit),
+            ).fetchall()
+        return [gap for gap, in reversed(rows)]
+
+    def count(self, kind=None):
+        """记录条数"""
+        with self._lock:
+            if kind is None:
+                return self._db.execute("SELECT COUNT(*) FROM arrivals").fetchone()[0]
+            return self._db.execute("SELECT COUNT(*) FROM arrivals WHERE kind = ?", (kind,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class AdaptiveSchedule:
+    """按到达历史调整截图和检测间隔
+
+    以最近 samples 个到达间隔的 low~high 分位数作为下一次出现的预期窗口(相对上一次出现，
+    本次运行还没有出现过时相对运行开始)，提前 lead 秒进入窗口。
+    窗口内使用 fast 间隔，窗口之前使用 slow 间隔；晚于窗口或历史不足 min_samples 时使用 base 间隔。
+    同一个弹窗在被点掉之前会被连续检测到，相隔不到 merge 秒的检测只记一次。
+    """
+
+    def __init__(self, history, kind="popup", session=None, base=0.5, fast=0.2, slow=2.0,
+                 low=10, high=90, lead=30.0, min_samples=5, samples=50, merge=30.0):
+        self.history = history
+        self.kind = kind
+        self.session = time.time() if session is None else session
+        self.base = base
+        self.fast = fast
+        self.slow = slow
+        self.low = low
+        self.high = high
+        self.lead = lead
+        self.min_samples = min_samples
+        self.samples = samples
+        self.merge = merge
+        self.last_arrival = None
+        self._reference = self.session
+        self._window = None
+        self._update_window()
+
+    def _update_window(self):
+        gaps = self.history.intervals(self.kind, self.samples)
+        if len(gaps) < self.min_samples:
+            self._window = None
+            return
+        low, high = np.percentile(gaps, [self.low, self.high])
+        self._window = (max(0.0, low - self.lead), high)
+        logger.debug(f"预期{self.kind}在上次出现后 {self._window[0]:.0f}~{self._window[1]:.0f} 秒出现 "
+                     f"(基于 {len(gaps)} 个间隔)")
+
+    @property
+    def window(self):
+        """相对上一次出现的预期窗口 (开始秒数, 结束秒数)，历史不足时为None"""
+        return self._window
+
+    def observe(self, timestamp, detector=None):
+        """检测到一次出现，返回是否作为新的一次记录"""
+        if self.last_arrival is not None and timestamp - self.last_arrival < self.merge:
+            self.last_arrival = timestamp
+            return False
+        self.history.record(self.kind, timestamp, self.session, detector)
+        self.last_arrival = self._reference = timestamp
+        self._update_window()
+        return True
+
+    def state(self, now):
+        """当前所处阶段: "learning"(历史不足)、"before"(窗口之前)、"window"(窗口内)或"overdue"(晚于窗口)"""
+        if self._window is None:
+            return "learning"
+        elapsed = now - self._reference
+        if elapsed < self._window[0]:
+            return "before"
+        if elapsed <= self._window[1]:
+            return "window"
+        return "overdue"
+
+    def hot(self, now):
+        """是否处于预期窗口内"""
+        return self.state(now) == "window"
+
+    def interval(self, now):
+        """当前应使用的截图间隔"""
+        state = self.state(now)
+        if state == "window":
+            return self.fast
+        if state == "before":
+            return self.slow
+        return self.base
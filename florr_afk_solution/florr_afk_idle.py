@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Florr.io 自动AFK脚本 - 空闲检测
+用很小的缩略图判断游戏画面是否可见、是否还在变化，画面被隐藏、最小化或静止时机器人进入挂起状态
+"""
+
+import time
+import logging
+import threading
+
+from florr_afk_lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+logger = logging.getLogger("FlorAFK")
+
+# 挂起机器人的游戏状态
+IDLE_STATUSES = ("hidden", "static")
+
+
+class IdleProbe:
+    """游戏画面的可见性和活动检测
+
+    每帧缩小为 size 的灰度缩略图(INTER_AREA 取平均，缩小本身就过滤了噪点)后比较:
+    - 缩略图几乎是一种颜色(标准差低于 blank_std): "hidden"，窗口最小化、锁屏或黑屏
+    - 缩略图与参考缩略图的最大差别连续 static_seconds 秒不超过 static_diff: "static"，
+      画面被其他窗口遮挡、标签页在后台或游戏卡住
+    - 其余为 "normal"
+    画面有变化时参考缩略图换成当前帧；同一帧重复传入时直接返回上一次的结果。
+    """
+
+    def __init__(self, size=(64, 36), blank_std=4.0, static_diff=8, static_seconds=10.0, clock=time.monotonic):
+        self.size = size
+        self.blank_std = blank_std
+        self.static_diff = static_diff
+        self.static_seconds = static_seconds
+        self.clock = clock
+        self.status = "normal"
+        self._reference = None
+        self._since = None
+        self._last_frame = None
+        self._lock = threading.Lock()
+
+    def thumbnail(self, frame):
+        """灰度缩略图"""
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def check(self, frame):
+        """检测一帧，返回 "normal"、"hidden" 或 "static" """
+        if frame is None:
+            return self.status
+        with self._lock:
+            if frame is self._last_frame:
+                return self.status
+            self._last_frame = frame
+            now = self.clock()
+            thumb = self.thumbnail(frame)
+            if self._reference is None or np.abs(thumb - self._reference).max() > self.static_diff:
+                self._reference, self._since = thumb, now
+                moving = True
+            else:
+                moving = now - self._since < self.static_seconds
+            if thumb.std() < self.blank_std:
+                self.status = "hidden"
+            elif not moving:
+                self.status = "static"
+            else:
+                self.status = "normal"
+            return self.status
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Florr.io 自动AFK脚本 - 输入后端
+将鼠标和键盘事件的注入抽象为统一接口，支持批量提交和事件录制
+"""
+
+import time
+import logging
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+from florr_afk_lazy import lazy_import
+
+# 只有PyAutoGUI后端用到，录制和XTest后端不需要导入
+pyautogui = lazy_import("pyautogui")
+keyboard = lazy_import("keyboard")
+
+logger = logging.getLogger("FlorAFK")
+
+# 录制后端保存的事件: timestamp为计划执行时间(秒)，kind为事件类型，args为参数
+RecordedEvent = namedtuple("RecordedEvent", ["timestamp", "kind", "args"])
+
+
+class InputBackend:
+    """输入后端基类
+
+    每个事件以 (kind, args, delay) 的形式进入队列，delay 为执行该事件前的等待时间(秒)。
+    在 batch() 中产生的事件会在退出时一次性提交，否则每个事件立即提交。
+    set_origin() 之后 move_to() 和 position() 的坐标都相对于原点，例如只截取游戏区域时的区域左上角。
+    """
+
+    name = "base"
+
+    def __init__(self):
+        # 队列按线程隔离，移动路线和鼠标拖动可以在不同线程中同时注入
+        self._local = threading.local()
+        self._observers = []
+        self.origin = (0, 0)
+
+    def _state(self):
+        state = self._local
+        if not hasattr(state, "pending"):
+            state.pending = []
+            state.depth = 0
+        return state
+
+    def _queue(self, kind, args, delay=0.0):
+        state = self._state()
+        state.pending.append((kind, args, max(0.0, delay)))
+        if state.depth == 0:
+            self.flush()
+
+    @contextmanager
+    def batch(self):
+        """批量提交区域，退出时统一flush"""
+        state = self._state()
+        state.depth += 1
+        try:
+            yield self
+        finally:
+            state.depth -= 1
+            if state.depth == 0:
+                self.flush()
+
+    def add_observer(self, observer):
+        """注册观察者，每批事件提交前以事件列表调用，例如录制会话"""
+        self._observers.append(observer)
+
+    def flush(self):
+        """提交当前线程队列中的所有事件"""
+        state = self._state()
+        if not state.pending:
+            return
+        events, state.pending = state.pending, []
+        for observer in self._observers:
+            observer(events)
+        self._send(events)
+
+    def _send(self, events):
+        """执行一批事件，由子类实现"""
+        raise NotImplementedError
+
+    def set_origin(self, x, y):
+        """设置坐标原点(屏幕坐标)"""
+        self.origin = (x, y)
+
+    def move_to(self, x, y, duration=0.0, delay=0.0):
+        """移动鼠标到 (x, y)，duration 为移动耗时"""
+        self._queue("move", (x + self.origin[0], y + self.origin[1], duration), delay)
+
+    def mouse_down(self, button='left', delay=0.0):
+        """按下鼠标按键"""
+        self._queue("mouse_down", (button,), delay)
+
+    def mouse_up(self, button='left', delay=0.0):
+        """释放鼠标按键"""
+        self._queue("mouse_up", (button,), delay)
+
+    def key_down(self, key, delay=0.0):
+        """按下键盘按键"""
+        self._queue("key_down", (key,), delay)
+
+    def key_up(self, key, delay=0.0):
+        """释放键盘按键"""
+        self._queue("key_up", (key,), delay)
+
+    def click(self, x=None, y=None, button='left'):
+        """在当前位置或指定位置点击一次"""
+        with self.batch():
+            if x is not None and y is not None:
+                self.move_to(x, y)
+            self.mouse_down(button)
+            self.mouse_up(button)
+
+    def position(self):
+        """返回当前鼠标位置(相对于原点)"""
+        x, y = self._position()
+        return x - self.origin[0], y - self.origin[1]
+
+    def _position(self):
+        """返回鼠标的屏幕坐标，由子类实现"""
+        raise NotImplementedError
+
+    def size(self):
+        """返回屏幕尺寸 (宽, 高)"""
+        raise NotImplementedError
+
+
+class PyAutoGUIBackend(InputBackend):
+    """基于PyAutoGUI的后端，逐个调用，兼容所有平台"""
+
+    name = "pyautogui"
+
+    # 时序完全由事件的delay控制，发送事件期间去掉PyAutoGUI每次调用后的固定停顿，
+    # 以及把很短的移动变成瞬移、把很短的等待跳过的下限。发送结束后恢复原值，
+    # 直接调用PyAutoGUI的其他代码仍按它自己的设置执行
+    TUNING = {"PAUSE": 0, "MINIMUM_DURATION": 0, "MINIMUM_SLEEP": 0}
+    # 多个线程同时发送时，第一个开始的线程保存原值，最后一个结束的线程恢复
+    _tuning_lock = threading.Lock()
+    _tuning_depth = 0
+    _saved_tuning = None
+
+    def __init__(self, keys="keyboard"):
+        super().__init__()
+        # keys: "keyboard" 使用keyboard库按键，"pyautogui" 使用pyautogui按键
+        self.keys = keys
+
+    @classmethod
+    @contextmanager
+    def _tuned(cls):
+        """在此期间使用 TUNING 中的PyAutoGUI设置"""
+        with cls._tuning_lock:
+            if cls._tuning_depth == 0:
+                cls._saved_tuning = {name: getattr(pyautogui, name) for name in cls.TUNING}
+                for name, value in cls.TUNING.items():
+                    setattr(pyautogui, name, value)
+            cls._tuning_depth += 1
+        try:
+            yield
+        finally:
+            with cls._tuning_lock:
+                cls._tuning_depth -= 1
+                if cls._tuning_depth == 0:
+                    for name, value in cls._saved_tuning.items():
+                        setattr(pyautogui, name, value)
+
+    def _send(self, events):
+        with self._tuned():
+            self._send_tuned(events)
+
+    def _send_tuned(self, events):
+        for kind, args, delay in events:
+            if delay > 0:
+                time.sleep(delay)
+
+            if kind == "move":
+                x, y, duration = args
+                pyautogui.moveTo(x, y, duration=duration)
+            elif kind == "mouse_down":
+                pyautogui.mouseDown(button=args[0])
+            elif kind == "mouse_up":
+                pyautogui.mouseUp(button=args[0])
+            elif kind == "key_down":
+                if self.keys == "pyautogui":
+                    pyautogui.keyDown(args[0])
+                else:
+                    keyboard.press(args[0])
+            elif kind == "key_up":
+                if self.keys == "pyautogui":
+                    pyautogui.keyUp(args[0])
+                else:
+                    keyboard.release(args[0])
+
+    def _position(self):
+        x, y = pyautogui.position()
+        return x, y
+
+    def size(self):
+        width, height = pyautogui.size()
+        return width, height
+
+
+class XTestBackend(InputBackend):
+    """基于X11 XTest扩展的后端
+
+    一批事件在同一个连接上排队，事件之间的等待由X服务器执行，整批只需一次同步。
+    每个线程使用独立的X连接，避免不同线程的事件相互阻塞。
+    """
+
+    name = "xtest"
+
+    BUTTONS = {"left": 1, "middle": 2, "right": 3}
+
+    # keyboard库按键名到X keysym的映射
+    KEYSYMS = {
+        "esc": "Escape",
+        "enter": "Return",
+        "space": "space",
+        "tab": "Tab",
+        "shift": "Shift_L",
+        "ctrl": "Control_L",
+        "alt": "Alt_L",
+        "backspace": "BackSpace",
+        "up": "Up",
+        "down": "Down",
+        "left": "Left",
+        "right": "Right",
+    }
+
+    # 带duration的移动按此频率插值
+    MOVE_RATE = 120
+
+    def __init__(self, display=None):
+        super().__init__()
+        from Xlib import X, XK
+        from Xlib import display as xdisplay
+
+        self._X = X
+        self._XK = XK
+        self._xdisplay = xdisplay
+        self.display_name = display
+        self._connections = threading.local()
+        self._keycodes = {}
+        self._pos_lock = threading.Lock()
+        # 连接失败时在构造阶段就抛出，方便create_backend回退
+        root = self._display().screen().root
+        pointer = root.query_pointer()
+        self._pos = (pointer.root_x, pointer.root_y)
+
+    def _display(self):
+        display = getattr(self._connections, "display", None)
+        if display is None:
+            display = self._xdisplay.Display(self.display_name)
+            self._connections.display = display
+        return display
+
+    def _keycode(self, display, key):
+        if key not in self._keycodes:
+            keysym = self._XK.string_to_keysym(self.KEYSYMS.get(key, key))
+            keycode = display.keysym_to_keycode(keysym)
+            if not keycode:
+                raise ValueError(f"无法映射按键: {key}")
+            self._keycodes[key] = keycode
+        return self._keycodes[key]
+
+    def _send(self, events):
+        X = self._X
+        display = self._display()
+
+        for kind, args, delay in events:
+            # XTest的time字段为执行前的延迟(毫秒)
+            delay_ms = int(delay * 1000)
+
+            if kind == "move":
+                x, y, duration = args
+                with self._pos_lock:
+                    from_x, from_y = self._pos
+                    self._pos = (int(x), int(y))
+                steps = max(1, int(duration * self.MOVE_RATE))
+                step_ms = int(duration * 1000 / steps)
+                for i in range(1, steps + 1):
+                    px = int(from_x + (x - from_x) * i / steps)
+                    py = int(from_y + (y - from_y) * i / steps)
+                    step_delay = step_ms + (delay_ms if i == 1 else 0)
+                    display.xtest_fake_input(X.MotionNotify, x=px, y=py, time=step_delay)
+            elif kind in ("mouse_down", "mouse_up"):
+                event_type = X.ButtonPress if kind == "mouse_down" else X.ButtonRelease
+                display.xtest_fake_input(event_type, self.BUTTONS.get(args[0], 1), time=delay_ms)
+            elif kind in ("key_down", "key_up"):
+                event_type = X.KeyPress if kind == "key_down" else X.KeyRelease
+                display.xtest_fake_input(event_type, self._keycode(display, args[0]), time=delay_ms)
+
+        display.sync()
+
+    def _position(self):
+        self.flush()
+        pointer = self._display().screen().root.query_pointer()
+        with self._pos_lock:
+            self._pos = (pointer.root_x, pointer.root_y)
+        return self._pos
+
+    def size(self):
+        screen = self._display().screen()
+        return screen.width_in_pixels, screen.height_in_pixels
+
+
+class RecordingBackend(InputBackend):
+    """录制后端
+
+    不注入任何真实事件，只记录带时间戳的事件并维护鼠标位置和按键状态，
+    用于测试、基准和无界面运行。默认事件的delay只推进计划时间，不会真的等待；
+    realtime为True时像真实后端一样通过 sleep 等待delay和移动耗时，时间戳为 clock 的读数，
+    用于端到端基准；模拟运行时 clock 和 sleep 来自虚拟时钟。
+    """
+
+    name = "recording"
+
+    def __init__(self, size=(1920, 1080), clock=time.monotonic, realtime=False, sleep=time.sleep):
+        super().__init__()
+        self.events = []
+        self.pressed_keys = set()
+        self.pressed_buttons = set()
+        self.realtime = realtime
+        self._size = tuple(size)
+        self._pos = (self._size[0] // 2, self._size[1] // 2)
+        self._clock = clock
+        self._sleep = sleep
+        self._timeline = 0.0
+        self._lock = threading.Lock()
+
+    def _apply(self, kind, args):
+        if kind == "move":
+            self._pos = (args[0], args[1])
+        elif kind == "mouse_down":
+            self.pressed_buttons.add(args[0])
+        elif kind == "mouse_up":
+            self.pressed_buttons.discard(args[0])
+        elif kind == "key_down":
+            self.pressed_keys.add(args[0])
+        elif kind == "key_up":
+            self.pressed_keys.discard(args[0])
+
+    def _send(self, events):
+        if self.realtime:
+            # 各线程各自等待，和真实后端一样互不阻塞
+            for kind, args, delay in events:
+                if delay > 0:
+                    self._sleep(delay)
+                with self._lock:
+                    self._apply(kind, args)
+                    self.events.append(RecordedEvent(self._clock(), kind, args))
+                if kind == "move" and args[2] > 0:
+                    self._sleep(args[2])
+            return
+
+        with self._lock:
+            timestamp = max(self._clock(), self._timeline)
+            for kind, args, delay in events:
+                timestamp += delay
+                self._apply(kind, args)
+                if kind == "move":
+                    timestamp += args[2]
+                self.events.append(RecordedEvent(timestamp, kind, args))
+            self._timeline = timestamp
+
+    def _position(self):
+        return self._pos
+
+    def size(self):
+        return self._size
+
+    def clear(self):
+        """清空已录制的事件"""
+        with self._lock:
+            self.events = []
+
+
+BACKENDS = {
+    "pyautogui": PyAutoGUIBackend,
+    "xtest": XTestBackend,
+    "recording": RecordingBackend,
+}
+
+
+def create_backend(name="pyautogui", **kwargs):
+    """按名称创建输入后端，创建失败时回退到PyAutoGUI后端"""
+    # keys 只对PyAutoGUI后端有意义
+    keys = kwargs.pop("keys", "keyboard")
+
+    backend_class = BACKENDS.get(name)
+    if backend_class is None:
+        logger.warning(f"未知输入后端 '{name}'，使用pyautogui")
+        backend_class = PyAutoGUIBackend
+
+    if backend_class is PyAutoGUIBackend:
+        return PyAutoGUIBackend(keys=keys)
+
+    try:
+        return backend_class(**kwargs)
+    except Exception as e:
+        logger.warning(f"输入后端 {name} 不可用 ({e})，使用pyautogui")
+        return PyAutoGUIBackend(keys=keys)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Florr.io 自动AFK脚本 - 延迟导入
+numpy、OpenCV和输入库在第一次使用时才真正导入，--help 和用不到它们的功能不必承担导入时间
+"""
+
+import sys
+import types
+import importlib
+
+
+class LazyModule(types.ModuleType):
+    """模块代理，第一次读写属性时导入真正的模块，之后的读写都转发给它
+
+    设置和删除属性(例如 pyautogui.PAUSE = 0 或测试中的 patch)直接作用在真正的模块上，
+    代理和直接导入的模块看到的始终是同一份属性。
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        object.__setattr__(self, "_module", None)
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            # import_module 有模块级别的导入锁，多个线程同时第一次使用时也只导入一次
+            module = importlib.import_module(self.__name__)
+            object.__setattr__(self, "_module", module)
+        return module
+
+    @property
+    def loaded(self):
+        """真正的模块是否已经导入"""
+        return self._module is not None
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self._load(), name)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        return f"<lazy module '{self.__name__}'{' (loaded)' if self.loaded else ''}>"
+
+
+def lazy_import(name):
+    """返回模块 name 的代理，已经导入过的模块直接返回"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Florr.io 自动AFK脚本 - 异步日志
+记录日志只把记录放入队列，写文件和终端由后台线程完成；事件可另外输出为JSON行，调试日志按调用位置限速
+"""
+
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+logger = logging.getLogger("FlorAFK")
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class RateLimitFilter(logging.Filter):
+    """按调用位置限制调试日志的频率
+
+    每个调用位置每秒最多 rate 条，允许 burst 条突发；被省略的条数附在该位置下一条放行的日志后面。
+    只限制 level 及以下级别的日志。
+    """
+
+    def __init__(self, rate=5.0, burst=None, level=logging.DEBUG, clock=time.monotonic):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.level = level
+        self.clock = clock
+        # (文件, 行号) -> [令牌数, 上次时间, 已省略条数]
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > self.level or not self.rate:
+            return True
+        key = (record.pathname, record.lineno)
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.msg = f"{record.getMessage()} (此前省略 {suppressed} 条)"
+            record.args = None
+        return True
+
+
+class EventFilter(logging.Filter):
+    """只放行通过 log_event() 记录的事件"""
+
+    def filter(self, record):
+        return hasattr(record, "event")
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """把事件格式化为一行紧凑的JSON"""
+
+    def format(self, record):
+        data = {"ts": round(record.created, 3), "level": record.levelname, "event": record.event}
+        data.update(getattr(record, "fields", {}))
+        data["message"] = record.getMessage()
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def log_event(event, message, level=logging.INFO, **fields):
+    """记录一个事件，普通日志照常输出，配置了JSON行输出时另外写一行JSON"""
+    logger.log(level, message, extra={"event": event, "fields": fields}, stacklevel=2)
+
+
+_queue_handler = None
+_listener = None
+_settings = None
+_atexit_registered = False
+
+
+def setup_logging(log_file="florr_afk.log", json_file=None, level=logging.INFO, debug_rate=5.0, stream=True):
+    """把根日志记录器改为经由队列输出，返回后台的 QueueListener
+
+    可以重复调用来修改输出位置，参数没有变化时不做任何事；
+    修改时旧的后台线程先写完已排队的日志再退出。
+    """
+    global _queue_handler, _listener, _settings, _atexit_registered
+    settings = (log_file, json_file, level, debug_rate, stream)
+    if _listener is not None and settings == _settings:
+        return _listener
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    if stream:
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    if json_file:
+        handler = logging.FileHandler(json_file, encoding="utf-8")
+        handler.setFormatter(JSONLinesFormatter())
+        handler.addFilter(EventFilter())
+        handlers.append(handler)
+
+    # 先挂上新的队列再撤下旧的，切换期间的日志不会丢失
+    previous = (_queue_handler, _listener)
+    root = logging.getLogger()
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    _queue_handler = QueueHandler(log_queue)
+    if debug_rate:
+        _queue_handler.addFilter(RateLimitFilter(debug_rate))
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    _settings = settings
+    _stop(*previous)
+
+    if not _atexit_registered:
+        atexit.register(shutdown_logging)
+        _atexit_registered = True
+    return _listener
+
+
+def _stop(queue_handler, listener):
+    if queue_handler is not None:
+        logging.getLogger().removeHandler(queue_handler)
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def shutdown_logging():
+    """写完队列中的日志，停止后台线程并关闭文件"""
+    global _queue_handler, _listener, _settings
+    _stop(_queue_handler, _listener)
+    _queue_handler = _listener = _settings = None
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Florr.io 自动AFK脚本 - 运行指标
+计数器、仪表和延迟直方图，可以通过本地HTTP接口实时查看
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+from florr_afk_timing import LatencyHistogram
+
+logger = logging.getLogger("FlorAFK")
+
+# 指标名前缀
+PREFIX = "florr_afk"
+
+
+def memory_bytes():
+    """当前进程的常驻内存(字节)，无法获取时返回None"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # Linux返回KB，macOS返回字节；这里是峰值而不是当前值
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+class Metrics:
+    """运行指标
+
+    计数器只增不减，导出时附带最近 rate_window 秒内的每秒速率；
+    仪表可以直接设置，也可以注册为函数在读取时求值；直方图用于延迟分布。
+    """
+
+    def __init__(self, rate_window=30.0, clock=time.monotonic):
+        self.rate_window = rate_window
+        self.clock = clock
+        self.started = clock()
+        self.counters = {}
+        self.counter_funcs = {}
+        self.gauges = {}
+        self.gauge_funcs = {}
+        self.histograms = {}
+        self._history = deque()
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1):
+        """计数器加 value"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name, value):
+        """设置仪表值"""
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name, seconds):
+        """记录一次延迟(秒)"""
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def counter_func(self, name, func):
+        """注册由函数提供当前值的计数器，例如截图线程的截图次数"""
+        self.counter_funcs[name] = func
+
+    def gauge_func(self, name, func):
+        """注册在读取时求值的仪表"""
+        self.gauge_funcs[name] = func
+
+    def _counter_values(self):
+        values = dict(self.counters)
+        for name, func in list(self.counter_funcs.items()):
+            try:
+                values[name] = func()
+            except Exception as e:
+                logger.debug(f"读取指标 {name} 失败: {e}")
+        return values
+
+    def snapshot(self):
+        """当前所有指标的值"""
+        now = self.clock()
+        with self._lock:
+            counters = self._counter_values()
+            gauges = dict(self.gauges)
+            histograms = {name: histogram.summary() for name, histogram in self.histograms.items()}
+
+            # 速率按窗口内最早的一次读取计算，窗口内没有历史时按启动以来计算
+            self._history.append((now, counters))
+            while len(self._history) > 1 and now - self._history[0][0] > self.rate_window:
+                self._history.popleft()
+            since, old = self._history[0]
+            if since == now:
+                since, old = self.started, {}
+
+        for name, func in list(self.gauge_funcs.items()):
+            try:
+                gauges[name] = func()
+            except Exception as e:
+                logger.debug(f"读取指标 {name} 失败: {e}")
+        gauges["uptime_seconds"] = now - self.started
+        gauges["memory_bytes"] = memory_bytes()
+
+        elapsed = now - since
+        rates = {
+            name: (value - old.get(name, 0)) / elapsed if elapsed > 0 else 0.0
+            for name, value in counters.items()
+        }
+        return {"counters": counters, "rates": rates, "gauges": gauges, "histograms": histograms}
+
+    def to_prometheus(self, snapshot=None):
+        """Prometheus文本格式"""
+        snapshot = snapshot or self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+            lines.append(f"{PREFIX}_{name}_total {value}")
+            lines.append(f"# TYPE {PREFIX}_{name}_per_second gauge")
+            lines.append(f"{PREFIX}_{name}_per_second {snapshot['rates'][name]:.6g}")
+        for name, value in sorted(snapshot["gauges"].items()):
+            if value is None:
+                continue
+            lines.append(f"# TYPE {PREFIX}_{name} gauge")
+            lines.append(f"{PREFIX}_{name} {value:.6g}" if isinstance(value, float) else f"{PREFIX}_{name} {value}")
+        for name, summary in sorted(snapshot["histograms"].items()):
+            metric = f"{PREFIX}_{name}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for quantile in ("50", "95", "99"):
+                lines.append(f'{metric}{{quantile="0.{quantile}"}} {summary[f"p{quantile}_ms"] / 1000:.6g}')
+            lines.append(f"{metric}_count {summary['count']}")
+            lines.append(f"{metric}_sum {summary['mean_ms'] * summary['count'] / 1000:.6g}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """在后台线程中提供指标的本地HTTP接口
+
+    GET /metrics 返回Prometheus文本格式，GET /metrics.json 返回JSON。
+    默认只监听127.0.0.1。
+    """
+
+    def __init__(self, metrics, host="127.0.0.1", port=9108):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """启动HTTP服务，返回实际监听的端口(port为0时由系统分配)"""
+        # 只有配置了端口才需要HTTP服务，不在启动时导入
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = metrics.to_prometheus().encode()
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(metrics.snapshot()).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("指标接口: " + format % args)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"指标接口已启动: http://{self.host}:{self.port}/metrics")
+        return self.port
+
+    def stop(self):
+        """停止HTTP服务"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
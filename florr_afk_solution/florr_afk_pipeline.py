@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Florr.io 自动AFK脚本 - 截图/求解/执行流水线
+截图写入共享内存双缓冲，进程池求解第N帧的同时截取第N+1帧，并回放第N-1帧的操作
+"""
+
+import time
+import queue
+import logging
+import threading
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+logger = logging.getLogger("FlorAFK")
+
+
+class SharedFrameRing:
+    """共享内存帧缓冲
+
+    每个槽位是一块共享内存，工作进程按名称映射，帧数据不需要序列化传输。
+    正在被求解的槽位不会被覆盖，没有空闲槽位时 acquire() 返回None。
+    """
+
+    def __init__(self, shape, dtype=np.uint8, slots=2):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        size = int(np.prod(self.shape)) * self.dtype.itemsize
+        self.blocks = [shared_memory.SharedMemory(create=True, size=size) for _ in range(slots)]
+        self.arrays = [np.ndarray(self.shape, self.dtype, buffer=block.buf) for block in self.blocks]
+        self._free = list(range(slots))
+        self._lock = threading.Lock()
+
+    @property
+    def in_use(self):
+        """正在使用的槽位数"""
+        with self._lock:
+            return len(self.blocks) - len(self._free)
+
+    def acquire(self):
+        """取一个空闲槽位"""
+        with self._lock:
+            return self._free.pop(0) if self._free else None
+
+    def release(self, slot):
+        """归还槽位"""
+        with self._lock:
+            self._free.append(slot)
+
+    def spec(self, slot):
+        """工作进程映射槽位所需的信息"""
+        return (self.blocks[slot].name, self.shape, self.dtype.str)
+
+    def close(self):
+        """释放所有共享内存"""
+        self.arrays = []
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+def solve_shared(solve, spec):
+    """在工作进程中映射共享内存帧并求解，返回 (结果, 耗时, 工作进程用掉的CPU秒数)
+
+    solve 必须是可以被pickle的模块级函数，结果中不能引用帧内存。
+    """
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        frame = np.ndarray(shape, dtype, buffer=block.buf)
+        start, cpu = time.perf_counter(), time.process_time()
+        result = solve(frame)
+        elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu
+        del frame
+        return result, elapsed, cpu
+    finally:
+        block.close()
+
+
+class StageStats:
+    """流水线某一级的统计"""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.busy = 0.0
+        self.dropped = 0
+
+    def add(self, seconds):
+        self.count += 1
+        self.busy += seconds
+
+    def summary(self, wall):
+        """返回处理数、丢弃数、吞吐量(per_sec)、平均耗时和忙碌时间占比
+
+        多个工作进程时忙碌时间占比可以超过100%。
+        """
+        return {
+            "count": self.count,
+            "dropped": self.dropped,
+            "per_sec": self.count / wall if wall > 0 else 0.0,
+            "mean_ms": self.busy / self.count * 1000 if self.count else 0.0,
+            "utilization": self.busy / wall if wall > 0 else 0.0,
+        }
+
+
+class FramePipeline:
+    """截图 -> 求解 -> 执行 三级流水线
+
+    capture() 返回一帧(numpy数组)或None；solve(frame) 在进程池中运行，未命中返回None；
+    act(result) 在执行线程中运行，例如拖动鼠标。
+
+    丢弃过期帧的规则：
+    1. 同时在途的帧不超过工作进程数加一(每个工作进程求解一帧，再加上正在截取的一帧)，
+       达到上限时截图等待。截完时工作进程仍在忙的帧最多在它后面等待一次求解，等太久的由规则4丢弃
+    2. 截图早于上一次操作结束的结果被丢弃，因为操作已经改变了画面
+    3. 比已执行的结果更旧的结果被丢弃(工作进程多于一个时结果可能乱序)
+    4. 截图距今超过 max_age 秒的结果被丢弃
+
+    传入 governor(CpuGovernor)时，工作进程的CPU时间计入预算，截图间隔和同时求解的帧数按节流级别调整。
+    """
+
+    STAGES = ("capture", "solve", "act")
+
+    def __init__(self, capture, solve, act, workers=1, slots=None, max_age=2.0,
+                 interval=0.0, clock=time.monotonic, executor=None, governor=None):
+        self.capture = capture
+        self.solve = solve
+        self.act = act
+        self.workers = workers
+        self.slots = slots if slots is not None else workers + 1
+        self.max_age = max_age
+        self.interval = interval
+        self.clock = clock
+        self.governor = governor
+        self.stats = {name: StageStats(name) for name in self.STAGES}
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._ring = None
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._results = queue.Queue()
+        self._error = None
+        self._last_action_end = float("-inf")
+        self._last_acted_seq = 0
+        self._started = None
+
+    def run(self, should_stop=lambda: False):
+        """运行流水线，直到 should_stop() 为True或某一级出错"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._started = self.clock()
+        act_thread = threading.Thread(target=self._act_loop, daemon=True)
+        act_thread.start()
+        try:
+            while not should_stop() and self._error is None:
+                started = self.clock()
+                self._capture_once()
+                interval = self.interval
+                if self.governor is not None:
+                    self.governor.update()
+                    interval = self.governor.interval(interval)
+                wait = interval - (self.clock() - started)
+                if wait > 0:
+                    time.sleep(wait)
+        finally:
+            self._drain()
+            self._results.put(None)
+            act_thread.join()
+            if self._owns_executor:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+            if self._ring is not None:
+                self._ring.close()
+                self._ring = None
+        if self._error is not None:
+            raise self._error
+
+    def _depth(self):
+        """同时在途的帧数上限"""
+        limit = min(self.slots, self.workers + 1)
+        depth = self.governor.depth if self.governor is not None else None
+        return limit if depth is None else min(depth, limit)
+
+    def _capture_once(self):
+        # 规则1: 等待空闲槽位再截图
+        depth = self._depth()
+        with self._cond:
+            self._cond.wait_for(lambda: self._ring is None or self._ring.in_use < depth
+                                or self._error is not None, timeout=1.0)
+            if self._ring is not None and self._ring.in_use >= depth:
+                return
+
+        start = self.clock()
+        image = self.capture()
+        captured_at = self.clock()
+        if image is None:
+            return
+        self.stats["capture"].add(captured_at - start)
+
+        with self._cond:
+            if self._ring is None or self._ring.shape != image.shape or self._ring.dtype != image.dtype:
+                if self._ring is not None:
+                    if self._ring.in_use:
+                        # 分辨率变了，等旧的帧求解完再重建缓冲
+                        self.stats["capture"].dropped += 1
+                        return
+                    self._ring.close()
+                self._ring = SharedFrameRing(image.shape, image.dtype, self.slots)
+            slot = self._ring.acquire()
+            if slot is None:
+                self.stats["capture"].dropped += 1
+                return
+            self._seq += 1
+            seq = self._seq
+
+        self._ring.arrays[slot][...] = image
+        future = self._executor.submit(solve_shared, self.solve, self._ring.spec(slot))
+        future.add_done_callback(lambda f: self._on_solved(f, seq, slot, captured_at))
+
+    def _on_solved(self, future, seq, slot, captured_at):
+        # 先交出结果再归还槽位，_drain() 返回时所有结果都已进入执行队列
+        if not future.cancelled():
+            error = future.exception()
+            if error is not None:
+                self._results.put((seq, captured_at, None, error))
+            else:
+                result, elapsed, cpu = future.result()
+                self.stats["solve"].add(elapsed)
+                if self.governor is not None:
+                    self.governor.add_cpu(cpu)
+                self._results.put((seq, captured_at, result, None))
+        with self._cond:
+            if self._ring is not None:
+                self._ring.release(slot)
+            self._cond.notify_all()
+
+    def _drain(self):
+        """等待所有正在求解的帧"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._ring is None or self._ring.in_use == 0, timeout=30.0)
+
+    def _act_loop(self):
+        while True:
+            item = self._results.get()
+            if item is None:
+                return
+            seq, captured_at, result, error = item
+            if error is not None:
+                self._error = self._error or error
+                with self._cond:
+                    self._cond.notify_all()
+                continue
+            if result is None or self._error is not None:
+                continue
+
+            # 规则2-4
+            if (captured_at < self._last_action_end or seq < self._last_acted_seq
+                    or self.clock() - captured_at > self.max_age):
+                self.stats["act"].dropped += 1
+                continue
+
+            start = self.clock()
+            try:
+                self.act(result)
+            except Exception as e:
+                self._error = e
+                with self._cond:
+                    self._cond.notify_all()
+            self._last_action_end = self.clock()
+            self._last_acted_seq = seq
+            self.stats["act"].add(self._last_action_end - start)
+
+    def report(self):
+        """各级的吞吐量统计"""
+        wall = self.clock() - self._started if self._started is not None else 0.0
+        return {name: stats.summary(wall) for name, stats in self.stats.items()}
+
+    def format_report(self):
+        """可打印的统计报告"""
+        lines = []
+        for name, summary in self.report().items():
+            lines.append(f"{name}: {summary['count']} ({summary['per_sec']:.2f}/s), "
+                         f"mean {summary['mean_ms']:.1f}ms, busy {summary['utilization']:.0%}, "
+                         f"dropped {summary['dropped']}")
+        return "\n".join(lines)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Florr.io 自动AFK脚本 - 按需性能分析
+运行中按热键或发送信号，对接下来N次循环做性能分析并写入带时间戳的文件，之后恢复正常速度
+"""
+
+import os
+import sys
+import time
+import signal
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger("FlorAFK")
+
+# 触发分析的信号: Unix下为SIGUSR1 (kill -USR1 <pid>)，Windows下为SIGBREAK (Ctrl+Break)
+PROFILE_SIGNAL = getattr(signal, "SIGUSR1", None) or getattr(signal, "SIGBREAK", None)
+
+
+class StackSampler:
+    """采样分析器
+
+    后台线程每隔 interval 秒读取一次所有线程的调用栈，按调用栈计数，
+    输出为火焰图工具(flamegraph.pl、speedscope)可以直接读取的折叠格式。
+    被分析的线程本身不受影响，开销只取决于采样频率。
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="FlorAFKSampler")
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class ProfileTrigger:
+    """按需性能分析
+
+    request() 可以在信号处理函数或热键回调中调用，只设置标志；
+    循环每次迭代开始时调用 tick()，由它开始和结束分析。未触发时 tick() 只做一次属性检查。
+
+    mode 为 cprofile 时用 cProfile 分析调用 tick() 的线程，写入 .prof (可用 snakeviz 等查看) 和 .txt 摘要；
+    cProfile 只能分析开启它的线程，截图、检测线程池和 asyncio 的执行器线程同时按 sample 方式采样，
+    写入同名的 .folded 文件。mode 为 sample 时只对所有线程采样，写入 .folded 折叠调用栈。
+    文件名带毫秒时间戳，同名文件已存在时再加序号，不会覆盖之前的结果。
+    """
+
+    MODES = ("cprofile", "sample")
+
+    def __init__(self, iterations=50, mode="cprofile", directory=".", prefix="florr_afk_profile",
+                 sample_interval=0.005):
+        if mode not in self.MODES:
+            raise ValueError(f"未知的分析模式: {mode}")
+        self.iterations = iterations
+        self.mode = mode
+        self.directory = directory
+        self.prefix = prefix
+        self.sample_interval = sample_interval
+        self.last_output = None
+        self._requested = None
+        self._profiler = None
+        self._sampler = None
+        self._active_mode = None
+        self._remaining = 0
+        self._started = None
+
+    @property
+    def active(self):
+        """是否正在分析"""
+        return self._active_mode is not None
+
+    def request(self, iterations=None, mode=None):
+        """请求分析接下来的 iterations 次迭代，正在分析时忽略"""
+        if self._active_mode is None:
+            self._requested = (iterations or self.iterations, mode or self.mode)
+
+    def install_signal(self, signum=PROFILE_SIGNAL):
+        """收到信号时触发分析，只能在主线程调用，返回是否安装成功"""
+        if signum is None:
+            return False
+        try:
+            signal.signal(signum, lambda *args: self.request())
+        except (ValueError, OSError) as e:
+            logger.warning(f"无法安装性能分析信号: {e}")
+            return False
+        return True
+
+    def install_hotkey(self, hotkey="ctrl+alt+p"):
+        """按下热键时触发分析，返回是否安装成功"""
+        try:
+            import keyboard
+            keyboard.add_hotkey(hotkey, self.request)
+        except Exception as e:
+            logger.warning(f"无法注册性能分析热键 {hotkey}: {e}")
+            return False
+        return True
+
+    def tick(self):
+        """每次循环迭代开始时调用"""
+        if self._active_mode is not None:
+            self._remaining -= 1
+            if self._remaining <= 0:
+                self._finish()
+        elif self._requested is not None:
+            self._begin()
+
+    def _begin(self):
+        iterations, mode = self._requested
+        self._requested = None
+        self._remaining = iterations
+        self._active_mode = mode
+        self._started = time.perf_counter()
+        self._sampler = StackSampler(self.sample_interval)
+        self._sampler.start()
+        if mode == "cprofile":
+            # 分析器只在触发时导入
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        logger.info(f"开始性能分析({mode})，共 {iterations} 次迭代")
+
+    def _output_base(self):
+        """带毫秒时间戳的输出文件名(不含扩展名)，同一毫秒内多次分析时加序号"""
+        now = time.time()
+        stamp = f"{time.strftime('%Y%m%d_%H%M%S', time.localtime(now))}_{int(now * 1000) % 1000:03d}"
+        base = os.path.join(self.directory, f"{self.prefix}_{stamp}")
+        candidate, number = base, 1
+        while any(os.path.exists(candidate + ext) for ext in (".prof", ".txt", ".folded")):
+            candidate = f"{base}_{number}"
+            number += 1
+        return candidate
+
+    def _finish(self):
+        profiler, sampler, mode = self._profiler, self._sampler, self._active_mode
+        elapsed = time.perf_counter() - self._started
+        if profiler is not None:
+            profiler.disable()
+        sampler.stop()
+        self._profiler = None
+        self._sampler = None
+        self._active_mode = None
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            base = self._output_base()
+            if mode == "cprofile":
+                output = base + ".prof"
+                profiler.dump_stats(output)
+                import pstats
+                with open(base + ".txt", "w") as f:
+                    stats = pstats.Stats(profiler, stream=f)
+                    stats.sort_stats("cumulative").print_stats(40)
+            else:
+                output = base + ".folded"
+            sampler.write(base + ".folded")
+        except OSError as e:
+            logger.error(f"写入性能分析结果失败: {e}")
+            return
+        self.last_output = output
+        logger.info(f"性能分析完成，耗时 {elapsed:.2f}秒，结果已写入 {output}")
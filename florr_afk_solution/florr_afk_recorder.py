@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Florr.io 自动AFK脚本 - 调试截图记录
+按采样率保存调试截图，编码和写盘在后台线程进行，目录总大小超过预算时从最旧的文件开始删除
+"""
+
+import os
+import time
+import queue
+import random
+import logging
+import threading
+from collections import deque
+
+from florr_afk_lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+logger = logging.getLogger("FlorAFK")
+
+
+class DebugRecorder:
+    """调试截图记录器
+
+    record() 只决定是否保存并把帧放入队列，不复制也不编码，调用方之后不能再修改这一帧；
+    队列满时丢弃新帧而不是阻塞调用方。
+    npy 为原始数组，写入最快、可以直接 np.load 复现；png 使用低压缩级别，体积更小。
+    """
+
+    FORMATS = ("png", "npy")
+
+    def __init__(self, directory="debug_frames", sample_rate=0.05, budget_mb=200, fmt="png",
+                 png_compression=1, max_queue=8):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"未知的调试截图格式: {fmt}")
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.fmt = fmt
+        self.png_compression = png_compression
+        self.saved = 0
+        self.dropped = 0
+        self.evicted = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._files = deque()
+        self._total = 0
+        self._seq = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def disk_usage(self):
+        """目录中调试截图的总字节数"""
+        return self._total
+
+    def record(self, name, image, boxes=None, force=False):
+        """按采样率保存一帧，boxes 为需要标注的矩形 (x, y, w, h)，force 时不受采样率限制
+
+        返回这一帧是否进入了写入队列。
+        """
+        if image is None or (not force and random.random() >= self.sample_rate):
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((name, image, boxes, time.time()))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def flush(self):
+        """等待队列中的帧全部写完"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        """写完队列中的帧并停止后台线程"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._scan()
+                self._thread = threading.Thread(target=self._run, daemon=True, name="FlorAFKRecorder")
+                self._thread.start()
+
+    def _scan(self):
+        """之前运行留下的文件也计入预算"""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(tuple(f".{fmt}" for fmt in self.FORMATS)):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.path, stat.st_size))
+        files.sort()
+        self._files = deque((path, size) for _, path, size in files)
+        self._total = sum(size for _, _, size in files)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            except Exception as e:
+                logger.error(f"保存调试截图失败: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, name, image, boxes, timestamp):
+        if boxes:
+            image = image.copy()
+            for x, y, w, h in boxes:
+                cv2.rectangle(image, (int(x), int(y)), (int(x + w), int(y + h)), (0, 255, 0), 2)
+
+        self._seq += 1
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(timestamp))
+        path = os.path.join(self.directory, f"{name}_{stamp}_{int(timestamp * 1000) % 1000:03d}_{self._seq}.{self.fmt}")
+        if self.fmt == "npy":
+            np.save(path, image)
+        elif not cv2.imwrite(path, image, [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression]):
+            raise OSError(f"无法写入 {path}")
+
+        size = os.path.getsize(path)
+        self._files.append((path, size))
+        self._total += size
+        self.saved += 1
+        self._evict()
+
+    def _evict(self):
+        """超出预算时删除最旧的文件，至少保留刚写入的一个"""
+        while self._total > self.budget and len(self._files) > 1:
+            path, size = self._files.popleft()
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"删除调试截图失败: {e}")
+            self._total -= size
+            self.evicted += 1
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Florr.io 自动AFK脚本 - 游戏区域
+从全屏截图的内容找出游戏画布的范围作为截图区域，之后定期或检测失败时检查画布是否还在原处
+"""
+
+import logging
+
+from florr_afk_clock import SYSTEM_CLOCK
+from florr_afk_lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+logger = logging.getLogger("FlorAFK")
+
+
+def _motion_seed(frames, threshold, scale=4):
+    """几帧之间变化的最大连通区域的外接矩形 (x0, y0, x1, y1)，没有变化时返回None
+
+    在缩小的图像上计算，任务栏时钟、光标这类零散的小变化不会连成最大的区域；
+    膨胀只用来连接相邻的变化，外接矩形按膨胀前的变化像素计算。
+    """
+    height, width = frames[0].shape[:2]
+    small = [cv2.resize(frame, (max(1, width // scale), max(1, height // scale)), interpolation=cv2.INTER_AREA)
+             for frame in frames]
+    mask = np.zeros(small[0].shape[:2], dtype=np.uint8)
+    for a, b in zip(small, small[1:]):
+        mask |= (cv2.absdiff(a, b).max(axis=2) > threshold).astype(np.uint8)
+    connected = cv2.dilate(mask, np.ones((5, 5), dtype=np.uint8))
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(connected, connectivity=8)
+    if count <= 1:
+        return None
+    best = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+    ys, xs = np.nonzero((labels == best) & (mask > 0))
+    return (int(xs.min()) * scale, int(ys.min()) * scale,
+            min((int(xs.max()) + 1) * scale, width), min((int(ys.max()) + 1) * scale, height))
+
+
+def _boundaries(image, start, stop, threshold, coverage, band):
+    """沿第0维找出在 [start, stop) 列上几乎处处有明显变化的分界位置
+
+    分界 r 指第 r-1 行和第 r 行之间，要求分界两侧对称的每一对行(相隔1到 2*band-1 行)都不同，
+    画布内部不超过 band 行粗细的网格线两侧颜色相同，不会被当成分界。
+    返回每一段连续命中中相邻两行差别最大的位置。
+    """
+    columns = image[:, start:stop].astype(np.int16)
+    height = columns.shape[0]
+    if height < 2 or columns.shape[1] == 0:
+        return []
+    rows = np.arange(1, height)
+    wide = np.ones(len(rows), dtype=bool)
+    narrow = None
+    for k in range(1, band + 1):
+        outside = np.clip(rows - k, 0, height - 1)
+        inside = np.clip(rows + k - 1, 0, height - 1)
+        share = (np.abs(columns[outside] - columns[inside]).max(axis=2) > threshold).mean(axis=1)
+        if narrow is None:
+            narrow = share
+        wide &= share >= coverage
+    if not wide.any():
+        return []
+    found = []
+    hits = np.flatnonzero(wide)
+    for run in np.split(hits, np.flatnonzero(np.diff(hits) > 1) + 1):
+        found.append(int(rows[run[np.argmax(narrow[run])]]))
+    return found
+
+
+def find_game_region(frames, min_size=(320, 240), threshold=24, coverage=0.9, band=4, scale=4):
+    """从几帧相隔一小段时间的全屏截图中找出游戏画布的范围 (左, 上, 宽, 高)，找不到时返回None
+
+    画面中变化的区域视为画布内部(小花瓣和怪物一直在动)，再向四周扩展到最近的、贯穿整条边的
+    明显分界(浏览器工具栏下沿、窗口边框、显示器交界)，没有分界时扩展到截图边界。
+    """
+    frames = [frame for frame in frames if frame is not None]
+    if len(frames) < 2 or any(frame.shape != frames[0].shape for frame in frames):
+        return None
+    seed = _motion_seed(frames, threshold, scale)
+    if seed is None:
+        return None
+    frame = frames[-1]
+    height, width = frame.shape[:2]
+    # 缩小后的一个像素可能跨过画布边缘，种子的边界有 scale 像素的误差
+    x0, y0, x1, y1 = seed
+
+    rows = _boundaries(frame, x0, x1, threshold, coverage, band)
+    top = max([r for r in rows if r <= y0 + scale], default=0)
+    bottom = min([r for r in rows if r >= y1 - scale], default=height)
+    columns = _boundaries(frame.transpose(1, 0, 2), top, bottom, threshold, coverage, band)
+    left = max([c for c in columns if c <= x0 + scale], default=0)
+    right = min([c for c in columns if c >= x1 - scale], default=width)
+
+    if right - left < min_size[0] or bottom - top < min_size[1]:
+        return None
+    return left, top, right - left, bottom - top
+
+
+def _edge_present(image, position, start, stop, threshold, coverage, band):
+    """第 position 行附近(±1行)在 [start, stop) 列上是否仍是分界，判断方法同 _boundaries()"""
+    height = image.shape[0]
+    if position <= 0 or position >= height:
+        return True
+    for r in (position - 1, position, position + 1):
+        if not 0 < r < height:
+            continue
+        for k in range(1, band + 1):
+            outside = image[max(0, r - k), start:stop].astype(np.int16)
+            inside = image[min(height - 1, r + k - 1), start:stop].astype(np.int16)
+            if (np.abs(outside - inside).max(axis=1) > threshold).mean() < coverage:
+                break
+        else:
+            return True
+    return False
+
+
+def region_still_valid(frame, region, threshold=24, coverage=0.9, band=4):
+    """检查全屏截图中区域的四条边是否仍是分界，只检查四条线，开销很小
+
+    与截图边界重合的边总是成立。
+    """
+    left, top, width, height = region
+    right, bottom = left + width, top + height
+    if right > frame.shape[1] or bottom > frame.shape[0]:
+        return False
+    columns = frame.transpose(1, 0, 2)
+    return (_edge_present(frame, top, left, right, threshold, coverage, band)
+            and _edge_present(frame, bottom, left, right, threshold, coverage, band)
+            and _edge_present(columns, left, top, bottom, threshold, coverage, band)
+            and _edge_present(columns, right, top, bottom, threshold, coverage, band))
+
+
+def to_screen(point, region):
+    """把截图区域内的坐标换算为屏幕坐标"""
+    if not region:
+        return point
+    return point[0] + region[0], point[1] + region[1]
+
+
+class RegionTracker:
+    """游戏区域跟踪
+
+    locate() 相隔 gap 秒截取 samples 张全屏截图查找游戏画布；check() 每 interval 秒
+    (或检测失败时立即)截一张全屏截图检查四条边，画布移动或大小改变时重新查找。
+    capture 为全屏截图函数。
+    """
+
+    def __init__(self, capture, interval=5.0, samples=3, gap=0.2, clock=SYSTEM_CLOCK, min_size=(320, 240)):
+        self.capture = capture
+        self.interval = interval
+        self.samples = samples
+        self.gap = gap
+        self.clock = clock
+        self.min_size = min_size
+        self.region = None
+        self.checks = 0
+        self.relocations = 0
+        self._next_check = 0.0
+
+    def locate(self):
+        """查找游戏画布，返回区域，找不到时为None"""
+        frames = []
+        for i in range(self.samples):
+            if i:
+                self.clock.sleep(self.gap)
+            frames.append(self.capture())
+        self.region = find_game_region(frames, self.min_size)
+        self.relocations += 1
+        self._next_check = self.clock.monotonic() + self.interval
+        return self.region
+
+    def check(self, force=False):
+        """到了检查时间或 force 时检查区域，区域失效时重新查找，返回区域是否变化"""
+        now = self.clock.monotonic()
+        if not force and now < self._next_check:
+            return False
+        self._next_check = now + self.interval
+        previous = self.region
+        if previous is not None:
+            frame = self.capture()
+            if frame is None:
+                return False
+            self.checks += 1
+            if region_still_valid(frame, previous):
+                return False
+            logger.info(f"游戏区域 {previous} 已失效，重新查找")
+        return self.locate() != previous
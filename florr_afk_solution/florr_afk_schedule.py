@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Florr.io 自动AFK脚本 - 动作时间线调度
+长时间按住按键的移动路线和策略生成的移动模式都描述为时间线，
+由同一个调度器按绝对时间执行，可以随时暂停、恢复和在事件边界打断
+"""
+
+import time
+import random
+import logging
+import threading
+
+from florr_afk_clock import SYSTEM_CLOCK
+from florr_afk_timing import timings
+from florr_afk_lazy import lazy_import
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger("FlorAFK")
+
+# 时间线的事件类型，同一时刻按序号从小到大执行(先释放再按下)
+KEY_UP, MOUSE_UP, MOVE, MOUSE_DOWN, KEY_DOWN = range(5)
+EVENT_NAMES = ("key_up", "mouse_up", "move", "mouse_down", "key_down")
+
+# 离计划时刻不到 EPSILON 秒视为已到，浮点误差不会让虚拟时钟以0秒超时反复等待
+EPSILON = 1e-9
+
+
+def _merge(intervals):
+    """合并重叠的 (开始, 结束) 区间，首尾相接的区间保持分开，长度为0的区间丢弃"""
+    merged = []
+    for start, end in sorted(intervals):
+        if end <= start:
+            continue
+        if merged and start < merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class Timeline:
+    """动作时间线
+
+    由按住区间 (开始时间, 持续时间, 按键) 和鼠标点击组成，时间单位为秒，区间之间允许重叠。
+    第一次读取事件数组时编译: times 为相对开始的计划时刻(秒)，kinds 为事件类型，
+    symbols 为按键或鼠标按键在 names 中的序号，xy 为移动的目标坐标，durations 为移动耗时。
+    事件按时间排序，同一按键重叠的按住区间已合并，不会在仍应按住时被提前释放。
+    """
+
+    def __init__(self):
+        self.holds = []
+        self.clicks = []
+        self._end = 0.0
+        self._arrays = None
+
+    def hold(self, start, duration, *keys):
+        """在 start 时刻按下 keys，持续 duration 秒；不传按键只延长时间线"""
+        for key in keys:
+            self.holds.append((start, duration, key))
+        self._end = max(self._end, start + duration)
+        self._arrays = None
+        return self
+
+    def then(self, duration, *keys):
+        """在时间线末尾按住 keys 持续 duration 秒，不传按键表示等待"""
+        start = self._end
+        self.hold(start, duration, *keys)
+        self._end = start + duration
+        return self
+
+    def click(self, start, x, y, button, move, press):
+        """在 start 时刻开始用 move 秒把鼠标移到 (x, y)，按下 button 后 press 秒松开"""
+        self.clicks.append((start, x, y, button, move, press))
+        self._end = max(self._end, start + move + press)
+        self._arrays = None
+        return self
+
+    @property
+    def duration(self):
+        """时间线总时长"""
+        return self._end
+
+    def _compile(self):
+        if self._arrays is not None:
+            return self._arrays
+        rows = []
+        for start, x, y, button, move, press in self.clicks:
+            rows.append((start, MOVE, None, x, y, move))
+            rows.append((start + move, MOUSE_DOWN, button, 0, 0, 0.0))
+            rows.append((start + move + press, MOUSE_UP, button, 0, 0, 0.0))
+        intervals = {}
+        for start, duration, key in self.holds:
+            intervals.setdefault(key, []).append((start, start + duration))
+        for key, spans in intervals.items():
+            for start, stop in _merge(spans):
+                rows.append((start, KEY_DOWN, key, 0, 0, 0.0))
+                rows.append((stop, KEY_UP, key, 0, 0, 0.0))
+        # 排序稳定，同一时刻同类事件保持添加顺序
+        rows.sort(key=lambda row: (row[0], row[1]))
+
+        names = []
+        symbols = np.zeros(len(rows), dtype=np.int16)
+        for i, row in enumerate(rows):
+            if row[2] is not None:
+                if row[2] not in names:
+                    names.append(row[2])
+                symbols[i] = names.index(row[2])
+        self._arrays = (
+            np.array([row[0] for row in rows], dtype=np.float64),
+            np.array([row[1] for row in rows], dtype=np.uint8),
+            symbols,
+            np.array([row[3:5] for row in rows], dtype=np.int32).reshape(-1, 2),
+            np.array([row[5] for row in rows], dtype=np.float64),
+            tuple(names),
+        )
+        return self._arrays
+
+    @property
+    def times(self):
+        return self._compile()[0]
+
+    @property
+    def kinds(self):
+        return self._compile()[1]
+
+    @property
+    def symbols(self):
+        return self._compile()[2]
+
+    @property
+    def xy(self):
+        return self._compile()[3]
+
+    @property
+    def durations(self):
+        return self._compile()[4]
+
+    @property
+    def names(self):
+        return self._compile()[5]
+
+    def __len__(self):
+        return len(self.times)
+
+    def events(self):
+        """展开为 (时刻, 事件类型, 参数) 列表，用于检查和测试"""
+        times, kinds, symbols, xy, durations, names = self._compile()
+        events = []
+        for i in range(len(times)):
+            kind = int(kinds[i])
+            if kind == MOVE:
+                args = (int(xy[i, 0]), int(xy[i, 1]), float(durations[i]))
+            else:
+                args = (names[symbols[i]],)
+            events.append((float(times[i]), EVENT_NAMES[kind], args))
+        return events
+
+
+def compile_pattern(pattern, rng=random):
+    """把策略生成的移动模式编译为时间线
+
+    动作与 InputController 原来的逐个执行相同:
+    ("key", 按键, 持续时间, 间隔) 按住按键，松开后再等待间隔；
+    ("hold", 按键, 持续时间) 按住按键，但不等待，后面的动作在按住期间继续；
+    ("mouse", x, y, 按键) 带随机偏移移动过去并点击，之后随机等待0.1~0.3秒；
+    ("wait", 时长) 等待。
+    点击的随机偏移和耗时在编译时确定。
+    """
+    timeline = Timeline()
+    cursor = 0.0
+    for action in pattern:
+        action_type = action[0]
+        if action_type in ("key", "hold"):
+            key, duration = action[1], action[2]
+            timeline.hold(cursor, duration, key)
+            if action_type == "key":
+                cursor += duration + action[3]
+        elif action_type == "mouse":
+            x, y, button = action[1:]
+            move = rng.uniform(0.1, 0.3)
+            press = rng.uniform(0.01, 0.1)
+            timeline.click(cursor, x + rng.randint(-5, 5), y + rng.randint(-5, 5), button, move, press)
+            cursor += move + press + rng.uniform(0.1, 0.3)
+        elif action_type == "wait":
+            cursor += action[1]
+        else:
+            raise ValueError(f"未知的动作类型: {action_type}")
+    # 模式末尾的等待也是时间线的一部分
+    return timeline.hold(cursor, 0.0)
+
+
+class TimelineReport:
+    """动作时间线的计划与实际执行时刻，均相对开始时刻(秒)，没有执行的事件实际时刻为NaN"""
+
+    def __init__(self, planned, actual, interrupted):
+        self.planned = planned
+        self.actual = actual
+        self.interrupted = interrupted
+
+    @property
+    def executed(self):
+        """已执行的事件数"""
+        return int(np.count_nonzero(~np.isnan(self.actual)))
+
+    @property
+    def lateness(self):
+        """已执行事件比计划晚的秒数"""
+        return (self.actual - self.planned)[~np.isnan(self.actual)]
+
+    def summary(self):
+        """毫秒单位的统计结果，drift_ms 为最后一个已执行事件的误差"""
+        late = self.lateness * 1000
+        return {
+            "events": len(self.planned),
+            "executed": len(late),
+            "interrupted": self.interrupted,
+            "mean_ms": float(late.mean()) if len(late) else 0.0,
+            "p95_ms": float(np.percentile(late, 95)) if len(late) else 0.0,
+            "max_ms": float(late.max()) if len(late) else 0.0,
+            "drift_ms": float(late[-1]) if len(late) else 0.0,
+        }
+
+
+
+class TimelineRunner:
+    """按绝对时间执行时间线
+
+    start() 在后台线程中执行(长时间行走的路线)，play() 在调用线程中执行并返回 TimelineReport(策略的移动模式)。
+    每个事件的计划时刻都相对同一个开始时刻(不计暂停的时间)，某次等待的误差不会累积到后面的事件。
+    等待先通过时钟睡到计划时刻前 clock.SPIN 秒，余下的时间让出CPU忙等。
+    pause() 立即释放所有按住的键和鼠标按键并记住进度，resume() 重新按下此刻应按住的键并从断点继续。
+    stop() 和 interrupt() 在下一个事件边界停止并释放按住的键；interrupt() 不等待执行线程，
+    在 play() 之前调用时不执行任何事件，直到下一次 start()。
+    """
+
+    def __init__(self, backend, clock=SYSTEM_CLOCK):
+        self.backend = backend
+        self.clock = clock
+        self.report = None
+        self._cond = threading.Condition()
+        # 执行事件和释放、重新按下按键时持有，先于 _cond 获取
+        self._io = threading.Lock()
+        self._thread = None
+        self._timeline = Timeline()
+        self._actual = None
+        self._index = 0
+        self._held_keys = set()
+        self._held_buttons = set()
+        self._elapsed = 0.0
+        self._resumed_at = None
+        self._paused = False
+        self._stopped = True
+        self._interrupted = False
+
+    def _begin(self, timeline):
+        with self._cond:
+            self._timeline = timeline
+            self._actual = np.full(len(timeline), np.nan)
+            self._index = 0
+            self._held_keys = set()
+            self._held_buttons = set()
+            self._elapsed = 0.0
+            self._resumed_at = self.clock.monotonic()
+            self._paused = False
+            self._stopped = self._interrupted
+            self.report = None
+
+    def start(self, timeline):
+        """在后台线程中开始执行时间线，正在执行的时间线会先被停止"""
+        self.stop()
+        self._interrupted = False
+        self._begin(timeline)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.clock.register(self._thread)
+        self._thread.start()
+
+    def play(self, timeline):
+        """在调用线程中执行时间线直到结束(包括末尾的等待)或被打断，返回 TimelineReport"""
+        self._begin(timeline)
+        return self._run()
+
+    def _position(self):
+        """当前时间线进度(秒)"""
+        if self._paused:
+            return self._elapsed
+        return self._elapsed + self.clock.monotonic() - self._resumed_at
+
+    def _run(self):
+        timeline = self._timeline
+        times = timeline.times
+        clock = self.clock
+        finished = False
+        try:
+            while True:
+                with self._cond:
+                    if self._stopped:
+                        break
+                    if self._paused:
+                        clock.wait_for(self._cond, lambda: not self._paused or self._stopped)
+                        continue
+
+                    target = times[self._index] if self._index < len(times) else timeline.duration
+                    wait = target - self._position()
+                    if wait > clock.SPIN + EPSILON:
+                        clock.wait_for(self._cond, lambda: self._paused or self._stopped, wait - clock.SPIN)
+                        continue
+                if wait > EPSILON:
+                    time.sleep(0)
+                    continue
+                if self._index == len(times):
+                    finished = True
+                    break
+
+                # 后端调用不持有条件变量，移动鼠标期间时钟和其他线程的暂停、停止都不会被挡住
+                with self._io:
+                    if self._stopped or self._paused:
+                        continue
+                    self._actual[self._index] = self._position()
+                    self._execute(self._index)
+                    self._index += 1
+        finally:
+            with self._io, self._cond:
+                self._release()
+                self._stopped = True
+                clock.notify_all(self._cond)
+
+        self.report = TimelineReport(times, self._actual, not finished)
+        if timings.enabled:
+            for late in self.report.lateness:
+                timings.record("timeline_lateness", max(0.0, late))
+        return self.report
+
+    def _execute(self, i):
+        timeline = self._timeline
+        backend = self.backend
+        kind = timeline.kinds[i]
+        if kind == MOVE:
+            backend.move_to(int(timeline.xy[i, 0]), int(timeline.xy[i, 1]), float(timeline.durations[i]))
+            return
+        name = timeline.names[timeline.symbols[i]]
+        if kind == KEY_DOWN:
+            backend.key_down(name)
+            self._held_keys.add(name)
+        elif kind == KEY_UP:
+            backend.key_up(name)
+            self._held_keys.discard(name)
+        elif kind == MOUSE_DOWN:
+            backend.mouse_down(name)
+            self._held_buttons.add(name)
+        else:
+            backend.mouse_up(name)
+            self._held_buttons.discard(name)
+
+    def _release(self):
+        with self.backend.batch():
+            for button in sorted(self._held_buttons):
+                self.backend.mouse_up(button)
+            for key in sorted(self._held_keys):
+                self.backend.key_up(key)
+
+    def pause(self):
+        """暂停并释放所有按住的键和鼠标按键"""
+        with self._io, self._cond:
+            if self._stopped or self._paused:
+                return
+            self._elapsed = self._position()
+            self._paused = True
+            self._release()
+            self.clock.notify_all(self._cond)
+
+    def resume(self):
+        """重新按下应按住的键和鼠标按键并继续执行"""
+        with self._io, self._cond:
+            if self._stopped or not self._paused:
+                return
+            with self.backend.batch():
+                for key in sorted(self._held_keys):
+                    self.backend.key_down(key)
+                for button in sorted(self._held_buttons):
+                    self.backend.mouse_down(button)
+            self._resumed_at = self.clock.monotonic()
+            self._paused = False
+            self.clock.notify_all(self._cond)
+
+    def interrupt(self):
+        """在下一个事件边界停止执行，不等待执行线程"""
+        with self._cond:
+            self._interrupted = True
+            self._stopped = True
+            self.clock.notify_all(self._cond)
+
+    def stop(self):
+        """停止执行并释放所有按键"""
+        with self._cond:
+            self._stopped = True
+            self.clock.notify_all(self._cond)
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def wait(self, timeout=None):
+        """等待时间线执行完毕，返回是否已结束"""
+        with self._cond:
+            return self.clock.wait_for(self._cond, lambda: self._stopped, timeout)
+
+    @property
+    def running(self):
+        """是否有时间线正在执行(包括暂停中)"""
+        return not self._stopped
+
+    @property
+    def paused(self):
+        """是否处于暂停状态"""
+        return self._paused
+
+    @property
+    def interrupted(self):
+        """是否被 interrupt() 打断"""
+        return self._interrupted
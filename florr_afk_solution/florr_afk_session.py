@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Florr.io 自动AFK脚本 - 会话录制
+把一次运行的截图、检测结果和输入事件写入一个文件，回放时内存映射读取截图，可按时间定位
+"""
+
+import json
+import time
+import bisect
+import struct
+import logging
+import threading
+
+from florr_afk_lazy import lazy_import
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger("FlorAFK")
+
+# 文件结构: 文件标识 | 记录... | 索引偏移和文件标识
+# 每条记录为 类型 | 长度 | 内容: M 元数据，D 帧数据(开头补零使帧按64字节对齐)，F 帧索引，E 事件，I 完整索引。
+# 帧索引和事件边录制边追加，没有正常关闭的文件(没有末尾的完整索引)也能按顺序扫描记录恢复
+MAGIC = b"FAFKSES1"
+FOOTER = struct.Struct("<Q8s")
+RECORD = struct.Struct("<cQ")
+ALIGN = 64
+VERSION = 2
+
+
+def _json_default(value):
+    """numpy标量和数组转换为Python类型"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"无法序列化 {type(value).__name__}")
+
+
+def normalize(value):
+    """转换为JSON往返后的形式(元组变为列表)，用于比较录制和回放的结果"""
+    return json.loads(json.dumps(value, default=_json_default))
+
+
+class SessionWriter:
+    """会话录制
+
+    帧数据按原始字节依次追加，不做编码；距上一帧不足 frame_interval 秒的帧不保存，
+    除非 force(例如检测到弹窗的帧)。与上一帧内容相同的帧只记录索引，共用上一帧的数据；
+    帧数据累计超过 max_bytes 后不再保存新的帧，检测结果和输入事件照常记录。
+    每条索引写入后立即flush，close() 在文件末尾再写一份完整索引。
+    """
+
+    def __init__(self, path, frame_interval=0.0, metadata=None, clock=time.monotonic, max_bytes=None):
+        self.path = path
+        self.frame_interval = frame_interval
+        self.metadata = metadata or {}
+        self.clock = clock
+        self.max_bytes = max_bytes
+        self.started = clock()
+        self.frames = []
+        self.events = []
+        self.frame_bytes = 0
+        self.dropped = 0
+        self._last_image = None
+        self._last_data = None
+        self._lock = threading.Lock()
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._record(b"M", {"version": VERSION, "metadata": self.metadata})
+        self._file.flush()
+
+    def _now(self):
+        return round(self.clock() - self.started, 6)
+
+    def _record(self, kind, value):
+        """追加一条JSON记录，返回内容的偏移"""
+        payload = json.dumps(value, separators=(",", ":"), default=_json_default).encode("utf-8")
+        self._file.write(RECORD.pack(kind, len(payload)))
+        offset = self._file.tell()
+        self._file.write(payload)
+        return offset
+
+    def _write_data(self, data):
+        """追加一帧数据，返回按 ALIGN 对齐的数据偏移"""
+        padding = -(self._file.tell() + RECORD.size) % ALIGN
+        self._file.write(RECORD.pack(b"D", padding + data.nbytes))
+        self._file.write(b"\0" * padding)
+        offset = self._file.tell()
+        self._file.write(data.data)
+        return offset
+
+    def add_frame(self, image, force=False):
+        """追加一帧，返回帧序号；按间隔跳过或超出大小上限时返回None，同一帧重复传入时返回已有的序号"""
+        with self._lock:
+            if self._file is None:
+                return None
+            if image is self._last_image and self.frames:
+                return len(self.frames) - 1
+            timestamp = self._now()
+            if not force and self.frames and timestamp - self.frames[-1][0] < self.frame_interval:
+                return None
+            data = np.ascontiguousarray(image)
+            previous = self._last_data
+            if (previous is not None and previous.shape == data.shape and previous.dtype == data.dtype
+                    and np.array_equal(previous, data)):
+                # 画面没有变化，只记录索引
+                offset = self.frames[-1][1]
+            else:
+                if self.max_bytes is not None and self.frame_bytes + data.nbytes > self.max_bytes:
+                    if not self.dropped:
+                        logger.warning(f"会话文件 {self.path} 的帧数据达到上限 {self.max_bytes} 字节，不再保存新的帧")
+                    self.dropped += 1
+                    return None
+                offset = self._write_data(data)
+                self.frame_bytes += data.nbytes
+                self._last_data = data
+            frame = [timestamp, offset, list(data.shape), data.dtype.str]
+            self._record(b"F", frame)
+            self._file.flush()
+            self.frames.append(frame)
+            self._last_image = image
+            return len(self.frames) - 1
+
+    def add_event(self, kind, data=None):
+        """追加一个带时间戳的事件"""
+        with self._lock:
+            event = [self._now(), kind, normalize(data)]
+            self.events.append(event)
+            if self._file is not None:
+                self._record(b"E", event)
+                self._file.flush()
+
+    def input_observer(self, events):
+        """作为输入后端的观察者，记录每个提交的输入事件"""
+        for kind, args, delay in events:
+            self.add_event("input", {"kind": kind, "args": list(args), "delay": delay})
+
+    def close(self):
+        """写入完整索引并关闭文件"""
+        with self._lock:
+            if self._file is None:
+                return
+            index = {
+                "version": VERSION,
+                "metadata": self.metadata,
+                "duration": self._now(),
+                "frames": self.frames,
+                "events": self.events,
+            }
+            index_offset = self._record(b"I", index)
+            self._file.write(FOOTER.pack(index_offset, MAGIC))
+            self._file.close()
+            self._file = None
+        logger.info(f"会话已保存到 {self.path}，共 {len(self.frames)} 帧，{len(self.events)} 个事件"
+                    + (f"，{self.dropped} 帧因超出大小上限没有保存" if self.dropped else ""))
+
+
+def _read_index(f, size):
+    """读取文件末尾的完整索引，没有正常关闭的文件返回None"""
+    if size < len(MAGIC) + FOOTER.size:
+        return None
+    f.seek(-FOOTER.size, 2)
+    footer_offset = f.tell()
+    index_offset, magic = FOOTER.unpack(f.read(FOOTER.size))
+    if magic != MAGIC or not len(MAGIC) <= index_offset <= footer_offset:
+        return None
+    f.seek(index_offset)
+    try:
+        return json.loads(f.read(footer_offset - index_offset).decode("utf-8"))
+    except ValueError:
+        return None
+
+
+def _recover_index(f, size):
+    """按顺序扫描记录恢复索引，遇到写了一半的记录时停止"""
+    index = {"metadata": {}, "frames": [], "events": []}
+    f.seek(len(MAGIC))
+    while True:
+        header = f.read(RECORD.size)
+        if len(header) < RECORD.size:
+            break
+        kind, length = RECORD.unpack(header)
+        if f.tell() + length > size:
+            break
+        if kind == b"D":
+            f.seek(length, 1)
+            continue
+        try:
+            value = json.loads(f.read(length).decode("utf-8"))
+        except ValueError:
+            break
+        if kind == b"M":
+            index["version"] = value["version"]
+            index["metadata"] = value["metadata"]
+        elif kind == b"F":
+            index["frames"].append(value)
+        elif kind == b"E":
+            index["events"].append(value)
+    if "version" not in index:
+        raise ValueError(f"{f.name} 无法恢复: 没有会话记录")
+    timestamps = [frame[0] for frame in index["frames"]] + [event[0] for event in index["events"]]
+    index["duration"] = max(timestamps, default=0.0)
+    return index
+
+
+class SessionReader:
+    """会话回放
+
+    帧通过内存映射读取，frame() 返回不复制数据的只读数组；seek() 按时间定位帧。
+    没有正常关闭的文件按记录恢复，complete 为False，时长取最后一帧或事件的时间戳。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} 不是会话文件")
+            size = f.seek(0, 2)
+            index = _read_index(f, size)
+            self.complete = index is not None
+            if index is None:
+                index = _recover_index(f, size)
+                logger.warning(f"{path} 没有正常结束，从记录中恢复了 {len(index['frames'])} 帧和 "
+                               f"{len(index['events'])} 个事件")
+        self.metadata = index.get("metadata", {})
+        self.duration = index.get("duration", 0.0)
+        self._frames = index["frames"]
+        self._events = index["events"]
+        self.timestamps = [frame[0] for frame in self._frames]
+        self._map = np.memmap(path, dtype=np.uint8, mode="r")
+
+    def __len__(self):
+        return len(self._frames)
+
+    def frame(self, index):
+        """第 index 帧"""
+        timestamp, offset, shape, dtype = self._frames[index]
+        return np.ndarray(tuple(shape), np.dtype(dtype), buffer=self._map, offset=offset)
+
+    def seek(self, timestamp):
+        """时间戳不早于 timestamp 的第一帧的序号"""
+        return bisect.bisect_left(self.timestamps, timestamp)
+
+    def events(self, kind=None, start=None, end=None):
+        """时间范围内的事件 (时间戳, 类型, 数据)"""
+        for timestamp, event_kind, data in self._events:
+            if kind is not None and event_kind != kind:
+                continue
+            if start is not None and timestamp < start:
+                continue
+            if end is not None and timestamp > end:
+                continue
+            yield timestamp, event_kind, data
+
+    def detections(self):
+        """帧序号 -> 录制时的检测结果 (检测器名称, 结果)"""
+        return {data["frame"]: (data["name"], data["result"]) for _, _, data in self.events("detection")}
+
+    def close(self):
+        """释放内存映射"""
+        self._map = None
+
+
+def replay(reader, detect, start=0, stop=None):
+    """以最快速度把录制的帧逐一交给 detect(frame)，detect 返回 (检测器名称, 结果)
+
+    返回每帧的 (帧序号, 录制时的结果, 回放的结果, 耗时秒数)，没有录制检测结果的帧录制结果为None。
+    """
+    recorded = reader.detections()
+    results = []
+    for index in range(start, len(reader) if stop is None else min(stop, len(reader))):
+        frame = reader.frame(index)
+        began = time.perf_counter()
+        outcome = detect(frame)
+        elapsed = time.perf_counter() - began
+        expected = recorded.get(index)
+        results.append((index, list(expected) if expected else None, normalize(list(outcome)), elapsed))
+    return results
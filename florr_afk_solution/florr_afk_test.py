@@ -11,7 +11,13 @@ import random
 import logging
 import os
 import sys
+import json
+import shutil
+import threading
+import tempfile
 import unittest
+import subprocess
+import asyncio
 from unittest.mock import patch, MagicMock
 import numpy as np
 import cv2
@@ -20,6 +26,27 @@ from PIL import Image
 # 导入主脚本
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 import florr_afk_bot
+import florr_afk_input
+import florr_afk_schedule
+import florr_afk_async
+import florr_afk_frames
+import florr_afk_detectors
+import florr_afk_pipeline
+import florr_afk_timing
+import florr_afk_metrics
+import florr_afk_profile
+import florr_afk_benchmark
+import florr_afk_calibration
+import florr_afk_logging
+import florr_afk_recorder
+import florr_afk_session
+import florr_afk_clock
+import florr_afk_history
+import florr_afk_governor
+import florr_afk_region
+import florr_afk_idle
+import florr_afk_lazy
+from concurrent.futures import ThreadPoolExecutor
 
 # 配置日志
 logging.basicConfig(
@@ -33,6 +60,157 @@ logging.basicConfig(
 logger = logging.getLogger("FlorAFKTest")
 
 
+def _frame_marker(frame):
+    """流水线测试用的求解函数，返回帧左上角像素值，0表示未命中(需要能被pickle)"""
+    value = int(frame[0, 0, 0])
+    return value or None
+
+
+def _desktop_frame(t, canvas=(100, 100, 900, 520), size=(1280, 720)):
+    """合成的桌面截图: 渐变壁纸、浏览器工具栏、带网格线的游戏画布(内有转动的花瓣)和显示时间的任务栏"""
+    width, height = size
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    image[:] = np.linspace(60, 140, width, dtype=np.uint8)[None, :, None]
+    x, y, w, h = canvas
+    image[y - 40:y, x:x + w] = (200, 200, 200)
+    cv2.rectangle(image, (x + 10, y - 30), (x + 300, y - 10), (255, 255, 255), -1)
+    image[y:y + h, x:x + w] = (97, 167, 30)
+    for gx in range(x + 25, x + w, 50):
+        image[y:y + h, gx:gx + 2] = (60, 130, 10)
+    for gy in range(y + 25, y + h, 50):
+        image[gy:gy + 2, x:x + w] = (60, 130, 10)
+    cx, cy = x + w // 2, y + h // 2
+    for k in range(5):
+        angle = t * 2 + k * 1.2
+        cv2.circle(image, (int(cx + 80 * np.cos(angle)), int(cy + 80 * np.sin(angle))), 12, (255, 255, 255), -1)
+    image[height - 30:] = (40, 40, 40)
+    cv2.putText(image, f"{int(t * 10) % 60:02d}", (width - 60, height - 8), cv2.FONT_HERSHEY_SIMPLEX, 0.6,
+                (255, 255, 255), 1)
+    return image
+
+
+class TestConfig(unittest.TestCase):
+    """测试配置管理类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "florr_config.json")
+        self.config = florr_afk_bot.Config(self.path)
+    
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def test_batch_writes_once(self):
+        """测试批量修改只写入一次文件，且不留下临时文件"""
+        with patch.object(self.config, 'save_config', wraps=self.config.save_config) as mock_save:
+            with self.config.batch():
+                self.config.set("area", "desert")
+                self.config.set("mode", "aggressive")
+                self.config.set("run_time", 30)
+                mock_save.assert_not_called()
+            mock_save.assert_called_once()
+        
+        with open(self.path) as f:
+            saved = json.load(f)
+        self.assertEqual((saved["area"], saved["mode"], saved["run_time"]), ("desert", "aggressive", 30))
+        self.assertEqual(os.listdir(self.directory), ["florr_config.json"])
+    
+    def test_reload_when_file_changes(self):
+        """测试配置文件被修改后重新加载，运行中的机器人更新缓存的配置项"""
+        with patch('florr_afk_bot.Config', return_value=self.config):
+            bot = florr_afk_bot.FlorAFKBot(self.path)
+        version = self.config.version
+        self.assertFalse(self.config.reload_if_changed())
+        
+        with open(self.path) as f:
+            saved = json.load(f)
+        saved["movement_interval"] = [0.5, 1.0]
+        saved["area"] = "spider"
+        with open(self.path, "w") as f:
+            json.dump(saved, f)
+        self.config._next_check = 0.0
+        
+        bot.refresh_config()
+        self.assertGreater(self.config.version, version)
+        self.assertEqual(bot.movement_interval, (0.5, 1.0))
+        self.assertIsInstance(bot.strategy, florr_afk_bot.SpiderStrategy)
+        
+        # 写了一半的文件不会覆盖当前配置
+        with open(self.path, "w") as f:
+            f.write("{")
+        self.config._next_check = 0.0
+        self.assertFalse(self.config.reload_if_changed())
+        self.assertEqual(self.config.get("area"), "spider")
+    
+    def test_reload_interval_uses_clock(self):
+        """测试检查配置文件的间隔按传入的时钟计算"""
+        now = [0.0]
+        config = florr_afk_bot.Config(self.path, clock=lambda: now[0])
+        self.assertFalse(config.reload_if_changed())
+        with open(self.path, "w") as f:
+            json.dump(dict(config.config, area="spider"), f)
+        
+        now[0] = 1.0
+        self.assertFalse(config.reload_if_changed())
+        now[0] = 2.5
+        self.assertTrue(config.reload_if_changed())
+        self.assertEqual(config.get("area"), "spider")
+
+
+class TestLogging(unittest.TestCase):
+    """测试异步日志模块"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.directory = tempfile.mkdtemp()
+        self.settings = florr_afk_logging._settings
+    
+    def tearDown(self):
+        """恢复原来的日志输出"""
+        florr_afk_logging.setup_logging(*self.settings)
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def test_rate_limit_debug(self):
+        """测试同一位置的调试日志被限速，省略的条数附在下一条后面"""
+        now = [0.0]
+        rate_filter = florr_afk_logging.RateLimitFilter(rate=2.0, clock=lambda: now[0])
+        
+        def record(level=logging.DEBUG):
+            return logging.LogRecord("FlorAFK", level, "bot.py", 10, "移动 %d", (1,), None)
+        
+        passed = [rate_filter.filter(record()) for _ in range(10)]
+        self.assertEqual(passed.count(True), 2)
+        # 其他级别不受影响
+        self.assertTrue(rate_filter.filter(record(logging.INFO)))
+        
+        now[0] = 1.0
+        allowed = record()
+        self.assertTrue(rate_filter.filter(allowed))
+        self.assertEqual(allowed.getMessage(), "移动 1 (此前省略 8 条)")
+    
+    def test_events_written_as_json_lines(self):
+        """测试日志经由后台线程写入，事件另外写为JSON行"""
+        log_path = os.path.join(self.directory, "afk.log")
+        json_path = os.path.join(self.directory, "events.jsonl")
+        florr_afk_logging.setup_logging(log_path, json_path, stream=False)
+        
+        florr_afk_logging.log_event("popup_detected", "检测到AFK弹窗", x=400, y=300)
+        logging.getLogger("FlorAFK").info("普通日志")
+        florr_afk_logging.shutdown_logging()
+        
+        with open(log_path, encoding="utf-8") as f:
+            text = f.read()
+        self.assertIn("检测到AFK弹窗", text)
+        self.assertIn("普通日志", text)
+        with open(json_path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 1)
+        event = json.loads(lines[0])
+        self.assertEqual((event["event"], event["x"], event["y"]), ("popup_detected", 400, 300))
+
+
 class TestImageRecognition(unittest.TestCase):
     """测试图像识别模块"""
     
@@ -96,6 +274,41 @@ class TestImageRecognition(unittest.TestCase):
         # 验证结果
         self.assertIsNone(result)
     
+    def test_red_mask_matches_two_ranges(self):
+        """测试查表红色掩码与两个inRange掩码相加的结果一致"""
+        img = np.random.default_rng(0).integers(0, 256, (120, 160, 3), dtype=np.uint8)
+        
+        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        mask1 = cv2.inRange(hsv, np.array([0, 100, 100]), np.array([10, 255, 255]))
+        mask2 = cv2.inRange(hsv, np.array([160, 100, 100]), np.array([180, 255, 255]))
+        
+        np.testing.assert_array_equal(self.image_recognition.red_mask(img), mask1 + mask2)
+    
+    def test_detect_afk_popup_ignores_small_red(self):
+        """测试不符合按钮尺寸的红色区域不会被识别"""
+        img = np.zeros((600, 800, 3), dtype=np.uint8)
+        cv2.rectangle(img, (100, 100), (130, 115), (0, 0, 255), -1)   # 太小
+        cv2.rectangle(img, (300, 300), (700, 340), (0, 0, 255), -1)   # 太宽
+        
+        self.assertIsNone(self.image_recognition.detect_afk_popup(img))
+    
+    def test_detect_afk_popup_roi(self):
+        """测试配置的搜索区域和学习到的搜索区域"""
+        img = np.zeros((600, 800, 3), dtype=np.uint8)
+        cv2.rectangle(img, (350, 280), (450, 320), (0, 0, 255), -1)
+        
+        # 命中后记住按钮附近的区域
+        self.assertEqual(self.image_recognition.detect_afk_popup(img), (400, 300))
+        x, y, w, h = self.image_recognition.learned_popup_roi
+        self.assertTrue(x <= 350 and y <= 280 and x + w >= 450 and y + h >= 320)
+        
+        # 按钮不在配置的区域内时不会被识别
+        self.image_recognition.popup_roi = (0, 0, 300, 200)
+        self.assertIsNone(self.image_recognition.detect_afk_popup(img))
+        
+        self.image_recognition.popup_roi = (300, 250, 200, 100)
+        self.assertEqual(self.image_recognition.detect_afk_popup(img), (400, 300))
+    
     @patch('florr_afk_bot.ImageRecognition.capture_screen')
     def test_detect_game_status_normal(self, mock_capture):
         """测试游戏状态检测 - 正常状态"""
@@ -112,6 +325,1044 @@ class TestImageRecognition(unittest.TestCase):
         self.assertEqual(result, "normal")
 
 
+class TestDebugRecorder(unittest.TestCase):
+    """测试调试截图记录模块"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.directory = tempfile.mkdtemp()
+        self.frame = np.random.randint(0, 255, (60, 80, 3), dtype=np.uint8)
+    
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def test_budget_evicts_oldest(self):
+        """测试超出预算时删除最旧的截图"""
+        frame_bytes = self.frame.nbytes
+        recorder = florr_afk_recorder.DebugRecorder(self.directory, sample_rate=0.0, fmt="npy",
+                                                    budget_mb=frame_bytes * 3.5 / 1024 / 1024)
+        # 采样率为0时只保存强制记录的帧
+        self.assertFalse(recorder.record("screenshot", self.frame))
+        for _ in range(6):
+            self.assertTrue(recorder.record("afk_detected", self.frame, force=True))
+            recorder.flush()
+        recorder.close()
+        
+        files = sorted(os.listdir(self.directory))
+        self.assertEqual(len(files), 3)
+        self.assertEqual(recorder.evicted, 3)
+        self.assertLessEqual(recorder.disk_usage, recorder.budget)
+        # 保留的是最新的三帧
+        self.assertEqual(sorted(int(name.rsplit("_", 1)[1][:-4]) for name in files), [4, 5, 6])
+        np.testing.assert_array_equal(np.load(os.path.join(self.directory, files[0])), self.frame)
+    
+    def test_popup_hit_recorded_in_background(self):
+        """测试调试模式下检测到弹窗时保存标注后的截图，不修改原图"""
+        config = MagicMock()
+        config.get.side_effect = lambda key, default=None: {
+            "debug": True,
+            "debug_frames_dir": self.directory
+        }.get(key, default)
+        recognition = florr_afk_bot.ImageRecognition(config)
+        screenshot = np.zeros((600, 800, 3), dtype=np.uint8)
+        cv2.rectangle(screenshot, (350, 280), (450, 320), (0, 0, 255), -1)
+        original = screenshot.copy()
+        
+        self.assertIsNotNone(recognition.detect_afk_popup(screenshot))
+        recognition.recorder.close()
+        
+        files = os.listdir(self.directory)
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].startswith("afk_detected_") and files[0].endswith(".png"))
+        saved = cv2.imread(os.path.join(self.directory, files[0]))
+        self.assertTrue((saved[:, :, 1] == 255).any())
+        np.testing.assert_array_equal(screenshot, original)
+
+
+class TestSession(unittest.TestCase):
+    """测试会话录制和回放模块"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "session.fafk")
+        self.now = [0.0]
+        self.frames = [np.full((60, 80, 3), i * 40, dtype=np.uint8) for i in range(4)]
+    
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def record(self, results):
+        """每隔一秒录制一帧和对应的检测结果"""
+        writer = florr_afk_session.SessionWriter(self.path, frame_interval=0.5, metadata={"target": "bot"},
+                                                 clock=lambda: self.now[0])
+        backend = florr_afk_input.RecordingBackend()
+        backend.add_observer(writer.input_observer)
+        for frame, result in zip(self.frames, results):
+            index = writer.add_frame(frame, force=result is not None)
+            writer.add_event("detection", {"frame": index, "name": "afk_popup" if result else None, "result": result})
+            if result:
+                backend.click(*result)
+            self.now[0] += 0.25
+            # 间隔不足且不是强制保存的帧被跳过
+            self.assertIsNone(writer.add_frame(frame.copy()))
+            self.now[0] += 0.75
+        writer.close()
+        return florr_afk_session.SessionReader(self.path)
+    
+    def test_round_trip(self):
+        """测试帧、检测结果和输入事件原样读回，可按时间定位"""
+        reader = self.record([None, (10, 20), None, None])
+        self.assertEqual(reader.metadata, {"target": "bot"})
+        self.assertEqual(len(reader), 4)
+        self.assertEqual(reader.timestamps, [0.0, 1.0, 2.0, 3.0])
+        for i, frame in enumerate(self.frames):
+            np.testing.assert_array_equal(reader.frame(i), frame)
+        self.assertEqual(reader.seek(1.5), 2)
+        self.assertEqual(reader.detections()[1], ("afk_popup", [10, 20]))
+        inputs = [data["kind"] for _, _, data in reader.events("input")]
+        self.assertEqual(inputs, ["move", "mouse_down", "mouse_up"])
+        self.assertEqual(list(reader.events("input", start=1.5)), [])
+        reader.close()
+    
+    def test_replay_reports_mismatch(self):
+        """测试回放时与录制结果不一致的帧被标出"""
+        reader = self.record([None, (10, 20), None, None])
+        outcomes = {0: (None, None), 1: ("afk_popup", (10, 20)), 2: ("afk_popup", (5, 5)), 3: (None, None)}
+        seen = []
+        
+        def detect(frame):
+            seen.append(int(frame[0, 0, 0]))
+            return outcomes[len(seen) - 1]
+        
+        results = florr_afk_session.replay(reader, detect)
+        self.assertEqual(seen, [0, 40, 80, 120])
+        mismatches = [index for index, expected, actual, _ in results if expected != actual]
+        self.assertEqual(mismatches, [2])
+        self.assertEqual(len(florr_afk_session.replay(reader, lambda frame: (None, None), start=reader.seek(2.0))), 2)
+        reader.close()
+    
+    def test_recover_unclosed_writer(self):
+        """测试没有正常关闭(最后一条记录只写了一半)的会话仍可读取和回放"""
+        writer = florr_afk_session.SessionWriter(self.path, metadata={"target": "bot"}, clock=lambda: self.now[0])
+        for i, frame in enumerate(self.frames[:3]):
+            index = writer.add_frame(frame)
+            writer.add_event("detection", {"frame": index, "name": None, "result": None})
+            self.now[0] += 1.0
+        writer.add_frame(self.frames[3])
+        # 模拟进程在写最后一帧时退出
+        size = os.path.getsize(self.path)
+        with open(self.path, "r+b") as f:
+            f.truncate(size - 100)
+        
+        reader = florr_afk_session.SessionReader(self.path)
+        self.assertFalse(reader.complete)
+        self.assertEqual(reader.metadata, {"target": "bot"})
+        self.assertEqual(len(reader), 3)
+        self.assertEqual(reader.duration, 2.0)
+        for i in range(3):
+            np.testing.assert_array_equal(reader.frame(i), self.frames[i])
+        results = florr_afk_session.replay(reader, lambda frame: (None, None))
+        self.assertEqual([expected for _, expected, _, _ in results], [[None, None]] * 3)
+        reader.close()
+        writer.close()
+    
+    def test_dedupe_and_budget(self):
+        """测试相同的帧共用数据，帧数据超出上限后不再保存新的帧"""
+        writer = florr_afk_session.SessionWriter(self.path, clock=lambda: self.now[0],
+                                                 max_bytes=2 * self.frames[0].nbytes)
+        self.assertEqual(writer.add_frame(self.frames[0]), 0)
+        self.assertEqual(writer.add_frame(self.frames[0].copy()), 1)
+        self.assertEqual(writer.add_frame(self.frames[1]), 2)
+        self.assertIsNone(writer.add_frame(self.frames[2]))
+        self.assertEqual(writer.add_frame(self.frames[1].copy()), 3)
+        writer.close()
+        
+        self.assertEqual(writer.frame_bytes, 2 * self.frames[0].nbytes)
+        self.assertEqual(writer.dropped, 1)
+        self.assertLess(os.path.getsize(self.path), 2 * self.frames[0].nbytes + 4096)
+        reader = florr_afk_session.SessionReader(self.path)
+        self.assertTrue(reader.complete)
+        self.assertEqual(len(reader), 4)
+        np.testing.assert_array_equal(reader.frame(1), self.frames[0])
+        np.testing.assert_array_equal(reader.frame(3), self.frames[1])
+        reader.close()
+
+
+class TestAdaptiveSchedule(unittest.TestCase):
+    """测试到达历史和自适应调度模块"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.directory = tempfile.mkdtemp()
+        self.history = florr_afk_history.ArrivalHistory(os.path.join(self.directory, "history.db"))
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.history.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def test_intervals_per_session(self):
+        """测试到达间隔只在同一次运行内计算"""
+        for ts in (100.0, 200.0, 350.0):
+            self.history.record("popup", ts, session=0.0)
+        for ts in (1000.0, 1120.0):
+            self.history.record("popup", ts, session=900.0, detector="afk_popup")
+        self.history.record("maze", 1200.0, session=900.0)
+        self.assertEqual(self.history.intervals("popup"), [100.0, 150.0, 120.0])
+        self.assertEqual(self.history.intervals("popup", limit=2), [150.0, 120.0])
+        self.assertEqual(self.history.intervals("maze"), [])
+        self.assertEqual(self.history.count("popup"), 5)
+        self.assertEqual(self.history.count(), 6)
+    
+    def test_schedule_window(self):
+        """测试按历史间隔预测窗口，窗口之前降频、窗口内加速、晚于窗口恢复"""
+        schedule = florr_afk_history.AdaptiveSchedule(self.history, session=0.0, base=0.5, fast=0.2, slow=2.0,
+                                                      lead=30.0, min_samples=3)
+        # 历史不足时使用固定间隔
+        self.assertEqual(schedule.state(10.0), "learning")
+        self.assertEqual(schedule.interval(10.0), 0.5)
+        for ts in (600.0, 1200.0, 1800.0, 2400.0):
+            self.assertTrue(schedule.observe(ts, "afk_popup"))
+        start, end = schedule.window
+        self.assertAlmostEqual(start, 570.0)
+        self.assertAlmostEqual(end, 600.0)
+        self.assertEqual(schedule.interval(2400.0 + 300.0), 2.0)
+        self.assertTrue(schedule.hot(2400.0 + 580.0))
+        self.assertEqual(schedule.interval(2400.0 + 580.0), 0.2)
+        self.assertEqual(schedule.state(2400.0 + 700.0), "overdue")
+        self.assertEqual(schedule.interval(2400.0 + 700.0), 0.5)
+        
+        # 同一个弹窗被连续检测到时只记一次
+        self.assertFalse(schedule.observe(2405.0))
+        self.assertFalse(schedule.observe(2430.0))
+        self.assertEqual(self.history.count("popup"), 4)
+        
+        # 新的一次运行读取之前的历史，从运行开始计算窗口
+        restarted = florr_afk_history.AdaptiveSchedule(self.history, session=5000.0, min_samples=3)
+        self.assertEqual(restarted.window, schedule.window)
+        self.assertEqual(restarted.state(5000.0 + 590.0), "window")
+    
+    def test_producer_follows_schedule(self):
+        """测试截图线程按调度返回的间隔截图: 窗口之前稀疏，窗口内密集"""
+        for ts in (-1000.0, -900.0, -800.0, -700.0):
+            self.history.record("popup", ts, session=-1000.0)
+        clock = florr_afk_clock.VirtualClock()
+        clock.register()
+        schedule = florr_afk_history.AdaptiveSchedule(self.history, session=0.0, base=5.0, fast=1.0, slow=10.0,
+                                                      lead=20.0, min_samples=3)
+        captures = []
+        producer = florr_afk_frames.FrameProducer(lambda: captures.append(clock.monotonic()) or captures[-1],
+                                                  lambda: schedule.interval(clock.monotonic()),
+                                                  clock.monotonic, clock)
+        try:
+            producer.start()
+            clock.sleep(120.0)
+            producer.stop()
+        finally:
+            clock.close()
+        
+        self.assertEqual(captures[:9], [0.0, 10.0, 20.0, 30.0, 40.0, 50.0, 60.0, 70.0, 80.0])
+        self.assertEqual([t for t in captures if 80.0 <= t <= 100.0], [float(t) for t in range(80, 101)])
+        self.assertEqual([t for t in captures if 100.0 < t <= 120.0], [101.0, 106.0, 111.0, 116.0])
+
+
+class TestGameRegion(unittest.TestCase):
+    """测试游戏区域查找和跟踪模块"""
+    
+    def test_find_game_region(self):
+        """测试从几帧截图中找出画布，画布内的网格线和任务栏的变化不影响结果"""
+        frames = [_desktop_frame(t) for t in (0.0, 0.2, 0.4)]
+        self.assertEqual(florr_afk_region.find_game_region(frames), (100, 100, 900, 520))
+        # 画面没有变化时找不到
+        self.assertIsNone(florr_afk_region.find_game_region([frames[0], frames[0].copy()]))
+        # 画布大小不足 min_size 时找不到
+        self.assertIsNone(florr_afk_region.find_game_region(frames, min_size=(1000, 240)))
+    
+    def test_region_still_valid(self):
+        """测试画布移动后四条边的检查不再成立"""
+        region = (100, 100, 900, 520)
+        self.assertTrue(florr_afk_region.region_still_valid(_desktop_frame(1.0), region))
+        self.assertFalse(florr_afk_region.region_still_valid(_desktop_frame(1.0, (150, 120, 900, 520)), region))
+        # 与截图边界重合的边总是成立
+        self.assertTrue(florr_afk_region.region_still_valid(_desktop_frame(1.0), (0, 0, 1280, 720)))
+    
+    def test_tracker_follows_canvas(self):
+        """测试跟踪器按间隔检查，画布移动后重新查找"""
+        clock = florr_afk_clock.VirtualClock()
+        clock.register()
+        canvas = [(100, 100, 900, 520)]
+        captures = []
+        
+        def capture():
+            captures.append(clock.monotonic())
+            return _desktop_frame(clock.monotonic(), canvas[0])
+        
+        tracker = florr_afk_region.RegionTracker(capture, interval=5.0, gap=0.2, clock=clock)
+        try:
+            self.assertEqual(tracker.locate(), (100, 100, 900, 520))
+            self.assertEqual(len(captures), 3)
+            # 不到检查时间时不截图
+            self.assertFalse(tracker.check())
+            self.assertEqual(len(captures), 3)
+            clock.sleep(5.0)
+            self.assertFalse(tracker.check())
+            self.assertEqual(tracker.checks, 1)
+            
+            canvas[0] = (200, 150, 800, 480)
+            self.assertTrue(tracker.check(force=True))
+            self.assertEqual(tracker.region, (200, 150, 800, 480))
+            self.assertEqual(tracker.relocations, 2)
+        finally:
+            clock.close()
+    
+    def test_backend_origin(self):
+        """测试设置原点后输入坐标相对于区域左上角"""
+        backend = florr_afk_input.RecordingBackend()
+        backend.set_origin(100, 50)
+        backend.click(10, 20)
+        self.assertEqual(backend.events[0].args[:2], (110, 70))
+        self.assertEqual(backend.position(), (10, 20))
+    
+    def test_bot_uses_region(self):
+        """测试机器人找到游戏区域后只截取该区域，弹窗和策略坐标按区域换算"""
+        with patch('florr_afk_bot.Config') as mock_config_class:
+            mock_config = MagicMock()
+            mock_config.get.side_effect = lambda key, default=None: {
+                "auto_region": True,
+                "area": "sewers",
+            }.get(key, default)
+            mock_config_class.return_value = mock_config
+            bot = florr_afk_bot.FlorAFKBot(clock=florr_afk_clock.VirtualClock())
+        frames = iter([_desktop_frame(t) for t in (0.0, 0.2, 0.4)])
+        bot.image_recognition.capture_full_screen = lambda: next(frames)
+        try:
+            bot._locate_region()
+        finally:
+            bot.clock.close()
+        
+        self.assertEqual(bot.screen_region, (100, 100, 900, 520))
+        self.assertEqual(bot.image_recognition.screen_region, (100, 100, 900, 520))
+        self.assertEqual(bot.strategy.origin, (100, 100))
+        self.assertEqual(florr_afk_region.to_screen((10, 20), bot.screen_region), (110, 120))
+
+
+class TestIdleProbe(unittest.TestCase):
+    """测试空闲检测和挂起"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.now = [0.0]
+        self.probe = florr_afk_idle.IdleProbe(static_seconds=10.0, clock=lambda: self.now[0])
+    
+    def test_hidden_frame(self):
+        """测试纯色画面为不可见，有内容的画面为正常"""
+        self.assertEqual(self.probe.check(np.zeros((720, 1280, 3), dtype=np.uint8)), "hidden")
+        self.assertEqual(self.probe.check(_desktop_frame(0.0)), "normal")
+        # 没有截图时保持上一次的结果
+        self.assertEqual(self.probe.check(None), "normal")
+    
+    def test_static_frame(self):
+        """测试画面持续不变时为静止，画面一变化立即恢复正常"""
+        frame = _desktop_frame(0.0)
+        self.assertEqual(self.probe.check(frame), "normal")
+        self.now[0] = 9.0
+        self.assertEqual(self.probe.check(frame.copy()), "normal")
+        self.now[0] = 10.0
+        self.assertEqual(self.probe.check(frame.copy()), "static")
+        self.now[0] = 20.0
+        self.assertEqual(self.probe.check(_desktop_frame(1.0)), "normal")
+        # 重新开始计时
+        self.now[0] = 25.0
+        self.assertEqual(self.probe.check(_desktop_frame(1.0)), "normal")
+    
+    def test_bot_suspends_and_resumes(self):
+        """测试机器人在画面静止时挂起并放慢截图，画面恢复时立即回到正常频率"""
+        with patch('florr_afk_bot.Config') as mock_config_class:
+            mock_config = MagicMock()
+            mock_config.get.side_effect = lambda key, default=None: {
+                "capture_interval": 0.5,
+                "idle_suspend": True,
+                "idle_interval": 5.0,
+            }.get(key, default)
+            mock_config_class.return_value = mock_config
+            bot = florr_afk_bot.FlorAFKBot()
+        bot.frame_producer = MagicMock()
+        
+        # 空闲状态不需要恢复
+        self.assertTrue(bot._update_suspension("static"))
+        self.assertEqual(bot.suspended, "static")
+        self.assertEqual(bot._capture_interval(), 5.0)
+        self.assertTrue(bot._update_suspension("hidden"))
+        self.assertEqual(bot.suspensions, 1)
+        
+        self.assertFalse(bot._update_suspension("normal"))
+        self.assertIsNone(bot.suspended)
+        self.assertEqual(bot._capture_interval(), 0.5)
+        bot.frame_producer.wake.assert_called_once()
+        
+        # 没有开启时只记录，不挂起
+        bot.idle_suspend = False
+        self.assertTrue(bot._update_suspension("hidden"))
+        self.assertIsNone(bot.suspended)
+    
+    def test_producer_wake(self):
+        """测试唤醒截图线程后立即截下一帧，不必等截图间隔结束"""
+        producer = florr_afk_frames.FrameProducer(lambda: np.zeros((4, 4, 3), dtype=np.uint8), 60.0)
+        producer.start()
+        try:
+            first = producer.wait_for(0, timeout=5.0)
+            producer.wake()
+            self.assertIsNotNone(producer.wait_for(first.seq, timeout=5.0))
+        finally:
+            producer.stop()
+
+
+class TestLazyImport(unittest.TestCase):
+    """测试延迟导入和启动耗时"""
+    
+    def test_lazy_module(self):
+        """测试第一次使用时才导入，读写属性和 patch 都作用在真正的模块上"""
+        lazy = florr_afk_lazy.LazyModule("colorsys")
+        self.assertFalse(lazy.loaded)
+        self.assertEqual(lazy.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+        self.assertTrue(lazy.loaded)
+        
+        import colorsys
+        with patch.object(lazy, "rgb_to_hsv", return_value="patched"):
+            self.assertEqual(colorsys.rgb_to_hsv(1.0, 0.0, 0.0), "patched")
+        self.assertEqual(colorsys.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+        # 已经导入的模块直接返回
+        self.assertIs(florr_afk_lazy.lazy_import("colorsys"), colorsys)
+    
+    def test_bot_import_is_light(self):
+        """测试导入机器人模块时不导入numpy、OpenCV、输入库和asyncio"""
+        heavy = ["numpy", "cv2", "pyautogui", "keyboard", "asyncio", "http.server", "cProfile"]
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                          env.get("PYTHONPATH")]))
+        # 导入时会创建日志文件，在临时目录中运行
+        with tempfile.TemporaryDirectory() as directory:
+            completed = subprocess.run(
+                [sys.executable, "-c", f"import sys, florr_afk_bot; print([m for m in {heavy!r} if m in sys.modules])"],
+                cwd=directory, env=env, capture_output=True, text=True
+            )
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        self.assertEqual(completed.stdout.strip(), "[]")
+    
+    def test_parse_import_times(self):
+        """测试按顶层包汇总 -X importtime 的输出"""
+        text = "\n".join([
+            "import time: self [us] | cumulative | imported package",
+            "import time:      1500 |       1500 |     numpy._core",
+            "import time:       500 |       2000 |   numpy",
+            "import time:       250 |       2250 | florr_afk_bot",
+            "unrelated line",
+        ])
+        times = florr_afk_benchmark.parse_import_times(text)
+        self.assertAlmostEqual(times["numpy"], 0.002)
+        self.assertAlmostEqual(times["florr_afk_bot"], 0.00025)
+
+
+class TestFrameProducer(unittest.TestCase):
+    """测试共享截图模块"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.capture = MagicMock(side_effect=lambda: np.zeros((60, 80, 3), dtype=np.uint8))
+        self.producer = florr_afk_frames.FrameProducer(self.capture, interval=0.01)
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.producer.stop()
+    
+    def test_subscribers_share_frames(self):
+        """测试多个订阅者拿到同一帧，截图次数不随订阅者增加"""
+        self.producer.start()
+        first = self.producer.subscribe()
+        second = self.producer.subscribe()
+        
+        frame_a = first.next(timeout=1)
+        frame_b = second.next(timeout=1)
+        self.assertIsNotNone(frame_a)
+        self.assertIsNotNone(frame_b)
+        self.assertLessEqual(frame_a.seq, frame_b.seq)
+        if frame_a.seq == frame_b.seq:
+            # 同一序号对应同一张图像
+            self.assertIs(frame_a.image, frame_b.image)
+        
+        frame_c = first.next(timeout=1)
+        self.assertGreater(frame_c.seq, frame_a.seq)
+        self.producer.stop()
+        latest = self.producer.latest()
+        self.assertEqual(self.capture.call_count, latest.seq)
+    
+    def test_wait_for_timeout_and_stop(self):
+        """测试未启动时等待超时，停止后不再阻塞"""
+        self.assertIsNone(self.producer.wait_for(0, timeout=0.05))
+        
+        self.producer.start()
+        frame = self.producer.wait_for(0, timeout=1)
+        self.assertEqual(frame.image.shape, (60, 80, 3))
+        
+        self.producer.stop()
+        self.assertIsNone(self.producer.wait_for(frame.seq + 100, timeout=1))
+    
+    def test_main_loop_uses_shared_frame(self):
+        """测试主循环把共享截图传给弹窗检测"""
+        with patch('florr_afk_bot.Config') as mock_config_class:
+            mock_config = MagicMock()
+            mock_config.get.side_effect = lambda key, default=None: {
+                "run_time": 0,
+                "capture_interval": 0.01,
+                "movement_interval": [0.0, 0.0]
+            }.get(key, default)
+            mock_config_class.return_value = mock_config
+            bot = florr_afk_bot.FlorAFKBot()
+        
+        bot.image_recognition = MagicMock()
+        bot.input_controller = MagicMock()
+        bot.strategy = MagicMock()
+        bot.frame_producer = self.producer
+        bot.frame_subscription = self.producer.subscribe()
+        self.producer.start()
+        
+        bot.image_recognition.detect_afk_popup.side_effect = [None, None, KeyboardInterrupt]
+        bot.running = True
+        with self.assertRaises(KeyboardInterrupt):
+            bot._main_loop()
+        
+        for call in bot.image_recognition.detect_afk_popup.call_args_list:
+            self.assertEqual(call[0][0].shape, (60, 80, 3))
+
+
+class TestDetectorRegistry(unittest.TestCase):
+    """测试检测器注册表"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.registry = florr_afk_detectors.DetectorRegistry(max_workers=4)
+        self.frame = np.zeros((200, 300, 3), dtype=np.uint8)
+        self.frame[50:90, 100:180] = (0, 0, 230)
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.registry.shutdown()
+    
+    def test_priority_merge(self):
+        """测试多个检测器命中时取优先级最高的结果"""
+        self.registry.register("low", lambda frame: (1, 1), priority=1)
+        self.registry.register("high", lambda frame: (2, 2), priority=5)
+        self.registry.register("miss", lambda frame: None, priority=10)
+        
+        decision = self.registry.run(self.frame)
+        
+        self.assertEqual(decision.name, "high")
+        self.assertEqual(decision.result, (2, 2))
+        self.assertEqual(decision.results, {"low": (1, 1), "high": (2, 2), "miss": None})
+        self.assertIn("miss", decision.timings)
+    
+    def test_short_circuit_skips_lower_priority(self):
+        """测试按优先级短路时，高优先级命中后不再运行低优先级的检测器"""
+        registry = florr_afk_detectors.DetectorRegistry(short_circuit=True)
+        calls = []
+        button = [None]
+        registry.register("ready", lambda frame: button[0], priority=3)
+        registry.register("continue", lambda frame: None, priority=2)
+        registry.register("maze", lambda frame: calls.append(1) or (5, 5), priority=1, threaded=False)
+        try:
+            button[0] = (10, 10)
+            decision = registry.run(self.frame)
+            self.assertEqual(decision.name, "ready")
+            self.assertEqual(decision.results, {"ready": (10, 10), "continue": None})
+            self.assertEqual(calls, [])
+            
+            button[0] = None
+            decision = registry.run(self.frame)
+            self.assertEqual(decision.name, "maze")
+            self.assertEqual(decision.result, (5, 5))
+            self.assertEqual(calls, [1])
+        finally:
+            registry.shutdown()
+    
+    def test_shared_preprocessing_computed_once(self):
+        """测试多个检测器声明同一输入时预处理只计算一次"""
+        calls = []
+        
+        def count_hsv(image):
+            calls.append(1)
+            return cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        
+        self.registry.add_preprocessor("hsv", count_hsv)
+        for i in range(4):
+            self.registry.register(f"d{i}", lambda frame: frame.hsv.shape, inputs=("hsv",))
+        
+        decision = self.registry.run(self.frame)
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(decision.result, (200, 300, 3))
+    
+    def test_roi_and_template(self):
+        """测试ROI裁剪和模板匹配返回全图坐标"""
+        template = self.frame[40:100, 90:190].copy()
+        self.registry.register_template("button", template, roi=(50, 20, 200, 120))
+        self.registry.register("roi", lambda frame: (frame.offset, frame.gray.shape),
+                               inputs=("gray",), roi=(50, 20, 200, 120), priority=-1)
+        
+        decision = self.registry.run(self.frame)
+        
+        self.assertEqual(decision.name, "button")
+        self.assertEqual(decision.result, (140, 70))
+        self.assertEqual(decision.results["roi"], ((50, 20), (120, 200)))
+        self.assertIsNone(self.registry.run(None).name)
+    
+    def test_detector_error_propagates(self):
+        """测试检测器抛出的异常传递给调用者"""
+        self.registry.register("ok", lambda frame: None)
+        
+        def broken(frame):
+            raise KeyboardInterrupt
+        
+        self.registry.register("broken", broken)
+        with self.assertRaises(KeyboardInterrupt):
+            self.registry.run(self.frame)
+
+
+class TestFramePipeline(unittest.TestCase):
+    """测试截图/求解/执行流水线"""
+    
+    def frames(self, values):
+        """按顺序返回左上角像素为给定值的帧，用完后返回None"""
+        frames = iter(values)
+        
+        def capture():
+            value = next(frames, None)
+            if value is None:
+                return None
+            frame = np.zeros((20, 30, 3), dtype=np.uint8)
+            frame[0, 0, 0] = value
+            return frame
+        return capture
+    
+    def test_process_pool_shared_memory(self):
+        """测试工作进程通过共享内存读取帧"""
+        acted = []
+        pipeline = florr_afk_pipeline.FramePipeline(
+            self.frames([0, 0, 7, 0]), _frame_marker, acted.append, workers=1)
+        calls = []
+        pipeline.run(should_stop=lambda: calls.append(1) or len(calls) > 5)
+        
+        self.assertEqual(acted, [7])
+        report = pipeline.report()
+        self.assertEqual(report["capture"]["count"], 4)
+        self.assertEqual(report["solve"]["count"], 4)
+        self.assertEqual(report["act"]["count"], 1)
+    
+    def test_stale_results_dropped(self):
+        """测试截图早于上一次操作结束的结果被丢弃"""
+        acted = []
+        
+        def act(value):
+            acted.append(value)
+            time.sleep(0.2)
+        
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            pipeline = florr_afk_pipeline.FramePipeline(
+                self.frames([1, 2, 3]), _frame_marker, act, workers=2, executor=executor)
+            calls = []
+            pipeline.run(should_stop=lambda: calls.append(1) or len(calls) > 3)
+        
+        # 三帧几乎同时截取，第一个执行的操作使另外两帧过期
+        self.assertEqual(len(acted), 1)
+        self.assertEqual(pipeline.stats["act"].dropped, 2)
+    
+    def test_depth_capped_by_workers(self):
+        """测试截图时在途的帧不超过工作进程数，新帧不会在多个忙碌的求解后面排队"""
+        in_flight = []
+        
+        def capture():
+            ring = pipeline._ring
+            in_flight.append(ring.in_use if ring is not None else 0)
+            return np.zeros((20, 30, 3), dtype=np.uint8)
+        
+        def solve(frame):
+            time.sleep(0.05)
+            return None
+        
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            pipeline = florr_afk_pipeline.FramePipeline(capture, solve, lambda value: None, slots=4,
+                                                        executor=executor)
+            calls = []
+            pipeline.run(should_stop=lambda: calls.append(1) or len(calls) > 10)
+        
+        self.assertEqual(max(in_flight), 1)
+        self.assertEqual(pipeline.stats["solve"].count, len(in_flight))
+    
+    def test_solve_error_propagates(self):
+        """测试求解出错时流水线停止并抛出异常"""
+        def broken(frame):
+            raise ValueError("bad frame")
+        
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pipeline = florr_afk_pipeline.FramePipeline(
+                self.frames([1] * 100), broken, lambda value: None, executor=executor)
+            with self.assertRaises(ValueError):
+                pipeline.run()
+
+
+class TestCpuGovernor(unittest.TestCase):
+    """测试CPU预算调节模块"""
+    
+    def setUp(self):
+        """测试前准备: 手动推进的时钟和CPU时间"""
+        self.now = [0.0]
+        self.cpu = [0.0]
+        self.governor = florr_afk_governor.CpuGovernor(budget=0.5, window=5.0, clock=lambda: self.now[0],
+                                                       cpu=lambda: self.cpu[0])
+    
+    def run_for(self, seconds, share):
+        """按 share 的CPU占用经过 seconds 秒，然后更新"""
+        self.now[0] += seconds
+        self.cpu[0] += seconds * share
+        return self.governor.update()
+    
+    def test_levels_follow_share(self):
+        """测试超出预算时逐级节流，回落到预算的 low 倍以下时逐级恢复，中间保持不变"""
+        # 不足一个周期不计算
+        self.assertFalse(self.run_for(1.0, 1.0))
+        self.assertTrue(self.run_for(4.0, 1.0))
+        self.assertEqual(self.governor.level, 1)
+        self.assertAlmostEqual(self.governor.share, 1.0)
+        self.assertAlmostEqual(self.governor.interval(0.5), 0.75)
+        self.assertAlmostEqual(self.governor.interval(0.0), 0.1)
+        
+        self.assertFalse(self.run_for(5.0, 0.45))
+        self.assertEqual(self.governor.level, 1)
+        self.assertTrue(self.run_for(5.0, 0.2))
+        self.assertEqual(self.governor.level, 0)
+        self.assertEqual(self.governor.interval(0.5), 0.5)
+        
+        for _ in range(20):
+            self.run_for(5.0, 1.0)
+        self.assertEqual(self.governor.level, len(self.governor.LEVELS) - 1)
+        state = self.governor.state()
+        self.assertEqual(state["depth"], 1)
+        self.assertEqual(state["scale"], 0.5)
+        self.assertEqual(self.governor.changes, len(self.governor.LEVELS) + 1)
+        
+        # 取消预算后恢复
+        self.governor.budget = 0.0
+        self.run_for(5.0, 1.0)
+        self.assertEqual(self.governor.level, len(self.governor.LEVELS) - 2)
+    
+    def test_worker_cpu_counted(self):
+        """测试工作进程的CPU时间计入份额"""
+        self.governor.add_cpu(5.0)
+        self.assertTrue(self.run_for(5.0, 0.0))
+        self.assertAlmostEqual(self.governor.share, 1.0)
+        self.assertEqual(self.governor.level, 1)
+    
+    def test_pipeline_depth_limited(self):
+        """测试节流级别限制流水线同时求解的帧数"""
+        self.governor.LEVELS = ((1.0, 0.0, 1.0, 1),)
+        active, peak = [0], [0]
+        lock = threading.Lock()
+        
+        def solve(frame):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            return None
+        
+        frames = iter(range(6))
+        capture = lambda: np.zeros((20, 30, 3), dtype=np.uint8) if next(frames, None) is not None else None
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            pipeline = florr_afk_pipeline.FramePipeline(capture, solve, lambda value: None, slots=3,
+                                                        executor=executor, governor=self.governor)
+            calls = []
+            pipeline.run(should_stop=lambda: calls.append(1) or len(calls) > 8)
+        
+        self.assertEqual(pipeline.stats["solve"].count, 6)
+        self.assertEqual(peak[0], 1)
+    
+    def test_bot_applies_level(self):
+        """测试机器人按节流级别调整截图间隔和弹窗粗检的缩放比例"""
+        with patch('florr_afk_bot.Config') as mock_config_class:
+            mock_config = MagicMock()
+            mock_config.get.side_effect = lambda key, default=None: {
+                "capture_interval": 0.5,
+                "popup_scale": 0.5,
+                "cpu_budget": 0.5,
+            }.get(key, default)
+            mock_config_class.return_value = mock_config
+            bot = florr_afk_bot.FlorAFKBot()
+        bot.image_recognition = MagicMock()
+        self.governor.level = 1
+        bot.governor = self.governor
+        
+        self.now[0] += 5.0
+        self.cpu[0] += 5.0
+        bot._govern()
+        self.assertEqual(self.governor.level, 2)
+        self.assertAlmostEqual(bot.image_recognition.popup_scale, 0.375)
+        self.assertAlmostEqual(bot._capture_interval(), 1.0)
+
+
+class TestTimings(unittest.TestCase):
+    """测试热路径耗时统计"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.timings = florr_afk_timing.Timings()
+    
+    def test_histogram_percentiles(self):
+        """测试直方图百分位数落在正确的桶内"""
+        histogram = florr_afk_timing.LatencyHistogram()
+        for _ in range(90):
+            histogram.record(0.001)
+        for _ in range(10):
+            histogram.record(0.1)
+        
+        summary = histogram.summary()
+        self.assertEqual(summary["count"], 100)
+        self.assertAlmostEqual(summary["p50_ms"], 1.0, delta=0.3)
+        self.assertAlmostEqual(summary["p99_ms"], 100.0, delta=26)
+        self.assertAlmostEqual(summary["max_ms"], 100.0)
+    
+    def test_disabled_span_records_nothing(self):
+        """测试未启用时span为共享的空上下文"""
+        self.assertIs(self.timings.span("capture_screen"), self.timings.span("detect_afk_popup"))
+        with self.timings.span("capture_screen"):
+            pass
+        self.assertEqual(self.timings.summary(), {})
+    
+    def test_span_and_timed(self):
+        """测试启用后span和装饰器记录耗时"""
+        self.timings.enabled = True
+        
+        @self.timings.timed("detect")
+        def detect():
+            return 42
+        
+        with self.timings.span("capture"):
+            time.sleep(0.01)
+        self.assertEqual(detect(), 42)
+        
+        summary = self.timings.summary()
+        self.assertEqual(summary["detect"]["count"], 1)
+        self.assertGreaterEqual(summary["capture"]["max_ms"], 10.0)
+    
+    def test_dump(self):
+        """测试退出时写入JSON"""
+        import json
+        
+        reports = []
+        self.timings.report = reports.append
+        self.timings.record("capture", 0.02)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "timing.json")
+            self.timings.dump(path)
+            with open(path) as f:
+                data = json.load(f)
+        
+        self.assertEqual(data["stages"]["capture"]["count"], 1)
+        self.assertEqual(sum(data["stages"]["capture"]["buckets"]), 1)
+        self.assertIn("capture", reports[0])
+
+
+class TestMetrics(unittest.TestCase):
+    """测试运行指标和指标接口"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.now = [100.0]
+        self.metrics = florr_afk_metrics.Metrics(rate_window=30.0, clock=lambda: self.now[0])
+    
+    def test_counters_and_rates(self):
+        """测试计数器速率按窗口内最早的读取计算"""
+        captured = [0]
+        self.metrics.counter_func("frames_captured", lambda: captured[0])
+        self.metrics.inc("loop_iterations", 10)
+        self.now[0] += 10
+        
+        first = self.metrics.snapshot()
+        self.assertEqual(first["counters"]["loop_iterations"], 10)
+        self.assertAlmostEqual(first["rates"]["loop_iterations"], 1.0)
+        
+        self.metrics.inc("loop_iterations", 20)
+        captured[0] = 40
+        self.now[0] += 10
+        second = self.metrics.snapshot()
+        self.assertAlmostEqual(second["rates"]["loop_iterations"], 2.0)
+        self.assertAlmostEqual(second["rates"]["frames_captured"], 4.0)
+        self.assertAlmostEqual(second["gauges"]["uptime_seconds"], 20.0)
+    
+    def test_prometheus_format(self):
+        """测试Prometheus文本格式包含计数器、仪表和延迟分位数"""
+        self.metrics.inc("popups_clicked")
+        self.metrics.set("paused", 0)
+        self.metrics.observe("detection_latency", 0.004)
+        self.now[0] += 1
+        
+        text = self.metrics.to_prometheus()
+        self.assertIn("florr_afk_popups_clicked_total 1\n", text)
+        self.assertIn("florr_afk_paused 0\n", text)
+        self.assertIn('florr_afk_detection_latency_seconds{quantile="0.95"}', text)
+        self.assertIn("florr_afk_detection_latency_seconds_count 1\n", text)
+    
+    def test_http_endpoint(self):
+        """测试本地HTTP接口"""
+        import json
+        from urllib.request import urlopen
+        
+        self.metrics.inc("recoveries", 2)
+        server = florr_afk_metrics.MetricsServer(self.metrics, port=0)
+        port = server.start()
+        try:
+            with urlopen(f"http://127.0.0.1:{port}/metrics.json", timeout=5) as response:
+                data = json.loads(response.read())
+            with urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+                text = response.read().decode()
+        finally:
+            server.stop()
+        
+        self.assertEqual(data["counters"]["recoveries"], 2)
+        self.assertIn("florr_afk_recoveries_total 2", text)
+    
+    def test_main_loop_counts(self):
+        """测试主循环更新迭代次数和弹窗计数"""
+        with patch('florr_afk_bot.Config') as mock_config_class:
+            mock_config = MagicMock()
+            mock_config.get.side_effect = lambda key, default=None: {
+                "run_time": 0,
+                "movement_interval": [0.0, 0.0]
+            }.get(key, default)
+            mock_config_class.return_value = mock_config
+            bot = florr_afk_bot.FlorAFKBot()
+        
+        bot.image_recognition = MagicMock()
+        bot.input_controller = MagicMock()
+        bot.strategy = MagicMock()
+        bot.image_recognition.capture_screen.return_value = np.zeros((60, 80, 3), dtype=np.uint8)
+        bot.image_recognition.detect_afk_popup.side_effect = [(10, 20), None, KeyboardInterrupt]
+        bot.running = True
+        with patch('florr_afk_bot.time.sleep'), self.assertRaises(KeyboardInterrupt):
+            bot._main_loop()
+        
+        counters = bot.metrics.snapshot()["counters"]
+        self.assertEqual(counters["loop_iterations"], 3)
+        self.assertEqual(counters["popups_detected"], 1)
+        self.assertEqual(counters["popups_clicked"], 1)
+        self.assertEqual(bot.metrics.snapshot()["histograms"]["detection_latency"]["count"], 2)
+
+
+class TestProfileTrigger(unittest.TestCase):
+    """测试按需性能分析"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.directory = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        """测试后清理"""
+        import shutil
+        shutil.rmtree(self.directory)
+    
+    def busy(self):
+        return sum(i * i for i in range(20000))
+    
+    def test_idle_tick_does_nothing(self):
+        """测试未触发时不分析"""
+        trigger = florr_afk_profile.ProfileTrigger(iterations=2, directory=self.directory)
+        for _ in range(5):
+            trigger.tick()
+        self.assertFalse(trigger.active)
+        self.assertEqual(os.listdir(self.directory), [])
+    
+    def test_cprofile_next_iterations(self):
+        """测试触发后分析接下来N次迭代并写入文件"""
+        trigger = florr_afk_profile.ProfileTrigger(iterations=3, directory=self.directory)
+        trigger.request()
+        ticks = 0
+        while ticks < 10:
+            trigger.tick()
+            ticks += 1
+            if ticks <= 3:
+                self.assertTrue(trigger.active)
+            self.busy()
+        
+        self.assertFalse(trigger.active)
+        self.assertTrue(trigger.last_output.endswith(".prof"))
+        with open(trigger.last_output[:-5] + ".txt") as f:
+            self.assertIn("busy", f.read())
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name.endswith(".prof")]), 1)
+    
+    def test_sample_mode(self):
+        """测试采样模式写入折叠调用栈"""
+        trigger = florr_afk_profile.ProfileTrigger(iterations=2, mode="sample", directory=self.directory,
+                                                   sample_interval=0.001)
+        trigger.request()
+        for _ in range(3):
+            trigger.tick()
+            end = time.perf_counter() + 0.05
+            while time.perf_counter() < end:
+                self.busy()
+        
+        with open(trigger.last_output) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(trigger.last_output.endswith(".folded"))
+        self.assertTrue(any("busy" in line for line in lines))
+    
+    def test_cprofile_samples_worker_threads(self):
+        """测试 cprofile 模式同时对其他线程采样，连续两次分析不会覆盖同名文件"""
+        stop = threading.Event()
+        
+        def worker_busy():
+            while not stop.is_set():
+                self.busy()
+        
+        worker = threading.Thread(target=worker_busy, daemon=True)
+        worker.start()
+        trigger = florr_afk_profile.ProfileTrigger(iterations=2, directory=self.directory, sample_interval=0.001)
+        try:
+            outputs = []
+            for _ in range(2):
+                trigger.request()
+                for _ in range(3):
+                    trigger.tick()
+                    time.sleep(0.05)
+                outputs.append(trigger.last_output)
+        finally:
+            stop.set()
+            worker.join()
+        
+        self.assertNotEqual(outputs[0], outputs[1])
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name.endswith(".prof")]), 2)
+        with open(outputs[0][:-5] + ".folded") as f:
+            self.assertTrue(any("worker_busy" in line for line in f))
+    
+    @unittest.skipUnless(hasattr(florr_afk_profile.signal, "SIGUSR1"), "需要SIGUSR1")
+    def test_signal_trigger(self):
+        """测试收到信号后开始分析"""
+        import signal
+        trigger = florr_afk_profile.ProfileTrigger(iterations=1, directory=self.directory)
+        previous = signal.getsignal(signal.SIGUSR1)
+        try:
+            self.assertTrue(trigger.install_signal())
+            os.kill(os.getpid(), signal.SIGUSR1)
+            trigger.tick()
+            self.assertTrue(trigger.active)
+            trigger.tick()
+        finally:
+            signal.signal(signal.SIGUSR1, previous)
+        self.assertIsNotNone(trigger.last_output)
+
+
 class TestInputController(unittest.TestCase):
     """测试输入控制模块"""
     
@@ -170,10 +1421,7 @@ class TestInputController(unittest.TestCase):
         self.assertEqual(mock_sleep.call_count, 1)
         mock_sleep.assert_called_once_with(0.5)
     
-    @patch('florr_afk_bot.InputController.press_key')
-    @patch('florr_afk_bot.InputController.click')
-    @patch('florr_afk_bot.time.sleep')
-    def test_execute_movement_pattern(self, mock_sleep, mock_click, mock_press_key):
+    def test_execute_movement_pattern(self):
         """测试执行移动模式功能"""
         # 创建测试模式
         pattern = [
@@ -182,13 +1430,541 @@ class TestInputController(unittest.TestCase):
             ("wait", 1.0)
         ]
         
-        # 调用执行方法
-        self.input_controller.execute_movement_pattern(pattern)
+        # 等待在虚拟时钟上进行，不需要替换time.sleep
+        clock = florr_afk_clock.VirtualClock()
+        backend = florr_afk_input.RecordingBackend(clock=clock.monotonic, realtime=True, sleep=clock.sleep)
+        controller = florr_afk_bot.InputController(self.mock_config, backend, clock)
+        try:
+            report = controller.execute_movement_pattern(pattern)
+        finally:
+            clock.close()
         
-        # 验证结果
-        mock_press_key.assert_called_once_with("w", 0.5)
-        mock_click.assert_called_once_with(400, 300, 'left')
-        self.assertEqual(mock_sleep.call_count, 3)  # 按键间隔 + 点击后等待 + wait指令
+        # 验证结果: 按键、移动、点击依次执行，都准时
+        self.assertEqual([event.kind for event in backend.events],
+                         ["key_down", "key_up", "move", "mouse_down", "mouse_up"])
+        self.assertEqual(backend.events[1].timestamp - backend.events[0].timestamp, 0.5)
+        self.assertEqual(backend.events[2].timestamp, 0.6)
+        x, y, _ = backend.events[2].args
+        self.assertTrue(395 <= x <= 405 and 295 <= y <= 305)
+        self.assertEqual(report.executed, 5)
+        self.assertAlmostEqual(report.summary()["max_ms"], 0.0)
+        # 按键间隔 + 移动和点击 + 点击后等待(0.1~0.3秒) + wait指令
+        self.assertTrue(1.8 <= clock.monotonic() <= 2.3)
+
+
+class TestInputBackend(unittest.TestCase):
+    """测试输入后端模块"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.mock_config = MagicMock()
+        self.mock_config.get.return_value = False
+        
+        # 使用录制后端，不注入真实事件
+        self.backend = florr_afk_input.RecordingBackend(size=(800, 600), clock=lambda: 100.0)
+        self.input_controller = florr_afk_bot.InputController(self.mock_config, backend=self.backend)
+    
+    def test_recording_backend_batch(self):
+        """测试录制后端批量提交与时间戳"""
+        with self.backend.batch():
+            self.backend.key_down('w')
+            self.backend.key_up('w', delay=0.5)
+            # 批量提交前不应有事件
+            self.assertEqual(self.backend.events, [])
+        
+        kinds = [event.kind for event in self.backend.events]
+        self.assertEqual(kinds, ["key_down", "key_up"])
+        self.assertAlmostEqual(self.backend.events[0].timestamp, 100.0)
+        self.assertAlmostEqual(self.backend.events[1].timestamp, 100.5)
+        self.assertEqual(self.backend.pressed_keys, set())
+    
+    def test_click_with_recording_backend(self):
+        """测试通过录制后端点击"""
+        result = self.input_controller.click(400, 300)
+        
+        self.assertTrue(result)
+        kinds = [event.kind for event in self.backend.events]
+        self.assertEqual(kinds, ["move", "mouse_down", "mouse_up"])
+        x, y = self.backend.position()
+        self.assertTrue(395 <= x <= 405)
+        self.assertTrue(295 <= y <= 305)
+        # 按下和释放之间有随机间隔
+        hold = self.backend.events[2].timestamp - self.backend.events[1].timestamp
+        self.assertTrue(0.01 <= hold <= 0.1)
+    
+    def test_press_key_with_recording_backend(self):
+        """测试通过录制后端按键"""
+        self.input_controller.press_key('a', 0.3)
+        
+        self.assertEqual([event.args for event in self.backend.events], [('a',), ('a',)])
+        hold = self.backend.events[1].timestamp - self.backend.events[0].timestamp
+        self.assertAlmostEqual(hold, 0.3)
+    
+    def test_recording_backend_realtime(self):
+        """测试录制后端按实际时间执行，时间戳来自时钟"""
+        backend = florr_afk_input.RecordingBackend(clock=time.perf_counter, realtime=True)
+        start = time.perf_counter()
+        backend.key_down('w')
+        backend.key_up('w', delay=0.05)
+        
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+        hold = backend.events[1].timestamp - backend.events[0].timestamp
+        self.assertGreaterEqual(hold, 0.05)
+    
+    def test_create_backend(self):
+        """测试按名称创建后端"""
+        backend = florr_afk_input.create_backend("recording", keys="pyautogui")
+        self.assertIsInstance(backend, florr_afk_input.RecordingBackend)
+        
+        # 未知后端回退到PyAutoGUI
+        backend = florr_afk_input.create_backend("unknown")
+        self.assertIsInstance(backend, florr_afk_input.PyAutoGUIBackend)
+    
+    def test_pyautogui_tuning_restored(self):
+        """测试PyAutoGUI后端只在发送事件期间去掉固定停顿，之后恢复原来的设置"""
+        fake = MagicMock(PAUSE=0.1, MINIMUM_DURATION=0.1, MINIMUM_SLEEP=0.05)
+        seen = []
+        fake.moveTo.side_effect = lambda *args, **kwargs: seen.append(
+            (fake.PAUSE, fake.MINIMUM_DURATION, fake.MINIMUM_SLEEP))
+        with patch('florr_afk_input.pyautogui', fake):
+            backend = florr_afk_input.PyAutoGUIBackend(keys="pyautogui")
+            self.assertEqual(fake.PAUSE, 0.1)
+            
+            with backend.batch():
+                backend.move_to(10, 20)
+                backend.mouse_down()
+                backend.mouse_up()
+        
+        self.assertEqual(seen, [(0, 0, 0)])
+        self.assertEqual((fake.PAUSE, fake.MINIMUM_DURATION, fake.MINIMUM_SLEEP), (0.1, 0.1, 0.05))
+        fake.mouseDown.assert_called_once_with(button="left")
+
+
+class TestVirtualClock(unittest.TestCase):
+    """测试虚拟时钟和模拟运行"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.clock = florr_afk_clock.VirtualClock(epoch=1000.0)
+        self.clock.register()
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.clock.close()
+    
+    def test_threads_interleave_in_virtual_time(self):
+        """测试多个线程的等待按虚拟时间交错，不真正等待"""
+        log = []
+        
+        def worker(name, step, count):
+            for _ in range(count):
+                self.clock.sleep(step)
+                log.append((self.clock.monotonic(), name))
+        
+        threads = [threading.Thread(target=worker, args=("a", 1.0, 4)),
+                   threading.Thread(target=worker, args=("b", 1.5, 2))]
+        for thread in threads:
+            self.clock.register(thread)
+            thread.start()
+        started = time.perf_counter()
+        self.clock.sleep(10)
+        for thread in threads:
+            thread.join()
+        
+        self.assertLess(time.perf_counter() - started, 2.0)
+        self.assertEqual(self.clock.monotonic(), 10.0)
+        self.assertEqual(self.clock.time(), 1010.0)
+        self.assertEqual(sorted(log), [(1.0, "a"), (1.5, "b"), (2.0, "a"), (3.0, "a"), (3.0, "b"), (4.0, "a")])
+    
+    def test_frame_producer_on_virtual_clock(self):
+        """测试共享截图按虚拟时间的间隔截图，等待新帧时推进虚拟时间"""
+        captures = []
+        producer = florr_afk_frames.FrameProducer(lambda: captures.append(self.clock.monotonic()) or captures[-1],
+                                                  0.5, self.clock.monotonic, self.clock)
+        producer.start()
+        subscription = producer.subscribe()
+        frames = [subscription.next(timeout=5.0) for _ in range(3)]
+        self.clock.sleep(2.0)
+        producer.stop()
+        
+        self.assertEqual([frame.image for frame in frames], [0.0, 0.5, 1.0])
+        self.assertEqual(captures[:5], [0.0, 0.5, 1.0, 1.5, 2.0])
+    
+    def test_simulated_bot_run(self):
+        """测试用虚拟时钟运行机器人: 半小时的主循环、弹窗和恢复在几秒内完成"""
+        self.clock.close()
+        started = time.perf_counter()
+        result = florr_afk_benchmark.simulate_bot(hours=0.5, popup_interval=120.0, fault_interval=300.0,
+                                                  settings={"movement_interval": [1.0, 2.0]}, seed=3)
+        
+        self.assertLess(time.perf_counter() - started, 60.0)
+        self.assertGreaterEqual(result["virtual_seconds"], 1800.0)
+        # 指标的运行时长按虚拟时间计算
+        self.assertAlmostEqual(result["uptime_seconds"], result["virtual_seconds"], delta=60.0)
+        self.assertGreater(result["loop_iterations"], 300)
+        self.assertGreater(result["popups_shown"], 0)
+        self.assertEqual(result["popups_resolved"] + result["popup_timeouts"], result["popups_shown"])
+        self.assertGreater(result["faults"], 0)
+        self.assertEqual(result["recoveries"], result["faults"])
+        # 监控线程按检查间隔运行，恢复期间的等待除外
+        self.assertLessEqual(result["monitor_gap"]["p50_ms"], 5000.0 + 1e-6)
+
+
+class TestEndToEndBenchmark(unittest.TestCase):
+    """测试端到端基准"""
+    
+    def test_click_times(self):
+        """测试从录制事件中计算首次输入和完成时刻"""
+        backend = florr_afk_input.RecordingBackend(clock=lambda: 10.0)
+        backend.move_to(50, 50, 0.1)
+        backend.move_to(110, 210, 0.2)
+        backend.mouse_down()
+        backend.mouse_up(delay=0.05)
+        
+        first, done = florr_afk_benchmark.click_times(backend.events, 10.0, (100, 200, 120, 45))
+        self.assertAlmostEqual(first, 10.3)
+        self.assertAlmostEqual(done, 10.35)
+        # 在检查出现之前的输入不计入
+        self.assertEqual(florr_afk_benchmark.click_times(backend.events, 11.0, (100, 200, 120, 45)), (None, None))
+    
+    def test_bot_resolves_popup(self):
+        """测试机器人在假屏幕上解决弹窗，并按SLO判断结果"""
+        result = florr_afk_benchmark.e2e_bot(trials=2, runtime="asyncio", width=800, height=600,
+                                             timeout=10.0, movement_interval=(0.05, 0.1), lead=(0.1, 0.2))
+        
+        self.assertEqual(result["timeouts"], 0)
+        self.assertEqual(result["completion"]["count"], 2)
+        self.assertLessEqual(result["first_input"]["max_ms"], result["completion"]["max_ms"])
+        self.assertEqual(florr_afk_benchmark.check_slo(result, completion_p95=10.0), [])
+        self.assertEqual(len(florr_afk_benchmark.check_slo(result, completion_p95=0.0001)), 1)
+
+
+class TestNewAfkDrag(unittest.TestCase):
+    """测试 new_afk.py 边追踪边拖动的迷宫路径"""
+    
+    @classmethod
+    def setUpClass(cls):
+        """导入 new_afk.py，在迷宫求解模块中放入一段L形的已标记路径"""
+        cls.module = florr_afk_benchmark.load_new_afk()
+        cls.solver = cls.module.maze_solver
+    
+    def setUp(self):
+        """测试前准备"""
+        solver = self.solver
+        solver.geometry = solver.maze_geometry((1080, 1920))
+        solver.jump = solver.geometry.jump
+        solver.img = np.zeros(solver.geometry.canvas + (3,))
+        solver.vis = np.zeros(solver.geometry.canvas, dtype=bool)
+        solver.vis[500:506, 400:700] = True
+        solver.vis[500:800, 694:700] = True
+        self.start = (500, 400)
+        
+        self.backend = florr_afk_input.RecordingBackend(size=(1920, 1080))
+        self.backend.move_to(0, 0)
+        self.sent = []
+        self.backend.add_observer(lambda events: self.sent.append((time.perf_counter(), events)))
+        self.module.backend = self.backend
+        self.module.cursor = self.module.SystemCursor(self.backend)
+        self.produced = 0
+        self.points = []
+        self.trace_finished = None
+    
+    def traced(self, delay=0.0, fail_after=None):
+        """逐点追踪已标记的路径，每点等待 delay 秒，第 fail_after 个点时抛出 TraceOverflow"""
+        for i, point in enumerate(self.solver.trace_path(self.start)):
+            if i == fail_after:
+                raise self.solver.TraceOverflow("Maximum recursive exceeded!")
+            self.produced += 1
+            self.points.append(point)
+            time.sleep(delay)
+            yield point
+        self.trace_finished = time.perf_counter()
+    
+    def mouse_events(self):
+        return [kind for _, events in self.sent for kind, _, _ in events if kind.startswith("mouse")]
+    
+    def mouse_down_times(self):
+        return [sent for sent, events in self.sent for kind, _, _ in events if kind == "mouse_down"]
+    
+    def test_button_template_path(self):
+        """测试按钮模板按文件位置读取，缺失时报出文件路径"""
+        with tempfile.TemporaryDirectory() as directory:
+            cwd = os.getcwd()
+            os.chdir(directory)
+            try:
+                template = self.solver.load_template("Ready.PNG")
+                with self.assertRaisesRegex(FileNotFoundError, "missing.png"):
+                    self.solver.load_template("missing.png")
+            finally:
+                os.chdir(cwd)
+        self.assertEqual(template.ndim, 3)
+        self.assertIs(self.solver.load_template("Ready.PNG"), template)
+    
+    def test_stream_back_pressure(self):
+        """测试追踪线程最多领先 lookahead 个点，消费后继续"""
+        stream = self.module.WaypointStream(self.traced(), lookahead=4)
+        time.sleep(0.2)
+        # 队列中的4个点加上阻塞在 put 上的1个
+        self.assertEqual(self.produced, 5)
+        
+        points = list(stream)
+        self.assertEqual(points[0], self.start)
+        self.assertEqual(len(points), self.produced)
+        self.assertGreater(len(points), 20)
+        self.assertIsNotNone(self.trace_finished)
+    
+    def test_stream_propagates_trace_overflow(self):
+        """测试追踪失败时先交出已找到的点，再在消费方抛出 TraceOverflow"""
+        stream = self.module.WaypointStream(self.traced(fail_after=3))
+        points = []
+        with self.assertRaises(self.solver.TraceOverflow):
+            for point in stream:
+                points.append(point)
+        self.assertEqual(len(points), 3)
+    
+    def test_stream_close_while_tracer_blocked(self):
+        """测试消费方提前放弃时，阻塞在 put 上的追踪线程也会退出"""
+        stream = self.module.WaypointStream(self.traced(), lookahead=2)
+        for point in stream:
+            break
+        
+        self.assertFalse(stream._thread.is_alive())
+        self.assertLess(self.produced, 10)
+        self.assertIsNone(self.trace_finished)
+    
+    def test_cursor_moves_before_tracing_ends(self):
+        """测试追踪还没结束时鼠标已经移向起点，追踪结束后才点击和拖动"""
+        dragged = self.module.drag_path(self.module.WaypointStream(self.traced(delay=0.02)))
+        
+        self.assertIsNotNone(self.trace_finished)
+        self.assertLess(self.sent[0][0], self.trace_finished)
+        self.assertGreater(self.mouse_down_times()[0], self.trace_finished)
+        self.assertEqual(dragged[0], self.start)
+        # 跟随所有追踪到的点，最后沿末段方向多走4步
+        self.assertEqual(len(dragged), self.produced + 4)
+        self.assertEqual(self.mouse_events(), ["mouse_down", "mouse_up", "mouse_down", "mouse_up"])
+        self.assertEqual(self.backend.pressed_buttons, set())
+    
+    def test_overflowing_trace_never_dragged(self):
+        """测试追踪失败时不点击也不拖动，只把异常交给调用方"""
+        with self.assertRaises(self.solver.TraceOverflow):
+            self.module.drag_path(self.module.WaypointStream(self.traced(delay=0.02, fail_after=5)))
+        
+        self.assertGreater(len(self.sent), 0)
+        self.assertEqual(self.mouse_events(), [])
+        self.assertEqual(self.backend.pressed_buttons, set())
+    
+    def test_fit_pins_ends_and_follows_curve(self):
+        """测试样条两端固定在首尾点，平滑的点列拟合误差很小"""
+        angles = np.linspace(0, np.pi / 2, 30)
+        arc = np.c_[300 + 100 * np.cos(angles), 300 + 100 * np.sin(angles)]
+        curve = self.module.PathSmoother.fit(arc)
+        
+        np.testing.assert_allclose(curve(np.array([0.0, 1.0])), arc[[0, -1]], atol=0.1)
+        radius = np.hypot(*(curve(np.linspace(0, 1, 200)) - 300).T)
+        self.assertLess(np.abs(radius - 100).max(), 0.5)
+    
+    def test_smooth_thins_jagged_path(self):
+        """测试锯齿状的直线路径换成更少的路径点，不偏离追踪的点，末尾沿切线多走4步"""
+        smoother = self.module.PathSmoother
+        points = [(500 + (i % 2) * 2, 400 + 10 * i) for i in range(40)]
+        waypoints = smoother.smooth(points, tolerance=3)
+        
+        self.assertLess(len(waypoints), len(points) // 2)
+        self.assertEqual(waypoints[0], points[0])
+        self.assertLessEqual(smoother.deviation(waypoints[:-1], points), 3)
+        self.assertAlmostEqual(waypoints[-1][1], waypoints[-2][1] + 40, delta=3)
+        self.assertEqual(smoother.smooth(points, overshoot=0)[-1], waypoints[-2])
+    
+    def test_smooth_falls_back_at_corner(self):
+        """测试样条切过迷宫拐角时退回追踪的点"""
+        smoother = self.module.PathSmoother
+        points = [(500, 400 + 15 * i) for i in range(20)] + [(515 + 15 * i, 685) for i in range(20)]
+        self.assertGreater(smoother.deviation(smoother.smooth(points)[:-1], points), 6)
+        
+        waypoints = smoother.smooth(points, tolerance=6)
+        self.assertEqual(waypoints[:-1], points)
+        self.assertEqual(waypoints[-1], (860, 685))
+    
+    def test_drag_smoothed_path(self):
+        """测试平滑后的拖动点更少，并且不偏离追踪的路径"""
+        dragged = self.module.drag_path(self.module.WaypointStream(self.traced(delay=0.02)), smooth=True)
+        
+        self.assertEqual(self.mouse_events(), ["mouse_down", "mouse_up", "mouse_down", "mouse_up"])
+        self.assertLess(len(dragged), len(self.points))
+        smoother = self.module.PathSmoother
+        self.assertLessEqual(smoother.deviation(dragged[:-1], self.points), self.module.SMOOTH_TOLERANCE)
+        # 末尾沿最后一段(向下)多走4步
+        self.assertEqual(dragged[-1][1], self.points[-1][1])
+        self.assertGreater(dragged[-1][0], self.points[-1][0])
+
+
+class TestTimelineSchedule(unittest.TestCase):
+    """测试按键时间线调度模块"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.backend = florr_afk_input.RecordingBackend()
+        self.runner = florr_afk_schedule.TimelineRunner(self.backend)
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.runner.stop()
+    
+    def test_timeline_events(self):
+        """测试时间线展开，重叠按键和同一时刻的释放与按下"""
+        timeline = florr_afk_schedule.Timeline().then(1.0, 'a').then(2.0, 'a', 's')
+        
+        self.assertEqual(timeline.duration, 3.0)
+        self.assertEqual(timeline.events(), [
+            (0.0, "key_down", ('a',)),
+            (1.0, "key_up", ('a',)),
+            (1.0, "key_down", ('a',)),
+            (1.0, "key_down", ('s',)),
+            (3.0, "key_up", ('a',)),
+            (3.0, "key_up", ('s',)),
+        ])
+    
+    def test_runner_executes_timeline(self):
+        """测试调度器在后台执行时间线"""
+        timeline = florr_afk_schedule.Timeline().then(0.02, 'w').then(0.02, 'd')
+        
+        self.runner.start(timeline)
+        self.assertTrue(self.runner.wait(timeout=2))
+        
+        kinds = [(event.kind, event.args[0]) for event in self.backend.events]
+        self.assertEqual(kinds, [("key_down", 'w'), ("key_up", 'w'), ("key_down", 'd'), ("key_up", 'd')])
+        self.assertEqual(self.backend.pressed_keys, set())
+    
+    def test_runner_pause_resume(self):
+        """测试暂停时释放按键，恢复后重新按下并继续"""
+        timeline = florr_afk_schedule.Timeline().then(0.2, 'w')
+        
+        self.runner.start(timeline)
+        time.sleep(0.05)
+        self.runner.pause()
+        self.assertTrue(self.runner.paused)
+        self.assertEqual(self.backend.pressed_keys, set())
+        
+        # 暂停期间时间线不前进
+        time.sleep(0.3)
+        self.assertTrue(self.runner.running)
+        
+        self.runner.resume()
+        self.assertEqual(self.backend.pressed_keys, {'w'})
+        self.assertTrue(self.runner.wait(timeout=2))
+        self.assertEqual(self.backend.pressed_keys, set())
+    
+    def test_runner_stop_releases_keys(self):
+        """测试停止时释放所有按键"""
+        self.runner.start(florr_afk_schedule.Timeline().then(10, 'w', 'a'))
+        time.sleep(0.05)
+        self.assertEqual(self.backend.pressed_keys, {'w', 'a'})
+        
+        self.runner.stop()
+        self.assertFalse(self.runner.running)
+        self.assertEqual(self.backend.pressed_keys, set())
+    
+    def test_overlapping_holds_merged(self):
+        """测试同一按键重叠的按住区间合并为一次按下"""
+        timeline = florr_afk_schedule.Timeline().hold(0.0, 2.0, 'w').hold(1.0, 2.0, 'w')
+        self.assertEqual(timeline.events(), [
+            (0.0, "key_down", ('w',)),
+            (3.0, "key_up", ('w',)),
+        ])
+    
+    def test_interrupt_before_play(self):
+        """测试 play() 之前打断时不执行任何事件"""
+        self.runner.interrupt()
+        report = self.runner.play(florr_afk_schedule.compile_pattern([("key", "w", 1.0, 0.0)]))
+        
+        self.assertTrue(report.interrupted)
+        self.assertEqual(report.executed, 0)
+        self.assertEqual(self.backend.events, [])
+
+
+class TestActionTimeline(unittest.TestCase):
+    """测试移动模式编译和动作时间线执行"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.clock = florr_afk_clock.VirtualClock()
+        self.clock.register()
+        self.backend = florr_afk_input.RecordingBackend(clock=self.clock.monotonic, realtime=True,
+                                                        sleep=self.clock.sleep)
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.clock.close()
+    
+    def test_compile_merges_overlapping_holds(self):
+        """测试按住区间重叠时合并，不会在仍应按住时释放"""
+        timeline = florr_afk_schedule.compile_pattern([
+            ("hold", "w", 2.0),
+            ("key", "a", 0.5, 0.5),
+            ("key", "w", 0.5, 0.0),
+            ("wait", 1.0),
+        ])
+        self.assertEqual(timeline.events(), [
+            (0.0, "key_down", ("w",)),
+            (0.0, "key_down", ("a",)),
+            (0.5, "key_up", ("a",)),
+            (2.0, "key_up", ("w",)),
+        ])
+        self.assertEqual(timeline.duration, 2.5)
+        self.assertEqual(timeline.times.dtype, np.float64)
+        self.assertEqual(timeline.kinds.dtype, np.uint8)
+    
+    def test_play_keeps_absolute_times(self):
+        """测试每个事件都在计划时刻执行，误差不随步数累积"""
+        pattern = [("key", key, 0.1, 0.05) for key in "wasd" * 25]
+        timeline = florr_afk_schedule.compile_pattern(pattern)
+        report = florr_afk_schedule.TimelineRunner(self.backend, self.clock).play(timeline)
+        
+        self.assertEqual(report.executed, 200)
+        self.assertFalse(report.interrupted)
+        np.testing.assert_allclose([event.timestamp for event in self.backend.events], timeline.times)
+        self.assertLess(report.summary()["drift_ms"], 1e-6)
+    
+    def test_interrupt_releases_held_keys(self):
+        """测试在事件边界打断时间线并释放按住的键"""
+        timeline = florr_afk_schedule.compile_pattern([("hold", "w", 10.0), ("key", "a", 10.0, 0.0)])
+        player = florr_afk_schedule.TimelineRunner(self.backend, self.clock)
+        thread = threading.Thread(target=lambda: setattr(self, "report", player.play(timeline)))
+        self.clock.register(thread)
+        thread.start()
+        self.clock.sleep(3.0)
+        player.interrupt()
+        thread.join(timeout=5)
+        
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(self.report.interrupted)
+        self.assertEqual(self.report.executed, 2)
+        self.assertEqual(self.backend.pressed_keys, set())
+        self.assertLess(self.clock.monotonic(), 10.0)
+    
+    def test_background_pattern_with_click(self):
+        """测试后台执行包含鼠标点击的移动模式，计划时刻与实际时刻一致"""
+        timeline = florr_afk_schedule.compile_pattern([("key", "w", 0.5, 0.0), ("mouse", 100, 200, "left")],
+                                                      random.Random(0))
+        runner = florr_afk_schedule.TimelineRunner(self.backend, self.clock)
+        runner.start(timeline)
+        self.assertTrue(runner.wait(timeout=5))
+        
+        kinds = [event.kind for event in self.backend.events]
+        self.assertEqual(sorted(kinds), sorted(["key_down", "key_up", "move", "mouse_down", "mouse_up"]))
+        self.assertFalse(runner.report.interrupted)
+        self.assertEqual(runner.report.executed, 5)
+        self.assertLess(runner.report.summary()["max_ms"], 1e-6)
+        self.assertGreaterEqual(self.clock.monotonic(), timeline.duration)
+    
+    def test_real_clock_precision(self):
+        """测试真实时钟下事件的延迟很小"""
+        backend = florr_afk_input.RecordingBackend(clock=time.monotonic, realtime=True)
+        timeline = florr_afk_schedule.compile_pattern([("key", "w", 0.01, 0.01)] * 5)
+        report = florr_afk_schedule.TimelineRunner(backend).play(timeline)
+        self.assertEqual(report.executed, 10)
+        self.assertLess(report.summary()["p95_ms"], 20.0)
 
 
 class TestMovementStrategy(unittest.TestCase):
@@ -260,6 +2036,41 @@ class TestMovementStrategy(unittest.TestCase):
         self.assertEqual(args[0], [("key", "w", 0.5, 0.1), ("wait", 1.0)])
 
 
+class TestCalibration(unittest.TestCase):
+    """测试分辨率标定模块"""
+    
+    def test_calibrate_scales_and_caches(self):
+        """测试按分辨率换算坐标，同一分辨率只生成一次"""
+        calibration = florr_afk_calibration.calibrate(3840, 2160)
+        self.assertIs(calibration, florr_afk_calibration.calibrate(3840, 2160))
+        self.assertEqual(calibration.point(400, 300), (800, 600))
+        self.assertEqual(calibration.length(25), 50)
+        
+        build = MagicMock(return_value=np.ones((4, 4), dtype=bool))
+        self.assertIs(calibration.cached("mask", build), calibration.cached("mask", build))
+        build.assert_called_once_with(calibration)
+    
+    def test_strategy_uses_screen_region(self):
+        """测试策略的点击位置按游戏窗口换算"""
+        config = MagicMock()
+        config.get.side_effect = lambda key, default=None: {
+            "screen_region": (100, 50, 2560, 1440)
+        }.get(key, default)
+        strategy = florr_afk_bot.SewerStrategy(config, MagicMock())
+        
+        self.assertEqual(strategy.safe_positions[0], (100 + 533, 50 + 400))
+        for _ in range(20):
+            x, y = strategy.random_click_position()
+            self.assertTrue(100 + 400 <= x <= 100 + 1333)
+            self.assertTrue(50 + 267 <= y <= 50 + 933)
+        
+        # 没有screen_region时使用输入后端报告的屏幕大小
+        backend = florr_afk_input.RecordingBackend(size=(1920, 1080))
+        strategy = florr_afk_bot.SewerStrategy(MagicMock(get=lambda key, default=None: default),
+                                               florr_afk_bot.InputController(MagicMock(), backend))
+        self.assertEqual(strategy.safe_positions, florr_afk_bot.SewerStrategy.SAFE_POSITIONS)
+
+
 class TestFlorAFKBot(unittest.TestCase):
     """测试AFK机器人主类"""
     
@@ -357,17 +2168,41 @@ class TestFlorAFKBot(unittest.TestCase):
         # 验证结果
         self.assertEqual(self.bot.image_recognition.detect_afk_popup.call_count, 4)
         self.bot.input_controller.click.assert_called_once_with(400, 300)
+        self.bot.input_controller.interrupt.assert_called_once_with()
         self.assertEqual(self.bot.strategy.execute.call_count, 2)  # 第二次和第三次循环
     
-    @patch('florr_afk_bot.time.sleep')
-    def test_recover_from_error(self, mock_sleep):
+    def test_monitor_interrupts_pattern_before_recovery(self):
+        """测试监控线程恢复前先打断主循环中正在执行的移动模式"""
+        calls = []
+        self.bot.input_controller.interrupt.side_effect = lambda: calls.append("interrupt")
+        
+        def recover(status):
+            calls.append(("recover", status))
+            self.bot.running = False
+        
+        self.bot._recover_from_error = recover
+        self.bot._track_region = MagicMock()
+        self.bot.image_recognition.detect_game_status.return_value = "disconnected"
+        self.bot.clock = florr_afk_clock.VirtualClock()
+        self.bot.running = True
+        try:
+            self.bot._monitor_function()
+        finally:
+            self.bot.clock.close()
+        
+        self.assertEqual(calls, ["interrupt", ("recover", "disconnected")])
+    
+    def test_recover_from_error(self):
         """测试从错误中恢复功能"""
         # 测试不同类型的错误
         error_types = ["disconnected", "game_closed", "unknown"]
+        self.bot.clock = florr_afk_clock.VirtualClock()
+        self.bot.input_controller.backend.size.return_value = (1920, 1080)
         
         for error_type in error_types:
             # 重置模拟对象
             self.bot.input_controller.reset_mock()
+            started = self.bot.clock.monotonic()
             
             # 调用恢复方法
             self.bot._recover_from_error(error_type)
@@ -375,11 +2210,89 @@ class TestFlorAFKBot(unittest.TestCase):
             # 验证结果
             if error_type == "unknown":
                 # 通用恢复策略应该点击屏幕中央并按ESC键
-                self.bot.input_controller.click.assert_called_once()
+                self.bot.input_controller.click.assert_called_once_with(960, 540)
                 self.bot.input_controller.press_key.assert_called_once_with('esc')
             
             # 所有情况都应该等待
-            mock_sleep.assert_called()
+            self.assertGreaterEqual(self.bot.clock.monotonic() - started, 5)
+        self.bot.clock.close()
+
+
+class TestAsyncRuntime(unittest.TestCase):
+    """测试asyncio运行时"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.mock_config = MagicMock()
+        self.mock_config.get.side_effect = lambda key, default=None: {
+            "run_time": 0,
+            "check_interval": 0.05,
+            "capture_interval": 0.01,
+            "movement_interval": [0.01, 0.02]
+        }.get(key, default)
+        
+        self.backend = florr_afk_input.RecordingBackend(clock=time.monotonic)
+        
+        # 只模拟截图、识别和策略，输入走录制后端
+        self.bot = MagicMock()
+        self.bot.config = self.mock_config
+        self.bot.clock = florr_afk_clock.SYSTEM_CLOCK
+        self.bot.governor = florr_afk_governor.CpuGovernor()
+        self.bot.screen_region = None
+        self.bot.suspended = None
+        self.bot.running = True
+        self.bot.start_time = None
+        self.bot.input_controller = florr_afk_bot.InputController(self.mock_config, backend=self.backend)
+        self.bot.image_recognition.capture_screen.return_value = np.zeros((600, 800, 3), dtype=np.uint8)
+        self.bot.image_recognition.detect_game_status.return_value = "normal"
+        # 一个很长的按键模式，只有被弹窗打断才会提前结束
+        self.bot.strategy.generate_random_movement.return_value = [("key", "w", 10.0, 0.1)]
+        self.bot.detectors = florr_afk_bot.FlorAFKBot._create_detectors(self.bot)
+    
+    @patch('florr_afk_async.random.uniform', return_value=0.01)
+    def test_popup_preempts_pattern(self, mock_uniform):
+        """测试弹窗打断正在执行的移动模式"""
+        calls = []
+        
+        def detect(frame):
+            calls.append(frame)
+            if len(calls) == 5:
+                return (400, 300)
+            if len(calls) >= 10:
+                self.bot.running = False
+            return None
+        
+        self.bot.image_recognition.detect_afk_popup.side_effect = detect
+        
+        start = time.monotonic()
+        asyncio.run(florr_afk_async.AsyncRuntime(self.bot).run())
+        
+        # 远早于10秒的按键时长就结束了
+        self.assertLess(time.monotonic() - start, 5.0)
+        
+        kinds = [(event.kind, event.args[0]) for event in self.backend.events]
+        self.assertIn(("mouse_down", 'left'), kinds)
+        # 点击之前按住的w已被释放
+        self.assertLess(kinds.index(("key_up", 'w')), kinds.index(("mouse_down", 'left')))
+        self.assertEqual(self.backend.pressed_keys, set())
+        
+        # 每次检测都拿到了截图任务产生的帧
+        for frame in calls:
+            self.assertEqual(frame.shape, (600, 800, 3))
+    
+    def test_run_time_limit(self):
+        """测试达到运行时间限制后停止"""
+        self.mock_config.get.side_effect = lambda key, default=None: {
+            "run_time": 1,
+            "capture_interval": 0.01,
+            "movement_interval": [0.01, 0.02]
+        }.get(key, default)
+        self.bot.start_time = time.time() - 120
+        self.bot.image_recognition.detect_afk_popup.return_value = None
+        
+        asyncio.run(florr_afk_async.AsyncRuntime(self.bot).run())
+        
+        self.assertFalse(self.bot.running)
 
 
 def main():
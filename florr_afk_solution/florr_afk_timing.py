@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Florr.io 自动AFK脚本 - 热路径耗时统计
+在截图、颜色转换、弹窗检测、迷宫求解和光标回放等环节记录耗时，汇总为内存中的直方图
+"""
+
+import json
+import time
+import atexit
+import bisect
+import logging
+import threading
+from contextlib import nullcontext
+from functools import wraps
+
+logger = logging.getLogger("FlorAFK")
+
+# 未启用时所有span共用的空上下文
+_NULL_SPAN = nullcontext()
+
+
+class LatencyHistogram:
+    """对数分桶的延迟直方图
+
+    范围为10微秒到100秒，每个数量级10个桶，百分位数的误差不超过一个桶宽(约26%)。
+    """
+
+    BOUNDS = [1e-5 * 10 ** (i / 10) for i in range(71)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """记录一次耗时(秒)"""
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent):
+        """返回百分位数(秒)，取所在桶的上界，且不超过最大值"""
+        if not self.count:
+            return 0.0
+        target = percent / 100 * self.count
+        seen = 0
+        for index, bucket in enumerate(self.counts):
+            seen += bucket
+            if seen >= target and bucket:
+                if index < len(self.BOUNDS):
+                    return min(self.BOUNDS[index], self.max)
+                return self.max
+        return self.max
+
+    def summary(self):
+        """毫秒单位的统计结果"""
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1000,
+            "p95_ms": self.percentile(95) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+class _Span:
+    """计时上下文，退出时把耗时记入对应环节"""
+
+    __slots__ = ("timings", "stage", "start")
+
+    def __init__(self, timings, stage):
+        self.timings = timings
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings.record(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class Timings:
+    """各环节的耗时直方图
+
+    未启用时 span() 直接返回共享的空上下文，热路径上只多一次属性检查。
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.histograms = {}
+        self.report_interval = 0
+        self.dump_path = None
+        self.report = logger.info
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._reporter = None
+        self._atexit_registered = False
+
+    def enable(self, report_interval=60.0, dump_path=None, report=None):
+        """启用计时，每 report_interval 秒输出一次汇总，程序退出时输出汇总并写入 dump_path"""
+        self.enabled = True
+        self.report_interval = report_interval
+        self.dump_path = dump_path
+        if report is not None:
+            self.report = report
+        if not self._atexit_registered:
+            atexit.register(self.dump)
+            self._atexit_registered = True
+        if report_interval and (self._reporter is None or not self._reporter.is_alive()):
+            self._stop_event.clear()
+            self._reporter = threading.Thread(target=self._report_loop, daemon=True)
+            self._reporter.start()
+
+    def disable(self):
+        """停止计时和定期汇总，已记录的数据保留"""
+        self.enabled = False
+        self._stop_event.set()
+
+    def span(self, stage):
+        """计时上下文: with timings.span("capture_screen"): ..."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage)
+
+    def timed(self, stage):
+        """计时装饰器，整个函数调用计入 stage"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Span(self, stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record(self, stage, seconds):
+        """直接记录一次耗时(秒)"""
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def summary(self):
+        """各环节的统计结果"""
+        with self._lock:
+            return {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+
+    def format_summary(self):
+        """可打印的汇总"""
+        lines = []
+        for stage, stats in sorted(self.summary().items()):
+            lines.append(f"{stage}: n={stats['count']} mean={stats['mean_ms']:.2f}ms "
+                         f"p50={stats['p50_ms']:.2f}ms p95={stats['p95_ms']:.2f}ms "
+                         f"p99={stats['p99_ms']:.2f}ms max={stats['max_ms']:.2f}ms")
+        return "\n".join(lines)
+
+    def _report_loop(self):
+        while not self._stop_event.wait(self.report_interval):
+            if self.histograms:
+                self.report("耗时统计:\n" + self.format_summary())
+
+    def dump(self, path=None):
+        """输出汇总，并把汇总和原始分桶写入JSON文件"""
+        if not self.histograms:
+            return
+        self.report("耗时统计(退出):\n" + self.format_summary())
+        path = path or self.dump_path
+        if not path:
+            return
+        with self._lock:
+            data = {
+                "bounds_s": LatencyHistogram.BOUNDS,
+                "stages": {
+                    stage: dict(histogram.summary(), buckets=histogram.counts)
+                    for stage, histogram in self.histograms.items()
+                },
+            }
+        try:
+            with open(path, "w") as f:
+                json.dump(data, f, indent=2)
+        except OSError as e:
+            logger.error(f"写入耗时统计失败: {e}")
+
+    def reset(self):
+        """清空已记录的数据"""
+        with self._lock:
+            self.histograms = {}
+
+
+# 进程内共享的计时器，各模块直接使用
+timings = Timings()